@@ -1,6 +1,15 @@
-from notebooks.lector import lector
+import os
+
+import uvicorn
+
 def main():
-    print("Hello from agentes-programas!")
+    # Los módulos de notebooks/ se importan entre sí por nombre (from estado import ...)
+    uvicorn.run(
+        "servicio:app",
+        app_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "notebooks"),
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+    )
 
 
 if __name__ == "__main__":
@@ -1,31 +1,65 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 import os
 from estado import AgentState, Nivel
-import json
+from cache_llm import ainvocar, invocar
+from eventos import emitir
+from serializacion_llm import (
+    compactar_dispersion,
+    compactar_num_estudiantes,
+    compactar_num_programas_instituciones,
+    compactar_programas_municipio,
+    compactar_resumen,
+    compactar_valor_matricula,
+    presupuesto,
+    reportar_tokens,
+)
 
 llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
 
-def nodo_analizar_num_programas_instituciones(
-    state: AgentState
-) -> Dict[str, Any]:
-    print('\nAgente: análisis número de programas e instituciones en el tiempo')
-    
-    registros = state.snies["num_programas_instituciones_tiempo"]
-    
-    def parse_periodo(p: str):
-        # "2001-1" -> (2001, 1)
-        partes = p.split("-")
-        return int(partes[0]), int(partes[1])
-
-    registros_ordenados = sorted(
-        registros,
-        key=lambda r: parse_periodo(str(r["PERIODO"]))
-    )
+# Número máximo de llamadas simultáneas al LLM cuando los análisis corren en paralelo
+MAX_CONCURRENCIA_LLM = int(os.getenv("MAX_CONCURRENCIA_LLM", "5"))
+
+def _analizar(campo: str, mensajes: List[BaseMessage]) -> Dict[str, Any]:
+    # Si el prompt (con sus datos) ya se había enviado, la respuesta sale del
+    # caché; si los datos cambiaron, la clave es otra y se consulta de nuevo
+    print(f"Análisis vía caché/LLM ({campo})")
+    return {campo: invocar(llm, mensajes)}
 
-    datos_json_str = json.dumps(registros_ordenados, ensure_ascii=False, indent=2)
+async def _aanalizar(campo: str, mensajes: List[BaseMessage], semaforo: asyncio.Semaphore) -> Dict[str, Any]:
+    async with semaforo:
+        print(f"Análisis vía caché/LLM ({campo})")
+        return {campo: await ainvocar(llm, mensajes)}
+
+def _datos_prompt(state: AgentState, clave: str, campo: str, compactar) -> str:
+    """
+    Texto de datos para el prompt: el resumen estadístico precalculado del
+    agregado (si el lector lo generó) y una tabla compacta con los datos.
+    """
+    crudo = state.snies[clave]
+    resumen = (state.snies.get("resumen_estadistico") or {}).get(clave)
+    tabla = compactar(crudo, presupuesto(campo, con_resumen=bool(resumen)))
+    if resumen:
+        datos = (
+            "Resumen estadístico (ya calculado; usa estas cifras en lugar de recalcularlas. "
+            "cagr es la tasa de crecimiento anual compuesta, hhi el índice Herfindahl-Hirschman):\n"
+            f"{compactar_resumen(resumen)}\n\n"
+            f"Muestra de los datos:\n{tabla}"
+        )
+    else:
+        datos = tabla
+    reportar_tokens(campo, crudo, datos)
+    return datos
+
+def _mensajes_num_programas_instituciones(state: AgentState) -> List[BaseMessage]:
+    # Tabla compacta ordenada por periodo (ver serializacion_llm.py)
+    datos_str = _datos_prompt(state, "num_programas_instituciones_tiempo",
+                              "analisis_num_programas_instituciones_tiempo",
+                              compactar_num_programas_instituciones)
 
     sistema = SystemMessage(
         content=(
@@ -39,11 +73,11 @@ def nodo_analizar_num_programas_instituciones(
 
     usuario = HumanMessage(
         content=(
-            "Te doy datos agregados por periodo y sector. "
-            "Cada registro tiene los campos: PERIODO (ej. 2001-1 o 2001-2), "
-            "SECTOR (Oficial o Privado), NUM_INSTITUCIONES y NUM_PROGRAMAS.\n\n"
+            "Te doy datos agregados por periodo y sector, como una tabla separada por '|'. "
+            "Cada fila es un PERIODO (ej. 2001-1 o 2001-2) con el número de instituciones "
+            "(INST_OFICIAL, INST_PRIVADO) y de programas (PROG_OFICIAL, PROG_PRIVADO) por sector.\n\n"
             "Datos:\n"
-            f"{datos_json_str}\n\n"
+            f"{datos_str}\n\n"
             "A partir de estos datos, por favor:\n"
             "1. Indica si a lo largo del tiempo predominan las instituciones oficiales o privadas.\n"
             "2. Indica si a lo largo del tiempo predominan los programas oficiales o privados.\n"
@@ -53,25 +87,17 @@ def nodo_analizar_num_programas_instituciones(
             "Puedes hablar de 'primer semestre' y 'segundo semestre' si es útil."
         )
     )
-    if(len(state.analisis_num_programas_instituciones_tiempo)>10):
-        respuesta=state.analisis_num_programas_instituciones_tiempo
-        print("Ya se tenía un análisis realizado")
-    else:
-        print('Se debe correr el análisis en el LLM')
-        respuesta = llm.invoke([sistema, usuario]).content
+    return [sistema, usuario]
 
-    return {
-        "analisis_num_programas_instituciones_tiempo": respuesta
-    }
-
-def nodo_analizar_matriculas_vs_estudiantes(
+def nodo_analizar_num_programas_instituciones(
     state: AgentState
 ) -> Dict[str, Any]:
-    print('\nAgente: Análisis de la dispersión de matrículas respecto a los estudiantes')
-    registros = state.snies["dispersión_matricula_vs_estudiantes"]["programas"]
-    
-    # Los pasamos a JSON “bonito” para que el LLM lo lea bien
-    datos_json_str = json.dumps(registros, ensure_ascii=False, indent=2)
+    print('\nAgente: análisis número de programas e instituciones en el tiempo')
+    return _analizar("analisis_num_programas_instituciones_tiempo", _mensajes_num_programas_instituciones(state))
+
+def _mensajes_matriculas_vs_estudiantes(state: AgentState) -> List[BaseMessage]:
+    datos_str = _datos_prompt(state, "dispersión_matricula_vs_estudiantes",
+                              "analisis_dispersion_matricula_vs_estudiantes", compactar_dispersion)
 
     sistema = SystemMessage(
         content=(
@@ -86,10 +112,11 @@ def nodo_analizar_matriculas_vs_estudiantes(
             "Tienes información que resume una duración de 4 años, para diferentes instituciones educativas. "
             "Para cada programa tienes metadatos como el nombre de la IES y el programa, el departamento donde está ubicado el programa"
             "El sector que indica si es un programa oficial o privado. "
-            "Respecto a cada programa, tienes el valor promedio de la matricula en pesos colombianos, así como el número promedio "
+            "Respecto a cada programa, tienes el valor promedio de la matricula en millones de pesos colombianos, así como el número promedio "
             "de estudiantes matriculados. " 
+            "Los datos están en una tabla separada por '|', ordenada de mayor a menor número de estudiantes.\n"
             "Datos:\n"
-            f"{datos_json_str}\n\n"
+            f"{datos_str}\n\n"
             "A partir de estos datos, por favor:\n"
             "1. Encuentra si hay una tendencia entre las universidades privadas y oficiales respecto al precio\n"
             "2. Encuentra si hay una tendencia entre las universidades privadas y oficiales respecto a la cantidad de estudiantes\n"
@@ -98,22 +125,17 @@ def nodo_analizar_matriculas_vs_estudiantes(
             
         )
     )
-    if(len(state.analisis_dispersion_matricula_vs_estudiantes)>10):
-        respuesta=state.analisis_dispersion_matricula_vs_estudiantes
-        print("Se leyeron los datos de una corrida previa")
-    else: 
-        respuesta = llm.invoke([sistema, usuario]).content
-        print('Se cargó la información consultando al LLM')
-    return {
-        "analisis_dispersion_matricula_vs_estudiantes": respuesta
-    }
+    return [sistema, usuario]
 
-def nodo_analizar_matriculas_vs_tiempo(
+def nodo_analizar_matriculas_vs_estudiantes(
     state: AgentState
 ) -> Dict[str, Any]:
-    print('\nAgente: análisis del valor de la matrícula en el tiempo para los programas')
-    registros=state.snies["valor_matricula_tiempo"]
-    datos_json_str = json.dumps(registros, ensure_ascii=False, indent=2)
+    print('\nAgente: Análisis de la dispersión de matrículas respecto a los estudiantes')
+    return _analizar("analisis_dispersion_matricula_vs_estudiantes", _mensajes_matriculas_vs_estudiantes(state))
+
+def _mensajes_matriculas_vs_tiempo(state: AgentState) -> List[BaseMessage]:
+    datos_str = _datos_prompt(state, "valor_matricula_tiempo",
+                              "analisis_valor_matricula_tiempo", compactar_valor_matricula)
 
     sistema = SystemMessage(
         content=(
@@ -126,11 +148,10 @@ def nodo_analizar_matriculas_vs_tiempo(
     usuario = HumanMessage(
         content=(
             "Tienes información que muestra el valor de la matrícula para diferentes instituciones educativas en diferentes períodos de tiempo"
-            "Para cada registro cuentas con un diccionario que primero tiene el nombre de la ies y el origrama: nombre_ies_programa"
-            "Tambien cuentas con el sector que define si es oficial o privada. "
-            "Y los datos están en una lista llamada serie, que para cada período tiene el valor de la matrícula."
+            "Los datos están en una tabla separada por '|': cada fila tiene el nombre de la ies y el programa (IES_PROGRAMA), "
+            "el sector que define si es oficial o privada, y una columna por período con el valor de la matrícula en millones de pesos.\n"
             "Datos:\n"
-            f"{datos_json_str}\n\n"
+            f"{datos_str}\n\n"
             "A partir de estos datos, por favor:\n"
             "1. Encuentra si hay una tendencia en los valores de las matrículas respecto al tiempo. "
             "2. Encuentra si hay una tendencia entre las universidades privadas y oficiales respecto a la evolución de la matrícula\n"
@@ -138,24 +159,18 @@ def nodo_analizar_matriculas_vs_tiempo(
             
         )
     )
-    if(len(state.analisis_valor_matricula_tiempo)>10):
-        print('Los datos ya se encontraban analizados. Se lee el análisis previo')
-        respuesta=state.analisis_valor_matricula_tiempo
-    else:
-        respuesta = llm.invoke([sistema, usuario]).content
-        print('Se cargó el análisis desde el LLM')
+    return [sistema, usuario]
 
-    return {
-        "analisis_valor_matricula_tiempo": respuesta
-    }
+def nodo_analizar_matriculas_vs_tiempo(
+    state: AgentState
+) -> Dict[str, Any]:
+    print('\nAgente: análisis del valor de la matrícula en el tiempo para los programas')
+    return _analizar("analisis_valor_matricula_tiempo", _mensajes_matriculas_vs_tiempo(state))
 
 
-def nodo_analizar_programas_por_departamento_municipio(
-    state: AgentState) -> Dict[str, Any]:
-    print('\nAgente: análisis de número de programas por departamento y municipio')
-    registros = state.snies["programas_por_departamento_municipio"]
-    # Los pasamos a JSON “bonito” para que el LLM lo lea bien
-    datos_json_str = json.dumps(registros, ensure_ascii=False, indent=2)
+def _mensajes_programas_por_departamento_municipio(state: AgentState) -> List[BaseMessage]:
+    datos_str = _datos_prompt(state, "programas_por_departamento_municipio",
+                              "analisis_programas_municipios", compactar_programas_municipio)
 
     sistema = SystemMessage(
         content=(
@@ -171,8 +186,9 @@ def nodo_analizar_programas_por_departamento_municipio(
             "Por favor realiza un análisis que permita entender cuáles departamentos tienen la mayor cantidad de programas"
             "y la distribución de programas en las ciudades del pais. Debes analizar si existe alguna correlación entre la cantidad"
             "de programas y la vocación económica de los departamentos y ciudades. "
+            "Los datos están en una tabla separada por '|'.\n"
             "Datos:\n"
-            f"{datos_json_str}\n\n"
+            f"{datos_str}\n\n"
             "A partir de estos datos, por favor:\n"
             "1. Encuentra una relación entre la cantidad de programas y las vocaciones de las regiones."
             "2. Considera que el programa lo abriríamos en Medellín. Determina si la apertura del mismo tendría una buena oportunidad de acuerdo con la cantidad de programas en la región."
@@ -180,23 +196,17 @@ def nodo_analizar_programas_por_departamento_municipio(
             
         )
     )
-    if(len(state.analisis_programas_municipios)>10):
-        print('Ya se cuenta con una respuesta previa. No se hace consulta al LLM')
-        respuesta=state.analisis_programas_municipios
-    else:
-        respuesta = llm.invoke([sistema, usuario]).content
-        print('Se consulta al LLM')
+    return [sistema, usuario]
 
-    return {
-        "analisis_programas_municipios": respuesta
-    }
+def nodo_analizar_programas_por_departamento_municipio(
+    state: AgentState
+) -> Dict[str, Any]:
+    print('\nAgente: análisis de número de programas por departamento y municipio')
+    return _analizar("analisis_programas_municipios", _mensajes_programas_por_departamento_municipio(state))
 
-def nodo_analizar_num_estudiantes_tiempo(
-    state: AgentState) -> Dict[str, Any]:
-    print('\nAgente: análisis de número de estudiantes en el tiempo en los programas')
-    datos_plot = state.snies["num_estudiantes_tiempo"]
-    # Los pasamos a JSON “bonito” para que el LLM lo lea bien
-    datos_json_str = json.dumps(datos_plot, ensure_ascii=False, indent=2)
+def _mensajes_num_estudiantes_tiempo(state: AgentState) -> List[BaseMessage]:
+    datos_str = _datos_prompt(state, "num_estudiantes_tiempo",
+                              "analisis_numero_de_estudiantes", compactar_num_estudiantes)
 
     sistema = SystemMessage(
         content=(
@@ -213,8 +223,9 @@ def nodo_analizar_num_estudiantes_tiempo(
             "En otro campo aparecen los diferentes procesos de los estudiantes que representan: los estudiantes ADMITIDOS (que se aceptan al programa)"
             "Los GRADUADOS, que terminaron el programa, los INSCRITOS que manifestaron su interés y se inscribieron. "
             "Finalmemente los MATRICULADOS, que efectivamente cumplieron el proceso de matrículas, así como los NUEVOS que son los que se aceptaron y matricularon como nuevos en cada período"
+            "Cada grupo es una tabla separada por '|' con una fila por período y una columna por proceso.\n"
             "Datos:\n"
-            f"{datos_json_str}\n\n"
+            f"{datos_str}\n\n"
             "A partir de estos datos, por favor:\n"
             "1. Encuentra relaciones en la variación de los estudiantes en todos los sectores, los oficiales y los privados. Determina si existen variaciones importantes entre unos y otros."
             "2. Analiza para todos estos tipos de sectores, si existe una diferencia entre los estudiantes inscritos y los que realmente se matricularon"
@@ -224,14 +235,64 @@ def nodo_analizar_num_estudiantes_tiempo(
             
         )
     )
-    if(len(state.analisis_numero_de_estudiantes)>10):
-        print('Ya los datos se habían calculado previamente')
-        respuesta=state.analisis_numero_de_estudiantes
-    else:
-        respuesta = llm.invoke([sistema, usuario]).content
-        print('El análisis se procesa desde el LLM')
+    return [sistema, usuario]
+
+def nodo_analizar_num_estudiantes_tiempo(
+    state: AgentState
+) -> Dict[str, Any]:
+    print('\nAgente: análisis de número de estudiantes en el tiempo en los programas')
+    return _analizar("analisis_numero_de_estudiantes", _mensajes_num_estudiantes_tiempo(state))
+
+# ----------------------------------------------------------------------
+# Ejecución concurrente de los cinco análisis
+# ----------------------------------------------------------------------
+# Cada análisis lee una clave distinta de state.snies y escribe un campo
+# distinto del estado, así que pueden correr al mismo tiempo.
+ANALISIS = {
+    "analisis_num_programas_instituciones_tiempo": _mensajes_num_programas_instituciones,
+    "analisis_dispersion_matricula_vs_estudiantes": _mensajes_matriculas_vs_estudiantes,
+    "analisis_valor_matricula_tiempo": _mensajes_matriculas_vs_tiempo,
+    "analisis_programas_municipios": _mensajes_programas_por_departamento_municipio,
+    "analisis_numero_de_estudiantes": _mensajes_num_estudiantes_tiempo,
+}
+
+# Nodos para armar el grafo con ramas paralelas (ver grafo.py)
+NODOS_ANALISIS = {
+    "analizar_num_programas_instituciones": nodo_analizar_num_programas_instituciones,
+    "analizar_matriculas_vs_estudiantes": nodo_analizar_matriculas_vs_estudiantes,
+    "analizar_matriculas_vs_tiempo": nodo_analizar_matriculas_vs_tiempo,
+    "analizar_programas_por_departamento_municipio": nodo_analizar_programas_por_departamento_municipio,
+    "analizar_num_estudiantes_tiempo": nodo_analizar_num_estudiantes_tiempo,
+}
 
-    return {
-        "analisis_numero_de_estudiantes": respuesta
-    }
+def nodo_analisis_concurrente(state: AgentState) -> Dict[str, Any]:
+    """Corre los cinco análisis en hilos, con a lo sumo MAX_CONCURRENCIA_LLM llamadas a la vez."""
+    print('\nAgente: análisis concurrente de la información de SNIES')
+    salida: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCIA_LLM) as pool:
+        futuros = [
+            pool.submit(_analizar, state, campo, construir(state))
+            for campo, construir in ANALISIS.items()
+        ]
+        # Cada análisis se avisa al terminar (ver eventos.py), no al final del nodo
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            for campo, texto in resultado.items():
+                emitir("analisis", campo=campo, texto=texto)
+            salida.update(resultado)
+    return salida
 
+async def anodo_analisis_concurrente(state: AgentState) -> Dict[str, Any]:
+    """Versión asíncrona (llm.ainvoke) de nodo_analisis_concurrente, para grafo.ainvoke/astream."""
+    print('\nAgente: análisis concurrente de la información de SNIES')
+    semaforo = asyncio.Semaphore(MAX_CONCURRENCIA_LLM)
+    salida: Dict[str, Any] = {}
+    for tarea in asyncio.as_completed([
+        _aanalizar(campo, construir(state), semaforo)
+        for campo, construir in ANALISIS.items()
+    ]):
+        resultado = await tarea
+        for campo, texto in resultado.items():
+            emitir("analisis", campo=campo, texto=texto)
+        salida.update(resultado)
+    return salida
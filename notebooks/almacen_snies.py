@@ -0,0 +1,579 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from evaluador_expresiones import VERSION_NORMALIZACION, normalizar_texto
+
+# -------------------------
+# Ubicación de los archivos de SNIES
+# -------------------------
+URL_BASE = os.getenv("SNIES_URL_BASE", "https://robertohincapie.com/data/snies")
+DIRECTORIO = os.getenv("SNIES_DIR", ".")
+
+TABLAS = ("MAESTRO", "OFERTA", "PROGRAMAS", "IES")
+
+# Columnas que realmente usa el lector. De cada tabla solo se leen las que
+# existan en su esquema, así las colisiones entre tablas (y los sufijos de los
+# merge) son las mismas que cuando se cargaban las tablas completas.
+COLUMNAS_USADAS = [
+    "CODIGO_SNIES",
+    "CODIGO_INSTITUCION",
+    "PERIODO",
+    "PROXY_PER",
+    "PROCESO",
+    "CANTIDAD",
+    "MATRICULA",
+    "INSTITUCION",
+    "PROGRAMA_ACADEMICO",
+    "SECTOR_IES",
+    "DEPARTAMENTO_PROGRAMA",
+    "MUNICIPIO_PROGRAMA",
+    "PROGRAMA_ACREDITADO",
+    "MODALIDAD",
+    "NUMERO_CREDITOS",
+    "NUMERO_PERIODO",
+    "PERIODICIDAD",
+]
+
+COLUMNAS_IES = [
+    "CODIGO_INSTITUCION",
+    "INSTITUCION",
+    "NATURALEZA_JURIDICA",
+    "SECTOR_IES",
+    "CARACTER_IES",
+    "PAGINA_WEB",
+    "ACREDITACION_ALTA_CALIDAD",
+]
+
+# Columnas numéricas que en los archivos publicados vienen como texto (con
+# "null" para los faltantes). Se convierten una sola vez al descargar.
+ESQUEMA_NUMERICO = {
+    "CANTIDAD": "Int64",
+    "PROXY_PER": "Int32",
+    "MATRICULA": "Float64",
+    "NUMERO_CREDITOS": "Int64",
+    "NUMERO_PERIODO": "Int64",
+}
+
+# -------------------------
+# Almacén local particionado y manifiesto de versiones
+# -------------------------
+# MAESTRO y OFERTA se guardan particionadas por PERIODO (un parquet por
+# periodo en DIRECTORIO/<TABLA>/); PROGRAMAS e IES en un solo archivo. El
+# manifiesto guarda de cada tabla la huella del archivo de origen (tamaño,
+# ETag o fecha, sha256), el hash del contenido de cada partición y una
+# versión; además un id de versión de los datos que sube con cada
+# actualización que cambia algo. actualizar() solo escribe las particiones
+# nuevas o cambiadas, y los derivados se invalidan por esas versiones: el
+# catálogo normalizado y el índice por la de PROGRAMAS (version_catalogo),
+# cada partición de HECHOS por las de su periodo y las etapas del lector por
+# las particiones de HECHOS en las que aparecen sus programas
+# (version_hechos). Los análisis
+# del LLM se reutilizan mientras el prompt sea el mismo (cache_llm).
+TABLAS_PARTICIONADAS = ("MAESTRO", "OFERTA", "HECHOS")
+RUTA_MANIFIESTO = os.path.join(DIRECTORIO, "snies_manifiesto.json")
+
+_lock_almacen = threading.RLock()
+
+def ruta_local(tabla: str) -> str:
+    """Archivo de la tabla, o carpeta de particiones si está en TABLAS_PARTICIONADAS."""
+    if tabla in TABLAS_PARTICIONADAS:
+        return os.path.join(DIRECTORIO, tabla)
+    return os.path.join(DIRECTORIO, f"{tabla}.parquet")
+
+def ruta_particion(tabla: str, periodo: str) -> str:
+    return os.path.join(ruta_local(tabla), f"PERIODO={quote(periodo, safe='')}.parquet")
+
+def tipar(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte las columnas de ESQUEMA_NUMERICO a tipos numéricos con nulos (pd.NA)."""
+    for col, tipo in ESQUEMA_NUMERICO.items():
+        if col not in df.columns:
+            continue
+        valores = pd.to_numeric(df[col], errors="coerce").astype("Float64")
+        if tipo.startswith("Int") and not (valores.dropna() % 1 == 0).all():
+            tipo = "Float64"
+        df[col] = valores.astype(tipo)
+    return df
+
+def _huella(*partes: Any) -> str:
+    return hashlib.sha256("|".join(map(str, partes)).encode("utf-8")).hexdigest()[:20]
+
+def _hash_contenido(df: pd.DataFrame) -> str:
+    """Hash de filas, columnas y tipos: igual para el mismo contenido sin importar el archivo."""
+    filas = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return _huella(list(zip(df.columns, map(str, df.dtypes))), filas.hexdigest())
+
+def _escribir(tabla: pa.Table, ruta: str, **opciones) -> None:
+    # El temporal empieza por "." para que pyarrow.dataset no lo lea como partición
+    carpeta, nombre = os.path.split(ruta)
+    temporal = os.path.join(carpeta, f".{nombre}.{os.getpid()}-{threading.get_ident()}.tmp")
+    pq.write_table(tabla, temporal, **opciones)
+    os.replace(temporal, ruta)
+
+def _leer_manifiesto() -> Dict[str, Any]:
+    if not os.path.exists(RUTA_MANIFIESTO):
+        return {"version": 0, "tablas": {}}
+    with open(RUTA_MANIFIESTO, encoding="utf-8") as f:
+        return json.load(f)
+
+def _guardar_manifiesto(manifiesto: Dict[str, Any]) -> None:
+    temporal = f"{RUTA_MANIFIESTO}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, RUTA_MANIFIESTO)
+
+def _ingerir(tabla: str, origen: str, entrada: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Lleva al almacén local el parquet `origen` (ya descargado), tipado.
+    Solo escribe las particiones cuyo contenido cambió y borra las de
+    periodos que ya no están. Actualiza `entrada` (la del manifiesto) y
+    devuelve los periodos nuevos, cambiados y eliminados ("*" = tabla completa).
+    """
+    df = tipar(pd.read_parquet(origen))
+    cambios: Dict[str, List[str]] = {"nuevos": [], "cambiados": [], "eliminados": []}
+    if tabla not in TABLAS_PARTICIONADAS:
+        version = _hash_contenido(df)
+        if version != entrada.get("version") or not os.path.exists(ruta_local(tabla)):
+            _escribir(pa.Table.from_pandas(df, preserve_index=False), ruta_local(tabla))
+            cambios["cambiados" if "version" in entrada else "nuevos"].append("*")
+        entrada["version"] = version
+        return cambios
+
+    os.makedirs(ruta_local(tabla), exist_ok=True)
+    # Todas las particiones con el esquema de la tabla completa (una partición
+    # con una columna vacía no puede quedar con otro tipo)
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    anteriores = entrada.get("particiones", {}) if entrada.get("esquema") == esquema.to_string() else {}
+    particiones = {}
+    for periodo, parte in df.groupby(df["PERIODO"].astype("str").fillna(""), sort=True):
+        particiones[periodo] = _hash_contenido(parte)
+        if particiones[periodo] == anteriores.get(periodo) and os.path.exists(ruta_particion(tabla, periodo)):
+            continue
+        _escribir(pa.Table.from_pandas(parte, schema=esquema, preserve_index=False),
+                  ruta_particion(tabla, periodo), row_group_size=64_000)
+        cambios["cambiados" if periodo in entrada.get("particiones", {}) else "nuevos"].append(periodo)
+    for periodo in entrada.get("particiones", {}):
+        if periodo not in particiones:
+            os.remove(ruta_particion(tabla, periodo))
+            cambios["eliminados"].append(periodo)
+
+    entrada.update(esquema=esquema.to_string(), particiones=particiones,
+                   version=_huella(sorted(particiones.items())))
+    return cambios
+
+# -------------------------
+# Origen remoto (URL_BASE puede ser http(s)://, file:// o una carpeta local)
+# -------------------------
+def _url(tabla: str) -> str:
+    return f"{URL_BASE}/{tabla}.parquet"
+
+def _es_http(url: str) -> bool:
+    return url.startswith(("http://", "https://"))
+
+def huella_origen(tabla: str) -> Dict[str, Any]:
+    """Tamaño y marca (ETag, Last-Modified o mtime) del archivo remoto, sin descargarlo."""
+    url = _url(tabla)
+    if _es_http(url):
+        respuesta = httpx.head(url, follow_redirects=True, timeout=60)
+        respuesta.raise_for_status()
+        tamano = respuesta.headers.get("content-length")
+        return {"tamano": int(tamano) if tamano else None,
+                "marca": respuesta.headers.get("etag") or respuesta.headers.get("last-modified")}
+    st = os.stat(url.removeprefix("file://"))
+    return {"tamano": st.st_size, "marca": str(st.st_mtime_ns)}
+
+def _descargar(tabla: str) -> Tuple[str, str]:
+    """Copia el archivo remoto a un temporal en DIRECTORIO; devuelve (ruta, sha256)."""
+    url = _url(tabla)
+    temporal = os.path.join(DIRECTORIO, f".descarga-{tabla}-{os.getpid()}.parquet")
+    digest = hashlib.sha256()
+    with open(temporal, "wb") as destino:
+        if _es_http(url):
+            with httpx.stream("GET", url, follow_redirects=True, timeout=300) as respuesta:
+                respuesta.raise_for_status()
+                for bloque in respuesta.iter_bytes(1 << 20):
+                    digest.update(bloque)
+                    destino.write(bloque)
+        else:
+            with open(url.removeprefix("file://"), "rb") as fuente:
+                while bloque := fuente.read(1 << 20):
+                    digest.update(bloque)
+                    destino.write(bloque)
+    return temporal, digest.hexdigest()
+
+def _entrada(tabla: str) -> Dict[str, Any]:
+    """
+    Entrada del manifiesto de la tabla. La primera vez la descarga o, si ya
+    hay un archivo local de una versión anterior (sin manifiesto, sin
+    particiones o con números como texto), la registra a partir de él.
+    """
+    entrada = _leer_manifiesto()["tablas"].get(tabla)
+    if entrada is not None and os.path.exists(ruta_local(tabla)):
+        return entrada
+    with _lock_almacen:
+        manifiesto = _leer_manifiesto()
+        if tabla in manifiesto["tablas"] and os.path.exists(ruta_local(tabla)):
+            return manifiesto["tablas"][tabla]
+        entrada, archivo = {}, os.path.join(DIRECTORIO, f"{tabla}.parquet")
+        if os.path.exists(archivo):
+            print(f"Registrando {tabla} local en el manifiesto")
+            _ingerir(tabla, archivo, entrada)
+            if tabla in TABLAS_PARTICIONADAS:
+                os.remove(archivo)  # ya está en DIRECTORIO/<TABLA>/
+        else:
+            print(f"Descargando {tabla} desde {URL_BASE}")
+            entrada["origen"] = huella_origen(tabla)
+            temporal, entrada["origen"]["sha256"] = _descargar(tabla)
+            try:
+                _ingerir(tabla, temporal, entrada)
+            finally:
+                os.remove(temporal)
+        manifiesto = _leer_manifiesto()
+        manifiesto["tablas"][tabla] = entrada
+        manifiesto["version"] += 1
+        _guardar_manifiesto(manifiesto)
+        return entrada
+
+def asegurar_local(tabla: str) -> str:
+    """Descarga la tabla la primera vez y devuelve la ruta local (archivo o carpeta de particiones)."""
+    _entrada(tabla)
+    return ruta_local(tabla)
+
+def version_tabla(tabla: str) -> str:
+    """Hash del contenido local de la tabla (cambia solo si actualizar() trae datos distintos)."""
+    return _entrada(tabla)["version"]
+
+def version_catalogo() -> str:
+    """Versión de PROGRAMAS y de la normalización de nombres: la de todo lo derivado de nombres normalizados."""
+    return f"{version_tabla('PROGRAMAS')}-n{VERSION_NORMALIZACION}"
+
+def particiones(tabla: str) -> Dict[str, str]:
+    """Periodos de una tabla particionada con el hash del contenido de cada uno."""
+    return _entrada(tabla)["particiones"]
+
+def actualizar(tablas: Iterable[str] = TABLAS, forzar: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Trae de URL_BASE lo que haya cambiado. Una tabla cuyo origen tiene el
+    mismo tamaño y marca que la última vez no se descarga; si se descarga y
+    su sha256 no cambió, tampoco se toca. Del resto solo se escriben las
+    particiones nuevas o con contenido distinto. Si algo cambió sube el id
+    de versión de los datos. Devuelve los cambios por tabla.
+    """
+    resultado: Dict[str, Dict[str, List[str]]] = {}
+    with _lock_almacen:
+        for tabla in tablas:
+            # Una tabla que nunca se había traído se descarga (o registra) como siempre
+            entrada = dict(_entrada(tabla))
+            origen = huella_origen(tabla)
+            anterior = entrada.get("origen", {})
+            if not forzar and (anterior.get("tamano"), anterior.get("marca")) == (origen["tamano"], origen["marca"]):
+                print(f"{tabla}: sin cambios en el origen")
+                continue
+            temporal, origen["sha256"] = _descargar(tabla)
+            try:
+                cambios = {}
+                if forzar or anterior.get("sha256") != origen["sha256"]:
+                    cambios = _ingerir(tabla, temporal, entrada)
+            finally:
+                os.remove(temporal)
+            entrada["origen"] = origen
+            manifiesto = _leer_manifiesto()
+            manifiesto["tablas"][tabla] = entrada
+            _guardar_manifiesto(manifiesto)
+            if any(cambios.values()):
+                resultado[tabla] = cambios
+                print(f"{tabla}: " + ", ".join(f"{len(v)} {k}" for k, v in cambios.items() if v))
+            else:
+                print(f"{tabla}: mismo contenido")
+
+        manifiesto = _leer_manifiesto()
+        if resultado:
+            manifiesto["version"] += 1
+            manifiesto["actualizado"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            _guardar_manifiesto(manifiesto)
+    print(f"Versión de los datos: {manifiesto['version']}" + ("" if resultado else " (sin cambios)"))
+    return resultado
+
+def abrir_dataset(tabla: str) -> ds.Dataset:
+    return ds.dataset(asegurar_local(tabla), format="parquet")
+
+def _filtro_codigos(dataset: ds.Dataset, codigos: Iterable) -> ds.Expression:
+    # Los códigos se convierten al tipo de la columna en el archivo para que
+    # el filtro pueda compararse con las estadísticas de cada row group
+    tipo = dataset.schema.field("CODIGO_SNIES").type
+    valores = pa.array(list(codigos)).cast(tipo)
+    return ds.field("CODIGO_SNIES").isin(valores)
+
+def leer_tabla(
+    tabla: str,
+    columnas: Optional[List[str]] = None,
+    codigos_snies: Optional[Iterable] = None,
+    periodos: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    Lee una tabla de SNIES proyectando solo `columnas` (por defecto COLUMNAS_USADAS)
+    y, si se dan `codigos_snies`, empujando el filtro CODIGO_SNIES in (...) al
+    escaneo, de modo que los row groups sin esos códigos no se descomprimen.
+    Con `periodos` solo se leen esas particiones (por las estadísticas de PERIODO).
+    """
+    dataset = abrir_dataset(tabla)
+    disponibles = set(dataset.schema.names)
+    columnas = [c for c in (columnas or COLUMNAS_USADAS) if c in disponibles]
+
+    filtro = None
+    if codigos_snies is not None:
+        filtro = _filtro_codigos(dataset, codigos_snies)
+    if periodos is not None:
+        tipo = dataset.schema.field("PERIODO").type
+        por_periodo = ds.field("PERIODO").isin(pa.array(list(periodos), pa.string()).cast(tipo))
+        filtro = por_periodo if filtro is None else filtro & por_periodo
+
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+# -------------------------
+# Artefactos derivados (se reconstruyen cuando cambia su versión de origen)
+# -------------------------
+def _leer_derivado(nombre: str, version: str) -> Optional[pd.DataFrame]:
+    ruta = ruta_local(nombre)
+    if not os.path.exists(ruta):
+        return None
+    metadata = pq.read_schema(ruta).metadata or {}
+    if metadata.get(b"version_origen", b"").decode() != version:
+        return None
+    return pd.read_parquet(ruta)
+
+def _guardar_derivado(df: pd.DataFrame, nombre: str, version: str) -> None:
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(tabla.schema.metadata or {})
+    metadata[b"version_origen"] = version.encode()
+    ruta = ruta_local(nombre)
+    pq.write_table(tabla.replace_schema_metadata(metadata), ruta + ".tmp")
+    os.replace(ruta + ".tmp", ruta)
+
+# -------------------------
+# Copias en memoria para procesos de larga vida (servicio HTTP)
+# -------------------------
+# Después de precargar() el catálogo normalizado, la tabla de hechos y el
+# índice se leen una vez y se comparten, solo lectura, entre peticiones.
+# Cada copia recuerda la versión de la que salió: si cambian los archivos
+# se vuelve a leer. Sin precargar() todo se lee de disco en cada llamada.
+_memoria: Optional[Dict[str, Tuple[str, Any]]] = None
+_lock_memoria = threading.RLock()  # cargar() puede pedir otras copias (HECHOS -> catálogo)
+
+def en_memoria(nombre: str, version: str, cargar: Callable[[], Any]) -> Any:
+    """Resultado de cargar(), reutilizando la copia en memoria de esa versión si están activas."""
+    if _memoria is None:
+        return cargar()
+    with _lock_memoria:
+        guardado = _memoria.get(nombre)
+        if guardado is None or guardado[0] != version:
+            guardado = (version, cargar())
+            _memoria[nombre] = guardado
+        return guardado[1]
+
+def precargar() -> None:
+    """Activa las copias en memoria y carga el catálogo normalizado y la tabla de hechos."""
+    global _memoria
+    if _memoria is None:
+        _memoria = {}
+    programas_normalizados()
+    leer_hechos([])
+
+def programas_normalizados() -> pd.DataFrame:
+    """
+    PROGRAMAS con la columna PROGRAMA_ACADEMICO_NORMALIZADO. La normalización
+    se calcula una vez por versión del catálogo (sobre los nombres distintos)
+    y se guarda en PROGRAMAS_NORMALIZADO.parquet. Con precargar() el resultado
+    es compartido: no modificarlo.
+    """
+    version = version_catalogo()
+    return en_memoria("PROGRAMAS_NORMALIZADO", version, lambda: _programas_normalizados(version))
+
+def _programas_normalizados(version: str) -> pd.DataFrame:
+    programas = _leer_derivado("PROGRAMAS_NORMALIZADO", version)
+    if programas is not None:
+        return programas
+
+    print("Normalizando nombres del catálogo de programas")
+    programas = leer_tabla("PROGRAMAS")
+    nombres = programas["PROGRAMA_ACADEMICO"].fillna("").astype(str)
+    normalizados = {n: normalizar_texto(n) for n in nombres.unique()}
+    programas["PROGRAMA_ACADEMICO_NORMALIZADO"] = nombres.map(normalizados)
+    _guardar_derivado(programas, "PROGRAMAS_NORMALIZADO", version)
+    return programas
+
+# -------------------------
+# Tabla de hechos: MAESTRO ⋈ PROGRAMAS ⋈ OFERTA ⋈ IES, materializada
+# -------------------------
+COLUMNAS_CATEGORICAS = ["SECTOR_IES", "DEPARTAMENTO_PROGRAMA", "MUNICIPIO_PROGRAMA", "PROCESO"]
+
+def version_datos() -> str:
+    """Id de versión del conjunto de datos local (sube con cada actualización que cambia alguna tabla)."""
+    for tabla in TABLAS:
+        _entrada(tabla)
+    return str(_leer_manifiesto()["version"])
+
+def _unir(izq: pd.DataFrame, der: pd.DataFrame, on: List[str]) -> pd.DataFrame:
+    # Las columnas repetidas se conservan del lado izquierdo; así no aparecen
+    # los sufijos _x/_y de los merge encadenados. Los enteros del lado derecho
+    # pasan a Int64: con o sin faltantes en un periodo quedan del mismo tipo
+    der = der.drop(columns=[c for c in der.columns if c in izq.columns and c not in on])
+    enteros = [c for c in der.columns if c not in on and pd.api.types.is_integer_dtype(der[c])]
+    return izq.merge(der.astype({c: "Int64" for c in enteros}), on=on, how="left")
+
+def _versiones_hechos() -> Dict[str, str]:
+    """Versión que debe tener cada partición de HECHOS: la de su periodo en MAESTRO y OFERTA, PROGRAMAS e IES."""
+    comunes = (version_catalogo(), version_tabla("IES"))
+    oferta = particiones("OFERTA")
+    return {
+        periodo: _huella(*comunes, version, oferta.get(periodo, ""))
+        for periodo, version in particiones("MAESTRO").items()
+    }
+
+def _version_origen(ruta: str) -> str:
+    if not os.path.exists(ruta):
+        return ""
+    return ((pq.read_schema(ruta).metadata or {}).get(b"version_origen") or b"").decode()
+
+def construir_hechos(periodos: Iterable[str], versiones: Dict[str, str]) -> None:
+    """Une las cuatro tablas para cada periodo dado y guarda cada uno tipado en HECHOS/PERIODO=<p>.parquet."""
+    periodos = list(periodos)
+    print(f"Construyendo tabla de hechos de SNIES: {len(periodos)} periodos")
+    ies = leer_tabla("IES", columnas=COLUMNAS_IES).rename(columns={"INSTITUCION": "INSTITUCION_IES"})
+    programas = programas_normalizados()
+    os.makedirs(ruta_local("HECHOS"), exist_ok=True)
+    for periodo in periodos:
+        hechos = _unir(leer_tabla("MAESTRO", periodos=[periodo]), programas, ["CODIGO_SNIES"])
+        hechos = _unir(hechos, leer_tabla("OFERTA", periodos=[periodo]), ["CODIGO_SNIES", "PERIODO"])
+        hechos = _unir(hechos, ies, ["CODIGO_INSTITUCION"])
+
+        for col in COLUMNAS_CATEGORICAS:
+            if col in hechos.columns:
+                hechos[col] = hechos[col].astype("category")
+        # PERIODO se conserva como etiqueta ("2021-1"); PROXY_PER (tipado al
+        # descargar, ver ESQUEMA_NUMERICO) es su versión entera (20211)
+
+        # Ordenar por código hace que cada row group cubra un rango estrecho de
+        # códigos y el filtro de leer_hechos descarte casi todos
+        hechos = hechos.sort_values("CODIGO_SNIES", kind="stable", ignore_index=True)
+        tabla = pa.Table.from_pandas(hechos, preserve_index=False)
+        # Índices de diccionario del mismo ancho en todas las particiones
+        tabla = tabla.cast(pa.schema([
+            f.with_type(pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+            for f in tabla.schema
+        ], metadata=tabla.schema.metadata))
+        metadata = dict(tabla.schema.metadata or {})
+        metadata[b"version_origen"] = versiones[periodo].encode()
+        _escribir(tabla.replace_schema_metadata(metadata), ruta_particion("HECHOS", periodo), row_group_size=64_000)
+
+def _abrir_hechos() -> ds.Dataset:
+    """
+    Dataset de HECHOS con todas sus particiones vigentes: se construyen solo
+    las de periodos nuevos o cuyos datos de origen cambiaron y se borran las
+    de periodos que ya no están.
+    """
+    with _lock_almacen:
+        versiones = _versiones_hechos()
+        vencidas = [p for p, v in versiones.items() if _version_origen(ruta_particion("HECHOS", p)) != v]
+        if vencidas:
+            construir_hechos(vencidas, versiones)
+        vigentes = {os.path.basename(ruta_particion("HECHOS", p)) for p in versiones}
+        for archivo in os.listdir(ruta_local("HECHOS")):
+            if archivo.endswith(".parquet") and archivo not in vigentes:
+                os.remove(os.path.join(ruta_local("HECHOS"), archivo))
+        if os.path.exists(ruta_local("HECHOS") + ".parquet"):
+            os.remove(ruta_local("HECHOS") + ".parquet")  # tabla de hechos sin particionar (versión anterior)
+    return ds.dataset(ruta_local("HECHOS"), format="parquet")
+
+def _rangos_codigos() -> Tuple[pa.DataType, Dict[str, List[Tuple[Any, Any]]]]:
+    """Mínimo y máximo de CODIGO_SNIES de cada row group, por partición de HECHOS (solo lee los pies de página)."""
+    dataset, rangos = _abrir_hechos(), {}
+    for fragmento in dataset.get_fragments():
+        metadata = pq.read_metadata(fragmento.path)
+        columna = metadata.schema.names.index("CODIGO_SNIES")
+        rangos[os.path.basename(fragmento.path)] = [
+            (e.min, e.max) if (e := metadata.row_group(i).column(columna).statistics) is not None and e.has_min_max
+            else (None, None)
+            for i in range(metadata.num_row_groups)
+        ]
+    return dataset.schema.field("CODIGO_SNIES").type, rangos
+
+def version_hechos(codigos_snies: Iterable) -> str:
+    """
+    Versión de las filas de HECHOS de esos códigos: la de las particiones
+    que pueden contenerlos según el rango de códigos de cada row group.
+    Un periodo nuevo o corregido solo la cambia para los programas que
+    aparecen en él, así que las etapas de los demás estudios siguen vigentes.
+    """
+    versiones = _versiones_hechos()
+    tipo, rangos = en_memoria("rangos_hechos", version_datos(), _rangos_codigos)
+    codigos = pa.array(list(codigos_snies)).cast(tipo).to_pylist()
+    presentes = []
+    for periodo, version in sorted(versiones.items()):
+        for minimo, maximo in rangos.get(os.path.basename(ruta_particion("HECHOS", periodo)), [(None, None)]):
+            if minimo is None or any(minimo <= c <= maximo for c in codigos):
+                presentes.append((periodo, version))
+                break
+    return _huella(presentes)
+
+def leer_hechos(codigos_snies: Iterable) -> pd.DataFrame:
+    """Filas de la tabla de hechos para los códigos SNIES dados (se reconstruyen las particiones vencidas)."""
+    if _memoria is None:
+        dataset = _abrir_hechos()
+    else:
+        # La tabla completa en memoria; el filtro por código se aplica igual
+        dataset = en_memoria("HECHOS", version_datos(), lambda: ds.dataset(_abrir_hechos().to_table()))
+    hechos = dataset.to_table(filter=_filtro_codigos(dataset, codigos_snies)).to_pandas()
+    # Las particiones van por periodo; las filas de un programa quedan juntas y en orden
+    hechos = hechos.sort_values(["CODIGO_SNIES", "PERIODO"], kind="stable", ignore_index=True)
+    # Las categorías vienen de todas las particiones; se dejan solo las presentes y en orden
+    for col in hechos.select_dtypes("category").columns:
+        presentes = hechos[col].cat.remove_unused_categories()
+        hechos[col] = presentes.cat.reorder_categories(sorted(presentes.cat.categories))
+    return hechos
+
+# ------------------------------------------------------------------
+# Línea de comandos (desde notebooks/; SNIES_URL_BASE puede ser una carpeta):
+#   python almacen_snies.py actualizar [--tablas MAESTRO OFERTA] [--forzar]
+#   python almacen_snies.py estado
+# ------------------------------------------------------------------
+def main(argumentos: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Almacén local de SNIES")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    actualizacion = comandos.add_parser("actualizar", help="Trae de SNIES_URL_BASE solo los periodos nuevos o cambiados")
+    actualizacion.add_argument("--tablas", nargs="+", choices=TABLAS, default=list(TABLAS))
+    actualizacion.add_argument("--forzar", action="store_true", help="Descarga y compara aunque el origen parezca igual")
+    comandos.add_parser("estado", help="Versión de los datos y periodos de cada tabla")
+    args = parser.parse_args(argumentos)
+
+    if args.comando == "actualizar":
+        if actualizar(args.tablas, forzar=args.forzar):
+            # Las particiones de HECHOS de los periodos cambiados se reconstruyen
+            # ya, no en la primera consulta
+            _abrir_hechos()
+        return
+
+    manifiesto = _leer_manifiesto()
+    print(f"Versión de los datos: {manifiesto['version']}  ({manifiesto.get('actualizado', '-')})")
+    for tabla in TABLAS:
+        entrada = manifiesto["tablas"].get(tabla)
+        if entrada is None:
+            print(f"{tabla:<10} sin descargar")
+            continue
+        periodos = sorted(entrada.get("particiones", {}))
+        rango = f"  {len(periodos)} periodos ({periodos[0]} a {periodos[-1]})" if periodos else ""
+        print(f"{tabla:<10} {entrada['version']}  {entrada.get('origen', {}).get('tamano') or '-'} bytes{rango}")
+
+if __name__ == "__main__":
+    main()
@@ -6,48 +6,47 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import os
 from estado import AgentState, Nivel
+from cache_llm import invocar_estructurado, invocar_estructurado_lote
+from descargador_web import ENCABEZADOS
+from extraccion_html import extraer_texto
+from cache_paginas import CachePaginas, cache_por_defecto
+from limite_tasa import limite_http
 import json
 import re
 from typing import Any, Dict, List, Optional, TypedDict
 import requests
-from bs4 import BeautifulSoup
 from langchain_core.tools import tool
 from langgraph.prebuilt import create_react_agent
 import numpy as np
-import time
+
+# Llamadas simultáneas al LLM al generar las consultas de todos los programas en lote
+MAX_CONCURRENCIA_CONSULTAS = int(os.getenv("MAX_CONCURRENCIA_CONSULTAS", os.getenv("MAX_CONCURRENCIA_LLM", "5")))
+
+# Sesión compartida: reutiliza conexiones entre llamadas a fetch_url. Para
+# descargar muchas URLs a la vez usar descargador_web.DescargadorWeb.
+_sesion = requests.Session()
+_sesion.headers.update(ENCABEZADOS)
 
 def fetch_url(url: str, timeout_s: int = 20) -> str:
     """Descarga el HTML de una URL (para scraping). Devuelve texto HTML."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; research-bot/1.0)"
-    }
-    r = requests.get(url, headers=headers, timeout=timeout_s)
+    # Páginas frescas salen del caché; las demás se revalidan (304 = sin cambios)
+    cache_paginas = cache_por_defecto()
+    guardada = cache_paginas.obtener(url, extraer_texto.__name__)
+    if guardada is not None and cache_paginas.fresca(guardada):
+        return cache_paginas.servir(guardada)
+    limite_http.esperar()
+    r = _sesion.get(url, timeout=timeout_s, headers=CachePaginas.encabezados_condicionales(guardada))
+    if r.status_code == 304 and guardada is not None:
+        return cache_paginas.servir(guardada, revalidada=True)
     r.raise_for_status()
-    html=r.text
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Limpieza básica: quitar scripts/styles
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-
-    text = " ".join(soup.get_text(" ").split())
-    text = text[:20000]  # recorte defensivo
+    text = extraer_texto(r.text)
+    cache_paginas.guardar(url, text, r.status_code, r.headers, extraer_texto.__name__)
     return text
 
 class QueryPlan(BaseModel):
     queries: List[str] = Field(..., description="Consultas de búsqueda enfocadas en reviews confiables.")
 
-def build_query_agent(state: AgentState) -> Dict[str, Any]:
-    print('\nAgente: Generación de consultas de búsqueda para información detallada del programa académico')
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    progs=state.informacion_programas_nacionales or []
-    revisar=0
-    for idx, prg in enumerate(progs):
-        if prg.iteraciones < 1 or len(prg.queries) == 0:
-            revisar=idx
-            break
-    prg=progs[revisar]
-    print(f"Generando consultas para el programa: {prg.Programa} de la institución {prg.Institucion}")
+def _mensajes_consultas(prg) -> List[Any]:
     system=f"""
 Encontrar solo URLs que contengan información detallada y estructurada sobre el programa,
 para poder extraer los siguientes datos:
@@ -68,23 +67,64 @@ Criterios de búsqueda:
     URL oficiales del programa o de la universidad correspondiente. 
     Tu objetivo es construir 4 queries que se van a usar para buscar en la web información detallada sobre el programa académico.
 """
-    time.sleep(0.5)
-    plan = llm.with_structured_output(QueryPlan).invoke([
+    return [
         SystemMessage(content=system),
         HumanMessage(content=prompt)
-    ])
-    plan = QueryPlan.model_validate(plan.model_dump())
+    ]
+
+def _pendiente(prg) -> bool:
+    return prg.iteraciones < 1 or len(prg.queries) == 0
+
+def build_query_agent(state: AgentState) -> Dict[str, Any]:
+    print('\nAgente: Generación de consultas de búsqueda para información detallada del programa académico')
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    progs=state.informacion_programas_nacionales or []
+    revisar=0
+    for idx, prg in enumerate(progs):
+        if _pendiente(prg):
+            revisar=idx
+            break
+    prg=progs[revisar]
+    print(f"Generando consultas para el programa: {prg.Programa} de la institución {prg.Institucion}")
+    # Los límites de tasa se manejan con reintentos y backoff (ver cache_llm.con_reintentos)
+    plan = invocar_estructurado(llm, QueryPlan, _mensajes_consultas(prg))
     #print('Salida del llm: ', plan)
     updated_prog = prg.model_copy(update={"queries": list(plan.queries), "iteraciones": prg.iteraciones + 1})
     updated_list=list(progs)
-    updated_list[idx]=updated_prog
+    updated_list[revisar]=updated_prog
     #print(updated_list)
     return {'informacion_programas_nacionales': updated_list}
 
+def build_query_agent_lote(state: AgentState) -> Dict[str, Any]:
+    """
+    Como build_query_agent, pero genera en una sola ejecución del nodo las
+    consultas de todos los programas pendientes (llm.batch con concurrencia
+    limitada). Los que fallen por un error distinto al límite de tasa quedan
+    pendientes (iteraciones=0) para una próxima ejecución.
+    """
+    print('\nAgente: Generación en lote de consultas de búsqueda para los programas académicos')
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    progs=list(state.informacion_programas_nacionales or [])
+    pendientes=[idx for idx, prg in enumerate(progs) if _pendiente(prg)]
+    print(f"Generando consultas para {len(pendientes)} programas")
+    planes = invocar_estructurado_lote(
+        llm, QueryPlan, [_mensajes_consultas(progs[idx]) for idx in pendientes],
+        max_concurrencia=MAX_CONCURRENCIA_CONSULTAS,
+    )
+    for idx, plan in zip(pendientes, planes):
+        if plan is None:
+            continue
+        prg=progs[idx]
+        progs[idx]=prg.model_copy(update={"queries": list(plan.queries), "iteraciones": prg.iteraciones + 1})
+    fallidos=sum(plan is None for plan in planes)
+    if fallidos:
+        print(f"{fallidos} programas quedaron sin consultas")
+    return {'informacion_programas_nacionales': progs}
+
 def decide_iterate(state: AgentState) -> str:
     # Determina si alguno de los programas nacionales tiene una iteración 0 o no tiene queries por revisar. En este caso, coloca el target_index al programa que debe completarse. Si todos los programas tienen iteración mayor a 0 y tienen queries, entonces se decide terminar.
     progs=state.informacion_programas_nacionales or []
     for idx, prg in enumerate(progs):
-        if prg.iteraciones < 1 or len(prg.queries) == 0:
+        if _pendiente(prg):
             return "iterate"
     return "finish"
\ No newline at end of file
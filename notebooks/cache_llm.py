@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Type
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from almacen_snies import DIRECTORIO
+from limite_tasa import limite_llm
+
+# -------------------------
+# Caché persistente de respuestas del LLM
+# -------------------------
+# La clave es un hash de (modelo con sus parámetros, mensajes con su contenido
+# completo), así que si los datos del prompt o la temperatura cambian la
+# clave cambia y no se reutiliza una respuesta vieja; y prompts idénticos de
+# programas distintos se comparten.
+RUTA_CACHE_LLM = os.getenv("CACHE_LLM_RUTA", os.path.join(DIRECTORIO, "cache_llm.sqlite"))
+TTL_CACHE_LLM_S = float(os.getenv("CACHE_LLM_TTL_S", str(30 * 24 * 3600)))
+MAX_ENTRADAS_CACHE_LLM = int(os.getenv("CACHE_LLM_MAX_ENTRADAS", "5000"))
+
+# Reintentos ante límites de tasa (HTTP 429) del proveedor
+REINTENTOS_LLM = int(os.getenv("LLM_REINTENTOS", "5"))
+ESPERA_BASE_LLM_S = float(os.getenv("LLM_ESPERA_BASE_S", "1.0"))
+
+def nombre_modelo(llm) -> str:
+    llm = getattr(llm, "bound", llm)
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+def parametros_modelo(llm) -> str:
+    """Modelo y parámetros que cambian la respuesta (temperatura, max_tokens...), incluidos los de llm.bind(...)."""
+    parametros = dict(getattr(getattr(llm, "bound", llm), "_identifying_params", None) or {})
+    parametros.update(getattr(llm, "kwargs", None) or {})
+    return json.dumps([nombre_modelo(llm), parametros], ensure_ascii=False, sort_keys=True, default=str)
+
+class CacheLLM:
+    """Tabla SQLite clave -> respuesta, con expiración (TTL) y desalojo LRU."""
+
+    def __init__(self, ruta: str = RUTA_CACHE_LLM, ttl_s: float = TTL_CACHE_LLM_S,
+                 max_entradas: int = MAX_ENTRADAS_CACHE_LLM):
+        self.ruta = ruta
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                " clave TEXT PRIMARY KEY, modelo TEXT, respuesta TEXT,"
+                " creado REAL, ultimo_acceso REAL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_acceso ON respuestas(ultimo_acceso)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        # Una conexión por operación: el caché se usa desde hilos y procesos distintos
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def clave(llm, mensajes: List[BaseMessage], extra: str = "") -> str:
+        contenido = [[m.type, m.content] for m in mensajes]
+        texto = json.dumps([parametros_modelo(llm), contenido, extra], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[str]:
+        ahora = time.time()
+        with self._lock, self._conectar() as con:
+            fila = con.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is not None and ahora - fila[1] > self.ttl_s:
+                con.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                fila = None
+            if fila is None:
+                self.fallos += 1
+                return None
+            con.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+            self.aciertos += 1
+            return fila[0]
+
+    def guardar(self, clave: str, modelo: str, respuesta: str) -> None:
+        ahora = time.time()
+        with self._lock, self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?)",
+                (clave, modelo, respuesta, ahora, ahora),
+            )
+            # LRU: se borran las de acceso más antiguo que excedan el máximo
+            con.execute(
+                "DELETE FROM respuestas WHERE clave IN ("
+                " SELECT clave FROM respuestas ORDER BY ultimo_acceso DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,),
+            )
+
+    def estadisticas(self) -> dict:
+        with self._conectar() as con:
+            entradas = con.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / total if total else 0.0,
+            "entradas": entradas,
+        }
+
+# Se crea al primer uso: importar el módulo no escribe nada en DIRECTORIO
+_cache_llm: Optional[CacheLLM] = None
+_lock_cache_llm = threading.Lock()
+
+def cache_por_defecto() -> CacheLLM:
+    global _cache_llm
+    with _lock_cache_llm:
+        if _cache_llm is None:
+            _cache_llm = CacheLLM()
+        return _cache_llm
+
+# -------------------------
+# Límites de tasa
+# -------------------------
+def es_limite_tasa(exc: BaseException) -> bool:
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    return "RateLimit" in type(exc).__name__ or "rate limit" in str(exc).lower()
+
+def espera_reintento(intento: int, exc: Optional[BaseException] = None) -> float:
+    """Segundos a esperar: Retry-After si el proveedor lo envía, si no backoff exponencial con jitter."""
+    respuesta = getattr(exc, "response", None)
+    encabezados = getattr(respuesta, "headers", None) or {}
+    try:
+        return float(encabezados.get("retry-after"))
+    except (TypeError, ValueError):
+        return ESPERA_BASE_LLM_S * (2 ** intento) * (0.5 + random.random())
+
+def con_reintentos(funcion: Callable[[], Any], reintentos: int = REINTENTOS_LLM) -> Any:
+    for intento in range(reintentos + 1):
+        try:
+            # Cada intento cuenta contra el cupo global de llamadas (limite_tasa)
+            limite_llm.esperar()
+            return funcion()
+        except Exception as exc:
+            if not es_limite_tasa(exc) or intento == reintentos:
+                raise
+            espera = espera_reintento(intento, exc)
+            print(f"Límite de tasa del LLM; reintento {intento + 1} en {espera:.1f}s")
+            time.sleep(espera)
+
+async def acon_reintentos(funcion: Callable[[], Awaitable[Any]], reintentos: int = REINTENTOS_LLM) -> Any:
+    """con_reintentos para corrutinas: espera con asyncio.sleep sin bloquear el event loop."""
+    for intento in range(reintentos + 1):
+        try:
+            await limite_llm.aesperar()
+            return await funcion()
+        except Exception as exc:
+            if not es_limite_tasa(exc) or intento == reintentos:
+                raise
+            espera = espera_reintento(intento, exc)
+            print(f"Límite de tasa del LLM; reintento {intento + 1} en {espera:.1f}s")
+            await asyncio.sleep(espera)
+
+# -------------------------
+# Invocación a través del caché
+# -------------------------
+def invocar(llm, mensajes: List[BaseMessage], cache: Optional[CacheLLM] = None) -> str:
+    """llm.invoke(mensajes).content, leyendo/escribiendo el caché."""
+    cache = cache or cache_por_defecto()
+    modelo = nombre_modelo(llm)
+    clave = cache.clave(llm, mensajes)
+    respuesta = cache.obtener(clave)
+    if respuesta is None:
+        respuesta = con_reintentos(lambda: llm.invoke(mensajes)).content
+        cache.guardar(clave, modelo, respuesta)
+    return respuesta
+
+async def ainvocar(llm, mensajes: List[BaseMessage], cache: Optional[CacheLLM] = None) -> str:
+    # SQLite (y el lock del caché) en un hilo: no bloquean el event loop
+    cache = cache or await asyncio.to_thread(cache_por_defecto)
+    modelo = nombre_modelo(llm)
+    clave = cache.clave(llm, mensajes)
+    respuesta = await asyncio.to_thread(cache.obtener, clave)
+    if respuesta is None:
+        respuesta = (await acon_reintentos(lambda: llm.ainvoke(mensajes))).content
+        await asyncio.to_thread(cache.guardar, clave, modelo, respuesta)
+    return respuesta
+
+def invocar_estructurado(llm, esquema: Type[BaseModel], mensajes: List[BaseMessage],
+                         cache: Optional[CacheLLM] = None) -> BaseModel:
+    """llm.with_structured_output(esquema).invoke(mensajes), guardando el JSON del resultado."""
+    cache = cache or cache_por_defecto()
+    modelo = nombre_modelo(llm)
+    clave = cache.clave(llm, mensajes, extra=json.dumps(esquema.model_json_schema(), sort_keys=True))
+    guardado = cache.obtener(clave)
+    if guardado is not None:
+        return esquema.model_validate_json(guardado)
+    resultado = con_reintentos(lambda: llm.with_structured_output(esquema).invoke(mensajes))
+    resultado = esquema.model_validate(resultado.model_dump())
+    cache.guardar(clave, modelo, resultado.model_dump_json())
+    return resultado
+
+def _con_cupo(entrada: Any) -> Any:
+    limite_llm.esperar()
+    return entrada
+
+def invocar_estructurado_lote(llm, esquema: Type[BaseModel], lote: List[List[BaseMessage]],
+                              max_concurrencia: int, cache: Optional[CacheLLM] = None,
+                              reintentos: int = REINTENTOS_LLM) -> List[Optional[BaseModel]]:
+    """
+    invocar_estructurado para varios prompts: los que están en caché no se
+    envían y el resto va en un solo llm.batch con a lo sumo `max_concurrencia`
+    llamadas simultáneas. Los que fallan por límite de tasa se reintentan con
+    backoff; los que fallan por otro motivo quedan en None.
+    """
+    cache = cache or cache_por_defecto()
+    modelo = nombre_modelo(llm)
+    extra = json.dumps(esquema.model_json_schema(), sort_keys=True)
+    claves = [cache.clave(llm, mensajes, extra=extra) for mensajes in lote]
+    resultados: List[Optional[BaseModel]] = [None] * len(lote)
+
+    pendientes = []
+    for i, clave in enumerate(claves):
+        guardado = cache.obtener(clave)
+        if guardado is not None:
+            resultados[i] = esquema.model_validate_json(guardado)
+        else:
+            pendientes.append(i)
+    print(f"Lote estructurado: {len(lote) - len(pendientes)} desde caché, {len(pendientes)} al LLM")
+
+    # Cada elemento del batch espera su turno en el cupo global antes de salir
+    estructurado = RunnableLambda(_con_cupo) | llm.with_structured_output(esquema)
+    for intento in range(reintentos + 1):
+        if not pendientes:
+            break
+        salidas = estructurado.batch(
+            [lote[i] for i in pendientes],
+            config={"max_concurrency": max_concurrencia},
+            return_exceptions=True,
+        )
+        limitados, error_tasa = [], None
+        for i, salida in zip(pendientes, salidas):
+            if isinstance(salida, Exception):
+                if es_limite_tasa(salida):
+                    limitados.append(i)
+                    error_tasa = salida
+                else:
+                    print(f"Error en el elemento {i} del lote: {salida}")
+                continue
+            resultado = esquema.model_validate(salida.model_dump())
+            cache.guardar(claves[i], modelo, resultado.model_dump_json())
+            resultados[i] = resultado
+        pendientes = limitados
+        if pendientes and intento < reintentos:
+            espera = espera_reintento(intento, error_tasa)
+            print(f"Límite de tasa del LLM en {len(pendientes)} elementos; reintento en {espera:.1f}s")
+            time.sleep(espera)
+    return resultados
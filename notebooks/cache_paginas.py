@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from almacen_snies import DIRECTORIO
+
+# -------------------------
+# Caché persistente de páginas descargadas
+# -------------------------
+# Guarda el texto ya limpio de cada página junto con su ETag/Last-Modified.
+# Dentro de la ventana de frescura se sirve sin tocar la red; después se
+# revalida con una petición condicional (un 304 solo renueva la entrada).
+RUTA_CACHE_PAGINAS = os.getenv("CACHE_PAGINAS_RUTA", os.path.join(DIRECTORIO, "cache_paginas.sqlite"))
+FRESCURA_PAGINAS_S = float(os.getenv("CACHE_PAGINAS_FRESCURA_S", str(7 * 24 * 3600)))
+MAX_BYTES_CACHE_PAGINAS = int(os.getenv("CACHE_PAGINAS_MAX_BYTES", str(200 * 1024 * 1024)))
+
+_PUERTOS_POR_DEFECTO = {"http": 80, "https": 443}
+
+def normalizar_url(url: str) -> str:
+    """
+    Clave de la página: esquema y host en minúsculas, sin puerto por defecto,
+    sin fragmento, parámetros ordenados y sin "/" final.
+    """
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or "").lower()
+    if partes.port and partes.port != _PUERTOS_POR_DEFECTO.get(esquema):
+        host = f"{host}:{partes.port}"
+    ruta = partes.path.rstrip("/") or "/"
+    consulta = urlencode(sorted(parse_qsl(partes.query, keep_blank_values=True)))
+    return urlunsplit((esquema, host, ruta, consulta, ""))
+
+@dataclass
+class PaginaGuardada:
+    url: str
+    texto: str
+    estado: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    extractor: str
+    verificado: float
+
+class CachePaginas:
+    """Tabla SQLite url normalizada -> texto limpio, con frescura, revalidación y tope en bytes (LRU)."""
+
+    def __init__(self, ruta: str = RUTA_CACHE_PAGINAS, frescura_s: float = FRESCURA_PAGINAS_S,
+                 max_bytes: int = MAX_BYTES_CACHE_PAGINAS):
+        self.ruta = ruta
+        self.frescura_s = frescura_s
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.revalidadas = 0
+        self.descargas = 0
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS paginas ("
+                " url TEXT PRIMARY KEY, texto TEXT, estado INTEGER, etag TEXT, last_modified TEXT,"
+                " extractor TEXT, verificado REAL, ultimo_acceso REAL, bytes INTEGER)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_paginas_acceso ON paginas(ultimo_acceso)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def obtener(self, url: str, extractor: str) -> Optional[PaginaGuardada]:
+        """Entrada guardada de la URL (fresca o no); None si no hay o se extrajo con otro extractor."""
+        clave = normalizar_url(url)
+        with self._lock, self._conectar() as con:
+            fila = con.execute(
+                "SELECT texto, estado, etag, last_modified, extractor, verificado"
+                " FROM paginas WHERE url = ?", (clave,)
+            ).fetchone()
+            if fila is None or fila[4] != extractor:
+                return None
+            con.execute("UPDATE paginas SET ultimo_acceso = ? WHERE url = ?", (time.time(), clave))
+        return PaginaGuardada(clave, *fila)
+
+    def fresca(self, pagina: PaginaGuardada) -> bool:
+        return time.time() - pagina.verificado <= self.frescura_s
+
+    def servir(self, pagina: PaginaGuardada, revalidada: bool = False) -> str:
+        """Registra el uso de una entrada (fresca o confirmada con 304) y devuelve su texto."""
+        if revalidada:
+            with self._lock, self._conectar() as con:
+                con.execute("UPDATE paginas SET verificado = ? WHERE url = ?", (time.time(), pagina.url))
+            self.revalidadas += 1
+        else:
+            self.aciertos += 1
+        return pagina.texto
+
+    @staticmethod
+    def encabezados_condicionales(pagina: Optional[PaginaGuardada]) -> Dict[str, str]:
+        encabezados = {}
+        if pagina is not None and pagina.etag:
+            encabezados["If-None-Match"] = pagina.etag
+        if pagina is not None and pagina.last_modified:
+            encabezados["If-Modified-Since"] = pagina.last_modified
+        return encabezados
+
+    def guardar(self, url: str, texto: str, estado: int, encabezados, extractor: str) -> None:
+        ahora = time.time()
+        self.descargas += 1
+        with self._lock, self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO paginas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (normalizar_url(url), texto, estado, encabezados.get("etag"),
+                 encabezados.get("last-modified"), extractor, ahora, ahora,
+                 len(texto.encode("utf-8"))),
+            )
+            # Se desalojan las de acceso más antiguo hasta quedar bajo el tope de bytes
+            con.execute(
+                "DELETE FROM paginas WHERE url IN ("
+                " SELECT url FROM (SELECT url, SUM(bytes) OVER (ORDER BY ultimo_acceso DESC, url)"
+                " AS acumulado FROM paginas) WHERE acumulado > ?)",
+                (self.max_bytes,),
+            )
+
+    def estadisticas(self) -> dict:
+        with self._conectar() as con:
+            entradas, total = con.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM paginas").fetchone()
+        return {
+            "aciertos": self.aciertos,
+            "revalidadas": self.revalidadas,
+            "descargas": self.descargas,
+            "entradas": entradas,
+            "bytes": total,
+        }
+
+# Se crea al primer uso: importar el módulo no escribe nada en DIRECTORIO
+_cache_paginas: Optional[CachePaginas] = None
+_lock_cache_paginas = threading.Lock()
+
+def cache_por_defecto() -> CachePaginas:
+    global _cache_paginas
+    with _lock_cache_paginas:
+        if _cache_paginas is None:
+            _cache_paginas = CachePaginas()
+        return _cache_paginas
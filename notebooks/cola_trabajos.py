@@ -0,0 +1,314 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from multiprocessing.connection import wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import graficas_snies
+from almacen_snies import DIRECTORIO
+from graficas_snies import SALIDA, renderizar
+from grafo import ejecutar
+
+# -------------------------
+# Cola de estudios y trabajadores en paralelo
+# -------------------------
+# Cada estudio (nombre, nivel, descripcion, requerido) es una fila de la cola
+# en SQLite. Los trabajadores son procesos que toman estudios hasta vaciar la
+# cola. Entre ellos comparten por archivo los cachés del LLM y de páginas, las
+# etapas del lector, los puntos de control y el cupo de llamadas
+# (limite_tasa); los parquet de SNIES los comparten por el caché de páginas
+# del sistema operativo, así que no se precargan en cada proceso.
+# El id del trabajo es el thread_id del grafo: un estudio interrumpido o
+# fallido se retoma desde su último paso completo.
+#
+# Un trabajo en curso tiene un arriendo (`vence`) que su trabajador renueva
+# mientras corre. Si el trabajador muere, al vencer el arriendo otro lo toma
+# de nuevo; tras MAX_INTENTOS_TRABAJO intentos queda en error. correr_cola no
+# espera al arriendo: cada trabajador es un proceso aparte (uno que muere no
+# tumba a los demás) y lo que el caído tenía en curso vuelve enseguida a la cola.
+RUTA_COLA = os.getenv("COLA_TRABAJOS_RUTA", os.path.join(DIRECTORIO, "cola_trabajos.sqlite"))
+TRABAJADORES = int(os.getenv("COLA_TRABAJADORES", "4"))
+MAX_INTENTOS_TRABAJO = int(os.getenv("COLA_MAX_INTENTOS", "2"))
+ARRIENDO_S = float(os.getenv("COLA_ARRIENDO_S", "120"))
+
+ESTADOS = ("pendiente", "en_curso", "terminado", "error")
+
+class ColaTrabajos:
+    """Tabla SQLite de trabajos: pendiente -> en_curso -> terminado | error."""
+
+    def __init__(self, ruta: str = RUTA_COLA, arriendo_s: float = ARRIENDO_S):
+        self.ruta = ruta
+        self.arriendo_s = arriendo_s
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " id TEXT PRIMARY KEY, solicitud TEXT, estado TEXT, intentos INTEGER, error TEXT,"
+                " trabajador TEXT, creado REAL, iniciado REAL, terminado REAL, vence REAL)"
+            )
+            # Colas creadas antes de los arriendos
+            if "vence" not in {c["name"] for c in con.execute("PRAGMA table_info(trabajos)")}:
+                con.execute("ALTER TABLE trabajos ADD COLUMN vence REAL")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos(estado, creado)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.ruta, timeout=30)
+        con.row_factory = sqlite3.Row
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def encolar(self, solicitud: Dict[str, Any]) -> str:
+        id_trabajo = uuid.uuid4().hex
+        with self._conectar() as con:
+            con.execute(
+                "INSERT INTO trabajos (id, solicitud, estado, intentos, creado) VALUES (?, ?, 'pendiente', 0, ?)",
+                (id_trabajo, json.dumps(solicitud, ensure_ascii=False), time.time()),
+            )
+        return id_trabajo
+
+    def tomar(self, trabajador: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Marca en curso el pendiente más antiguo (o uno con el arriendo
+        vencido) y lo devuelve; None si no hay ninguno.
+        """
+        ahora = time.time()
+        with self._conectar() as con:
+            self._liberar_vencidos(con, ahora)
+            # Un solo UPDATE ... RETURNING: dos trabajadores no pueden tomar el mismo
+            fila = con.execute(
+                "UPDATE trabajos SET estado = 'en_curso', trabajador = ?, iniciado = ?, vence = ?,"
+                " intentos = intentos + 1"
+                " WHERE id = (SELECT id FROM trabajos WHERE estado = 'pendiente' ORDER BY creado LIMIT 1)"
+                " RETURNING id, solicitud",
+                (trabajador, ahora, ahora + self.arriendo_s),
+            ).fetchone()
+        return (fila["id"], json.loads(fila["solicitud"])) if fila else None
+
+    def renovar(self, id_trabajo: str, trabajador: str) -> bool:
+        """Extiende el arriendo; False si el trabajo ya no es de este trabajador (venció y otro lo tomó)."""
+        with self._conectar() as con:
+            return con.execute(
+                "UPDATE trabajos SET vence = ? WHERE id = ? AND trabajador = ? AND estado = 'en_curso'",
+                (time.time() + self.arriendo_s, id_trabajo, trabajador),
+            ).rowcount > 0
+
+    def terminar(self, id_trabajo: str, error: Optional[str] = None, trabajador: Optional[str] = None) -> bool:
+        """
+        Cierra el trabajo; si falló y le quedan intentos vuelve a la cola. Con
+        `trabajador` solo lo cierra si sigue siendo suyo (devuelve si lo cerró).
+        """
+        consulta = (
+            "UPDATE trabajos SET error = ?, terminado = ?, vence = NULL,"
+            " estado = CASE WHEN ? IS NULL THEN 'terminado'"
+            "               WHEN intentos < ? THEN 'pendiente' ELSE 'error' END"
+            " WHERE id = ?"
+        )
+        parametros = [error, time.time(), error, MAX_INTENTOS_TRABAJO, id_trabajo]
+        if trabajador is not None:
+            consulta += " AND trabajador = ? AND estado = 'en_curso'"
+            parametros.append(trabajador)
+        with self._conectar() as con:
+            return con.execute(consulta, parametros).rowcount > 0
+
+    @staticmethod
+    def _liberar_vencidos(con: sqlite3.Connection, ahora: float) -> int:
+        # Sin arriendo (colas anteriores) cuenta como vencido
+        return con.execute(
+            "UPDATE trabajos SET vence = NULL, terminado = ?,"
+            " error = 'Arriendo vencido: el trabajador ' || COALESCE(trabajador, '?') || ' dejó de responder',"
+            " estado = CASE WHEN intentos < ? THEN 'pendiente' ELSE 'error' END"
+            " WHERE estado = 'en_curso' AND (vence IS NULL OR vence < ?)",
+            (ahora, MAX_INTENTOS_TRABAJO, ahora),
+        ).rowcount
+
+    def liberar_interrumpidos(self) -> int:
+        """
+        Devuelve a la cola (o pasa a error si ya agotaron sus intentos) los
+        trabajos en curso cuyo arriendo venció. Los de trabajadores vivos no se tocan.
+        """
+        with self._conectar() as con:
+            return self._liberar_vencidos(con, time.time())
+
+    def liberar_trabajadores(self, prefijo: str) -> int:
+        """Como liberar_interrumpidos, para los trabajos de trabajadores que se sabe muertos (nombre con `prefijo`)."""
+        with self._conectar() as con:
+            con.execute(
+                "UPDATE trabajos SET vence = NULL WHERE estado = 'en_curso' AND substr(trabajador, 1, ?) = ?",
+                (len(prefijo), prefijo),
+            )
+            return self._liberar_vencidos(con, time.time())
+
+    def trabajo(self, id_trabajo: str) -> Optional[Dict[str, Any]]:
+        with self._conectar() as con:
+            fila = con.execute("SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+        return _como_dict(fila) if fila else None
+
+    def listar(self, estado: Optional[str] = None) -> List[Dict[str, Any]]:
+        consulta, parametros = "SELECT * FROM trabajos", ()
+        if estado is not None:
+            consulta, parametros = consulta + " WHERE estado = ?", (estado,)
+        with self._conectar() as con:
+            return [_como_dict(f) for f in con.execute(consulta + " ORDER BY creado", parametros)]
+
+    def resumen(self) -> Dict[str, int]:
+        with self._conectar() as con:
+            conteos = dict(con.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+        return {estado: conteos.get(estado, 0) for estado in ESTADOS}
+
+def _como_dict(fila: sqlite3.Row) -> Dict[str, Any]:
+    trabajo = dict(fila)
+    trabajo["solicitud"] = json.loads(trabajo["solicitud"])
+    return trabajo
+
+# ------------------------------------------------------------------
+# Trabajadores
+# ------------------------------------------------------------------
+def _iniciar_trabajador() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    # Varios estudios a la vez escribirían las mismas figuras en ./salida:
+    # dentro del grafo no se dibujan y al terminar van a salida/<id>/
+    graficas_snies.MODO_GRAFICAS = "none"
+
+@contextmanager
+def _latido(cola: ColaTrabajos, id_trabajo: str, trabajador: str) -> Iterator[None]:
+    """Renueva el arriendo del trabajo (cada tercio de su duración) mientras corre el bloque."""
+    parar = threading.Event()
+
+    def _renovar():
+        while not parar.wait(cola.arriendo_s / 3):
+            if not cola.renovar(id_trabajo, trabajador):
+                print(f"[{trabajador}] Se perdió el arriendo de {id_trabajo}")
+                return
+
+    hilo = threading.Thread(target=_renovar, daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        hilo.join()
+
+def _trabajador(ruta: str, modo_analisis: str, prefijo: str = "") -> int:
+    """Proceso trabajador: corre estudios hasta vaciar la cola."""
+    _iniciar_trabajador()
+    nombre = f"{prefijo}{socket.gethostname()}-{os.getpid()}"
+    cola = ColaTrabajos(ruta)
+    hechos = 0
+    while (tomado := cola.tomar(nombre)) is not None:
+        id_trabajo, solicitud = tomado
+        print(f"[{nombre}] Trabajo {id_trabajo}: {solicitud.get('nombre')}")
+        try:
+            with _latido(cola, id_trabajo, nombre):
+                estado = ejecutar({"informacion_programas_nacionales": [], **solicitud},
+                                  hilo=id_trabajo, modo_analisis=modo_analisis)
+                renderizar(estado.get("snies") or {}, modo="inline", directorio=os.path.join(SALIDA, id_trabajo))
+            hechos += cola.terminar(id_trabajo, trabajador=nombre)
+        except Exception as exc:
+            traceback.print_exc()
+            cola.terminar(id_trabajo, error=f"{type(exc).__name__}: {exc}", trabajador=nombre)
+    return hechos
+
+def correr_cola(procesos: int = TRABAJADORES, modo_analisis: str = "lote",
+                ruta: str = RUTA_COLA) -> Dict[str, int]:
+    """Corre los trabajos pendientes con `procesos` trabajadores y devuelve el resumen de la cola."""
+    cola = ColaTrabajos(ruta)
+    liberados = cola.liberar_interrumpidos()
+    if liberados:
+        print(f"{liberados} trabajos con el arriendo vencido vuelven a la cola (o pasan a error)")
+    pendientes = cola.resumen()["pendiente"]
+    activos = min(procesos, pendientes)
+    if activos == 0:
+        print("No hay trabajos pendientes")
+        return cola.resumen()
+    print(f"{pendientes} trabajos pendientes, {activos} procesos")
+
+    # spawn: cada trabajador importa los módulos de cero (sin hilos ni conexiones heredadas)
+    contexto = multiprocessing.get_context("spawn")
+    corrida, numeros = uuid.uuid4().hex[:8], itertools.count()
+    vivos: Dict[Any, Tuple[multiprocessing.process.BaseProcess, str]] = {}
+
+    def _lanzar() -> None:
+        # Prefijo propio por proceso: si muere se liberan solo sus trabajos
+        prefijo = f"{corrida}.{next(numeros)}-"
+        proceso = contexto.Process(target=_trabajador, args=(ruta, modo_analisis, prefijo))
+        proceso.start()
+        vivos[proceso.sentinel] = (proceso, prefijo)
+
+    inicio, terminados = time.time(), cola.resumen()["terminado"]
+    for _ in range(activos):
+        _lanzar()
+    while vivos:
+        for sentinela in wait(list(vivos)):
+            proceso, prefijo = vivos.pop(sentinela)
+            proceso.join()
+            if proceso.exitcode == 0:
+                continue
+            # El intento se cobró al tomar el trabajo: solo el del proceso caído lo pierde
+            liberados = cola.liberar_trabajadores(prefijo)
+            print(f"El trabajador {proceso.pid} murió (código {proceso.exitcode}); "
+                  f"{liberados} trabajos en curso vuelven a la cola o pasan a error")
+            # Reemplazo solo si la caída consumió un intento: así termina aunque
+            # un estudio tumbe siempre al proceso
+            if liberados and cola.resumen()["pendiente"] > 0 and len(vivos) < procesos:
+                _lanzar()
+    print(f"{cola.resumen()['terminado'] - terminados} trabajos terminados en {time.time() - inicio:.0f}s")
+    return cola.resumen()
+
+# ------------------------------------------------------------------
+# Línea de comandos (desde notebooks/):
+#   python cola_trabajos.py encolar estudios.json
+#   python cola_trabajos.py correr --procesos 4 --llm-por-min 300 --http-por-s 5
+#   python cola_trabajos.py estado [id]
+# ------------------------------------------------------------------
+def main(argumentos: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cola de estudios de programas")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    encolar = comandos.add_parser("encolar", help="Agrega los estudios de un JSON (lista de {nombre, nivel, descripcion, requerido})")
+    encolar.add_argument("archivo")
+    correr = comandos.add_parser("correr", help="Corre los trabajos pendientes")
+    correr.add_argument("--procesos", type=int, default=TRABAJADORES)
+    correr.add_argument("--modo-analisis", default="lote")
+    correr.add_argument("--llm-por-min", type=float, help="Cupo global de llamadas al LLM por minuto")
+    correr.add_argument("--http-por-s", type=float, help="Cupo global de peticiones HTTP por segundo")
+    estado = comandos.add_parser("estado", help="Resumen de la cola o detalle de un trabajo")
+    estado.add_argument("id", nargs="?")
+    args = parser.parse_args(argumentos)
+
+    cola = ColaTrabajos()
+    if args.comando == "encolar":
+        with open(args.archivo, encoding="utf-8") as f:
+            estudios = json.load(f)
+        for estudio in estudios:
+            print(cola.encolar(estudio), estudio.get("nombre"))
+    elif args.comando == "correr":
+        # Los trabajadores (spawn) leen los cupos de limite_tasa del entorno al importar
+        if args.llm_por_min is not None:
+            os.environ["LIMITE_LLM_POR_MIN"] = str(args.llm_por_min)
+        if args.http_por_s is not None:
+            os.environ["LIMITE_HTTP_POR_S"] = str(args.http_por_s)
+        print(correr_cola(args.procesos, args.modo_analisis))
+    elif args.id:
+        print(json.dumps(cola.trabajo(args.id), ensure_ascii=False, indent=1))
+    else:
+        print(cola.resumen())
+        for t in cola.listar():
+            duracion = f"{t['terminado'] - t['iniciado']:.0f}s" if t["terminado"] and t["iniciado"] else "-"
+            print(f"{t['id']}  {t['estado']:<10} {t['intentos']}  {duracion:>6}  {t['solicitud'].get('nombre')}"
+                  + (f"  ({t['error']})" if t["error"] else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import asyncio
+import contextvars
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+
+import httpx
+
+from cache_paginas import CachePaginas, cache_por_defecto
+from extraccion_html import MAX_CARACTERES, TAMANO_FRAGMENTO, ExtractorTexto
+from limite_tasa import limite_http
+
+# -------------------------
+# Descarga concurrente de páginas para el enriquecimiento de programas
+# -------------------------
+# Un solo httpx.AsyncClient (conexiones persistentes reutilizadas entre
+# páginas del mismo sitio), un tope total de descargas simultáneas y otro por
+# host para no saturar los sitios institucionales, que suelen ser lentos.
+MAX_DESCARGAS = int(os.getenv("DESCARGAS_MAX_CONCURRENCIA", "16"))
+MAX_DESCARGAS_POR_HOST = int(os.getenv("DESCARGAS_MAX_POR_HOST", "4"))
+TIMEOUT_CONEXION_S = float(os.getenv("DESCARGAS_TIMEOUT_CONEXION_S", "5"))
+TIMEOUT_LECTURA_S = float(os.getenv("DESCARGAS_TIMEOUT_S", "20"))
+REINTENTOS_DESCARGA = int(os.getenv("DESCARGAS_REINTENTOS", "3"))
+ESPERA_BASE_DESCARGA_S = float(os.getenv("DESCARGAS_ESPERA_BASE_S", "0.5"))
+
+ENCABEZADOS = {"User-Agent": "Mozilla/5.0 (compatible; research-bot/1.0)"}
+
+# Estados HTTP que vale la pena reintentar
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+@dataclass
+class Descarga:
+    """Resultado de descargar una URL. Si falló, `texto` es "" y `error` dice por qué."""
+    url: str
+    texto: str = ""
+    estado: Optional[int] = None
+    error: Optional[str] = None
+    intentos: int = 0
+    desde_cache: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def _espera(intento: int, respuesta: Optional[httpx.Response] = None) -> float:
+    if respuesta is not None:
+        try:
+            return min(float(respuesta.headers.get("retry-after")), 60.0)
+        except (TypeError, ValueError):
+            pass
+    return ESPERA_BASE_DESCARGA_S * (2 ** intento) * (0.5 + random.random())
+
+class DescargadorWeb:
+    """
+    Descargas HTTP concurrentes con límites total y por host, timeouts y
+    reintentos con backoff. Usar como `async with DescargadorWeb() as d:`.
+    Con `cache` (por defecto el caché de páginas compartido, que se abre al
+    entrar; None lo desactiva) las páginas frescas no se piden y las demás se
+    revalidan con peticiones condicionales; SQLite se consulta en un hilo. Sin `extraer`, el cuerpo se lee por fragmentos con
+    ExtractorTexto y la descarga se corta al llenar max_caracteres; con
+    `extraer` se descarga completo y se le pasa el HTML.
+    """
+
+    def __init__(self, max_descargas: int = MAX_DESCARGAS,
+                 max_por_host: int = MAX_DESCARGAS_POR_HOST,
+                 timeout: Optional[httpx.Timeout] = None,
+                 reintentos: int = REINTENTOS_DESCARGA,
+                 extraer: Optional[Callable[[str], str]] = None,
+                 cache: Union[CachePaginas, Callable[[], CachePaginas], None] = cache_por_defecto,
+                 max_caracteres: int = MAX_CARACTERES):
+        self.max_descargas = max_descargas
+        self.max_por_host = max_por_host
+        self.timeout = timeout or httpx.Timeout(TIMEOUT_LECTURA_S, connect=TIMEOUT_CONEXION_S)
+        self.reintentos = reintentos
+        self.extraer = extraer
+        self.cache = cache
+        self.max_caracteres = max_caracteres
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._por_host: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> "DescargadorWeb":
+        if callable(self.cache):
+            self.cache = await asyncio.to_thread(self.cache)
+        self._cliente = httpx.AsyncClient(
+            headers=ENCABEZADOS,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_descargas,
+                max_keepalive_connections=self.max_descargas,
+            ),
+        )
+        self._global = asyncio.Semaphore(self.max_descargas)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._cliente.aclose()
+        self._cliente = None
+
+    def _semaforo_host(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).netloc.decode("ascii")  # URL mal formada: httpx.InvalidURL
+        if host not in self._por_host:
+            self._por_host[host] = asyncio.Semaphore(self.max_por_host)
+        return self._por_host[host]
+
+    async def _pedir(self, url: str, encabezados: Dict[str, str]) -> Tuple[httpx.Response, str]:
+        """Respuesta y, si fue exitosa, el texto extraído (el análisis del HTML va en un hilo)."""
+        await limite_http.aesperar()
+        async with self._semaforo_host(url), self._global:
+            if self.extraer is not None:
+                respuesta = await self._cliente.get(url, headers=encabezados)
+                if not respuesta.is_success:
+                    return respuesta, ""
+                return respuesta, await asyncio.to_thread(self.extraer, respuesta.text)
+
+            async with self._cliente.stream("GET", url, headers=encabezados) as respuesta:
+                if not respuesta.is_success:
+                    return respuesta, ""
+                extractor = ExtractorTexto(self.max_caracteres)
+                async for fragmento in respuesta.aiter_text(TAMANO_FRAGMENTO):
+                    if await asyncio.to_thread(extractor.alimentar, fragmento):
+                        break  # presupuesto lleno: no se descarga el resto
+                return respuesta, await asyncio.to_thread(extractor.texto)
+
+    async def descargar(self, url: str) -> Descarga:
+        resultado = Descarga(url=url)
+        extractor = getattr(self.extraer, "__name__", "extraer") if self.extraer else "extraer_texto"
+        guardada = await asyncio.to_thread(self.cache.obtener, url, extractor) if self.cache else None
+        if guardada is not None and self.cache.fresca(guardada):
+            return Descarga(url=url, texto=self.cache.servir(guardada), estado=guardada.estado, desde_cache=True)
+        condicionales = CachePaginas.encabezados_condicionales(guardada)
+
+        for intento in range(self.reintentos + 1):
+            resultado.intentos = intento + 1
+            respuesta = None
+            try:
+                respuesta, texto = await self._pedir(url, condicionales)
+                resultado.estado = respuesta.status_code
+                if respuesta.status_code == 304 and guardada is not None:
+                    resultado.texto = await asyncio.to_thread(self.cache.servir, guardada, True)
+                    resultado.desde_cache = True
+                    resultado.error = None
+                    return resultado
+                if respuesta.status_code not in ESTADOS_REINTENTABLES:
+                    respuesta.raise_for_status()
+                    resultado.texto = texto
+                    resultado.error = None
+                    if self.cache:
+                        await asyncio.to_thread(self.cache.guardar, url, resultado.texto,
+                                                respuesta.status_code, respuesta.headers, extractor)
+                    return resultado
+                resultado.error = f"HTTP {respuesta.status_code}"
+            except httpx.HTTPStatusError as exc:
+                resultado.error = f"HTTP {exc.response.status_code}"
+                return resultado
+            except (httpx.UnsupportedProtocol, httpx.InvalidURL) as exc:
+                resultado.error = f"{type(exc).__name__}: {exc}"
+                return resultado
+            except httpx.TransportError as exc:
+                resultado.error = f"{type(exc).__name__}: {exc}"
+            except httpx.RequestError as exc:
+                # Redirecciones en ciclo, cuerpo mal comprimido: reintentar no cambia nada
+                resultado.error = f"{type(exc).__name__}: {exc}"
+                return resultado
+            except Exception as exc:
+                # Falla del extractor con esta página: no debe tumbar las demás
+                resultado.error = f"Extracción: {type(exc).__name__}: {exc}"
+                return resultado
+            if intento < self.reintentos:
+                await asyncio.sleep(_espera(intento, respuesta))
+        return resultado
+
+    async def descargar_todas(self, urls: Iterable[str]) -> AsyncIterator[Descarga]:
+        """Lanza todas las descargas a la vez y entrega cada una en cuanto termina."""
+        tareas = [asyncio.ensure_future(self.descargar(url)) for url in dict.fromkeys(urls)]
+        try:
+            for tarea in asyncio.as_completed(tareas):
+                yield await tarea
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+async def adescargar(urls: Iterable[str], **opciones) -> AsyncIterator[Descarga]:
+    """Atajo: abre un DescargadorWeb y entrega las descargas a medida que terminan."""
+    async with DescargadorWeb(**opciones) as descargador:
+        async for descarga in descargador.descargar_todas(urls):
+            yield descarga
+
+T = TypeVar("T")
+
+def correr_sincrono(corrutina: Coroutine[Any, Any, T]) -> T:
+    """
+    asyncio.run(corrutina), también si ya hay un event loop corriendo en este
+    hilo (Jupyter, un grafo ejecutado con ainvoke): ahí asyncio.run falla, así
+    que la corrutina va en un hilo propio con su loop y el mismo contexto
+    (contextvars, p. ej. el de LangGraph que usa eventos.emitir).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(corrutina)
+    contexto = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as hilo:
+        return hilo.submit(contexto.run, asyncio.run, corrutina).result()
+
+def descargar_urls(urls: Iterable[str], **opciones) -> List[Descarga]:
+    """Versión síncrona: descarga todas las URLs y devuelve los resultados en el orden recibido."""
+    urls = list(dict.fromkeys(urls))
+
+    async def _todas() -> Dict[str, Descarga]:
+        return {d.url: d async for d in adescargar(urls, **opciones)}
+
+    resultados = correr_sincrono(_todas())
+    return [resultados[url] for url in urls]
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from langchain_openai import ChatOpenAI
+from langchain_tavily import TavilySearch
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from estado import AgentState, programa_nacional
+from cache_llm import invocar_estructurado_lote
+from descargador_web import DescargadorWeb, correr_sincrono
+from eventos import emitir
+from limite_tasa import limite_http
+from ranking_urls import rankear_urls
+
+# -------------------------
+# Enriquecimiento de programas: búsqueda -> descarga -> pasajes -> LLM
+# -------------------------
+# Con las consultas de build_query_agent se buscan páginas (Tavily), se
+# descargan todas a la vez y de cada una se toman solo las ventanas de texto
+# alrededor de palabras clave ("perfil del egresado", "plan de estudios",
+# semestres...). Al LLM van esos pasajes cortos, no las páginas completas, en
+# un lote de llamadas con salida estructurada (una por programa).
+MAX_RESULTADOS_BUSQUEDA = int(os.getenv("ENRIQUECIMIENTO_RESULTADOS_POR_CONSULTA", "5"))
+MAX_URLS_POR_PROGRAMA = int(os.getenv("ENRIQUECIMIENTO_URLS_POR_PROGRAMA", "6"))
+MAX_CARACTERES_CAMPO = int(os.getenv("ENRIQUECIMIENTO_CARACTERES_POR_CAMPO", "1500"))
+MAX_CONCURRENCIA_ENRIQUECIMIENTO = int(os.getenv("MAX_CONCURRENCIA_ENRIQUECIMIENTO", os.getenv("MAX_CONCURRENCIA_LLM", "5")))
+# Programas por paso del grafo: con un checkpointer, cada bloque terminado
+# queda guardado y una ejecución interrumpida sigue desde el siguiente
+BLOQUE_ENRIQUECIMIENTO = int(os.getenv("ENRIQUECIMIENTO_BLOQUE", "10"))
+
+# Caracteres que se toman antes y después de cada palabra clave
+VENTANA_ANTES = 150
+VENTANA_DESPUES = 900
+
+# Patrones sobre el texto en minúsculas y sin tildes (ver _plegar)
+CLAVES = {
+    "Descripcion": [
+        r"descripcion del programa", r"presentacion del programa", r"sobre el programa",
+        r"acerca del programa", r"objetivos? del programa", r"justificacion", r"mision del programa",
+    ],
+    "Perfil": [
+        r"perfil del egresado", r"perfil (?:profesional|ocupacional|laboral)", r"perfil de egreso",
+        r"el egresado", r"campo de (?:accion|desempeno)", r"podra desempenarse",
+    ],
+    "Plan_de_estudios": [
+        r"plan de estudios?", r"malla curricular", r"estructura curricular", r"asignaturas?",
+        r"(?:primer|segundo|tercer|cuarto|quinto|sexto|septimo|octavo|noveno|decimo) (?:semestre|periodo|ciclo)",
+        r"semestre (?:[ivx]+|\d+)\b", r"creditos academicos", r"modulos?",
+    ],
+}
+_PATRONES = {campo: re.compile("|".join(claves)) for campo, claves in CLAVES.items()}
+
+_SIN_TILDES = str.maketrans("áéíóúüñÁÉÍÓÚÜÑ", "aeiouunAEIOUUN")
+
+def _plegar(texto: str) -> str:
+    # Misma longitud que el original, para que las posiciones sirvan en ambos
+    plegado = texto.translate(_SIN_TILDES).lower()
+    return plegado if len(plegado) == len(texto) else texto.lower()
+
+def _ajustar_ventana(texto: str, inicio: int, fin: int) -> Tuple[int, int]:
+    # Se empieza al inicio de la línea (o de la palabra) y se termina al final de una palabra
+    linea = texto.rfind("\n", 0, inicio) + 1
+    if inicio > 0 and inicio - linea > VENTANA_ANTES:
+        espacio = texto.find(" ", inicio)
+        linea = espacio + 1 if 0 <= espacio < fin else inicio
+    espacio = texto.find(" ", fin)
+    return (inicio if inicio == 0 else linea), (len(texto) if espacio < 0 else espacio)
+
+def pasajes_candidatos(texto: str) -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Para cada campo, ventanas de texto alrededor de sus palabras clave como
+    (puntaje, pasaje); las ventanas que se traslapan se unen y el puntaje es el
+    número de coincidencias que contienen.
+    """
+    plegado = _plegar(texto)
+    salida: Dict[str, List[Tuple[int, str]]] = {}
+    for campo, patron in _PATRONES.items():
+        ventanas: List[List[int]] = []
+        for m in patron.finditer(plegado):
+            inicio, fin = _ajustar_ventana(
+                texto, max(0, m.start() - VENTANA_ANTES), min(len(texto), m.end() + VENTANA_DESPUES)
+            )
+            if ventanas and inicio <= ventanas[-1][1]:
+                ventanas[-1][1] = max(ventanas[-1][1], fin)
+                ventanas[-1][2] += 1
+            else:
+                ventanas.append([inicio, fin, 1])
+        salida[campo] = [(puntaje, texto[inicio:fin].strip()) for inicio, fin, puntaje in ventanas]
+    return salida
+
+def seleccionar_pasajes(candidatos: List[Tuple[int, str, str]], max_caracteres: int = MAX_CARACTERES_CAMPO) -> List[Tuple[str, str]]:
+    """(url, pasaje) de mayor puntaje hasta completar max_caracteres, sin repetir pasajes."""
+    elegidos, total, vistos = [], 0, set()
+    for puntaje, url, pasaje in sorted(candidatos, key=lambda c: -c[0]):
+        if total >= max_caracteres:
+            break
+        if pasaje in vistos:
+            continue
+        vistos.add(pasaje)
+        pasaje = pasaje[:max_caracteres - total]
+        elegidos.append((url, pasaje))
+        total += len(pasaje)
+    return elegidos
+
+class CamposPrograma(BaseModel):
+    Descripcion: str = Field("", description="Descripción breve del programa. Vacío si no aparece en los pasajes.")
+    Perfil: str = Field("", description="Perfil del egresado. Vacío si no aparece en los pasajes.")
+    Plan_de_estudios: List[str] = Field(default_factory=list, description="Asignaturas o módulos del plan de estudios, en orden.")
+    URL_programa: str = Field("", description="URL (de las fuentes dadas) de la página oficial del programa. Vacío si ninguna lo es.")
+
+def _mensajes_extraccion(prg: programa_nacional, pasajes: Dict[str, List[Tuple[str, str]]]) -> List[BaseMessage]:
+    # Un mismo pasaje puede servir para varios campos: se envía una sola vez
+    campos_por_pasaje: Dict[str, List[str]] = {}
+    url_por_pasaje: Dict[str, str] = {}
+    for campo, elegidos in pasajes.items():
+        for url, pasaje in elegidos:
+            campos_por_pasaje.setdefault(pasaje, []).append(campo)
+            url_por_pasaje.setdefault(pasaje, url)
+    bloques = [
+        f"[{url_por_pasaje[pasaje]}] (posible {', '.join(campos)})\n{pasaje}"
+        for pasaje, campos in campos_por_pasaje.items()
+    ]
+    sistema = SystemMessage(content=(
+        "Extraes información de programas académicos colombianos a partir de fragmentos de sus páginas web. "
+        "Usa solo lo que aparece en los fragmentos; si un dato no aparece, déjalo vacío. "
+        "Ignora fragmentos que hablen de otro programa u otra institución."
+    ))
+    usuario = HumanMessage(content=(
+        f"Programa: {prg.Programa}\nInstitución: {prg.Institucion}\nMunicipio: {prg.Municipio}\n"
+        f"Sitio de la institución: {prg.URL}\n\nFragmentos:\n\n" + "\n\n".join(bloques)
+    ))
+    return [sistema, usuario]
+
+def pendiente_de_enriquecer(prg: programa_nacional) -> bool:
+    # Ya tiene consultas pero todavía no se ha llenado nada desde la web
+    return bool(prg.queries) and not (prg.URL_programa or prg.Descripcion or prg.Perfil or prg.Plan_de_estudios)
+
+# ------------------------------------------------------------------
+# Pasos del nodo
+# ------------------------------------------------------------------
+def _con_cupo_http(entrada: Dict[str, Any]) -> Dict[str, Any]:
+    limite_http.esperar()
+    return entrada
+
+def buscar_urls(programas: Dict[int, programa_nacional]) -> Dict[int, List[str]]:
+    """Todas las consultas de todos los programas en un solo lote de búsquedas."""
+    buscador = TavilySearch(max_results=MAX_RESULTADOS_BUSQUEDA)
+    trabajos = [(idx, q) for idx, prg in programas.items() for q in prg.queries]
+    # Cada búsqueda cuenta contra el cupo global de HTTP (limite_tasa)
+    respuestas = (RunnableLambda(_con_cupo_http) | buscador).batch(
+        [{"query": q} for _, q in trabajos],
+        config={"max_concurrency": MAX_CONCURRENCIA_ENRIQUECIMIENTO},
+        return_exceptions=True,
+    )
+    resultados: Dict[int, List[Dict[str, Any]]] = {idx: [] for idx in programas}
+    for (idx, q), respuesta in zip(trabajos, respuestas):
+        if isinstance(respuesta, Exception):
+            print(f"Búsqueda fallida ({q}): {respuesta}")
+            continue
+        if isinstance(respuesta, str):
+            respuesta = json.loads(respuesta)
+        resultados[idx].extend(respuesta.get("results", []))
+
+    # URLs canónicas sin duplicados, priorizando el dominio de la institución
+    urls = {
+        idx: rankear_urls(encontrados, programas[idx].URL, programas[idx].Programa, MAX_URLS_POR_PROGRAMA)
+        for idx, encontrados in resultados.items()
+    }
+    print(f"Resultados de búsqueda: {sum(len(r) for r in resultados.values())}, "
+          f"URLs elegidas: {sum(len(u) for u in urls.values())}")
+    return urls
+
+async def adescargar_pasajes(urls: Dict[int, List[str]]) -> Dict[int, Dict[str, List[Tuple[int, str, str]]]]:
+    """Descarga todas las páginas a la vez y filtra cada una en cuanto llega."""
+    destinos: Dict[str, List[int]] = {}
+    for idx, lista in urls.items():
+        for url in lista:
+            destinos.setdefault(url, []).append(idx)
+
+    pasajes = {idx: {campo: [] for campo in CLAVES} for idx in urls}
+    async with DescargadorWeb() as descargador:
+        async for descarga in descargador.descargar_todas(destinos):
+            if not descarga.ok:
+                print(f"No se pudo descargar {descarga.url}: {descarga.error}")
+                continue
+            for campo, candidatos in pasajes_candidatos(descarga.texto).items():
+                for idx in destinos[descarga.url]:
+                    pasajes[idx][campo].extend((p, descarga.url, texto) for p, texto in candidatos)
+    return pasajes
+
+def extraer_campos(programas: Dict[int, programa_nacional],
+                   pasajes: Dict[int, Dict[str, List[Tuple[int, str, str]]]]) -> Dict[int, CamposPrograma]:
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    trabajos = []
+    for idx, prg in programas.items():
+        elegidos = {campo: seleccionar_pasajes(c) for campo, c in pasajes.get(idx, {}).items()}
+        if any(elegidos.values()):
+            trabajos.append((idx, _mensajes_extraccion(prg, elegidos)))
+    print(f"Extracción estructurada para {len(trabajos)} programas con pasajes")
+    resultados = invocar_estructurado_lote(
+        llm, CamposPrograma, [mensajes for _, mensajes in trabajos],
+        max_concurrencia=MAX_CONCURRENCIA_ENRIQUECIMIENTO,
+    )
+    return {idx: r for (idx, _), r in zip(trabajos, resultados) if r is not None}
+
+def _actualizar(progs: List[programa_nacional], campos: Dict[int, CamposPrograma]) -> List[programa_nacional]:
+    progs = list(progs)
+    for idx, c in campos.items():
+        progs[idx] = progs[idx].model_copy(update={
+            "Descripcion": c.Descripcion,
+            "Perfil": c.Perfil,
+            "Plan_de_estudios": list(c.Plan_de_estudios),
+            "URL_programa": c.URL_programa,
+        })
+    return progs
+
+async def anodo_enriquecer_programas(state: AgentState) -> Dict[str, Any]:
+    """
+    Enriquece el siguiente bloque de BLOQUE_ENRIQUECIMIENTO programas a partir
+    de state.indice_enriquecimiento; decide_enriquecer vuelve a este nodo
+    hasta recorrerlos todos.
+    """
+    progs = state.informacion_programas_nacionales or []
+    inicio = state.indice_enriquecimiento
+    fin = min(inicio + BLOQUE_ENRIQUECIMIENTO, len(progs))
+    print(f'\nAgente: enriquecimiento de programas desde la web ({inicio}-{fin} de {len(progs)})')
+    programas = {idx: progs[idx] for idx in range(inicio, fin) if pendiente_de_enriquecer(progs[idx])}
+    if not programas:
+        return {'indice_enriquecimiento': fin}
+    urls = await asyncio.to_thread(buscar_urls, programas)
+    print(f"URLs a descargar: {sum(len(u) for u in urls.values())} para {len(programas)} programas")
+    pasajes = await adescargar_pasajes(urls)
+    campos = await asyncio.to_thread(extraer_campos, programas, pasajes)
+    progs = _actualizar(progs, campos)
+    for idx in sorted(campos):
+        emitir("programa", indice=idx, programa=progs[idx].model_dump())
+    return {'informacion_programas_nacionales': progs, 'indice_enriquecimiento': fin}
+
+def nodo_enriquecer_programas(state: AgentState) -> Dict[str, Any]:
+    """
+    Versión síncrona de anodo_enriquecer_programas. LangGraph corre los nodos
+    síncronos en hilos, pero quien llame al nodo desde un event loop
+    (Jupyter) también puede usarla (ver descargador_web.correr_sincrono).
+    """
+    return correr_sincrono(anodo_enriquecer_programas(state))
+
+def decide_enriquecer(state: AgentState) -> str:
+    if state.indice_enriquecimiento < len(state.informacion_programas_nacionales or []):
+        return "continuar"
+    return "finish"
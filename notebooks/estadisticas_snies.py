@@ -0,0 +1,173 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# -------------------------
+# Resúmenes estadísticos de los agregados de SNIES
+# -------------------------
+# Cifras que antes se le pedía deducir al LLM a partir de las series crudas
+# (tendencias, diferencias Oficial/Privado, absorción, concentración). Se
+# calculan aquí sobre los mismos agregados que recibe state.snies, de modo que
+# son reproducibles y los prompts pueden llevar solo una muestra de los datos.
+
+def _anio(periodo: str) -> float:
+    # "2021-1" -> 2021.0, "2021-2" -> 2021.5
+    anio, semestre = str(periodo).split("-")[:2]
+    return int(anio) + (int(semestre) - 1) / 2
+
+def _redondear(valor: Optional[float], decimales: int = 4) -> Optional[float]:
+    if valor is None or not np.isfinite(valor):
+        return None
+    return round(float(valor), decimales)
+
+def crecimiento(serie: pd.Series) -> Dict[str, Any]:
+    """
+    Crecimiento de una serie indexada por periodo ("2021-1"): valores inicial y
+    final, variación total y tasa de crecimiento anual compuesta (CAGR).
+    """
+    serie = serie.dropna()
+    serie = serie[serie > 0]
+    if serie.empty:
+        return {}
+    serie = serie.sort_index(key=lambda i: i.map(_anio))
+    inicial, final = float(serie.iloc[0]), float(serie.iloc[-1])
+    anios = _anio(serie.index[-1]) - _anio(serie.index[0])
+    cagr = (final / inicial) ** (1 / anios) - 1 if anios > 0 else None
+    return {
+        "periodo_inicial": serie.index[0],
+        "periodo_final": serie.index[-1],
+        "inicial": _redondear(inicial, 2),
+        "final": _redondear(final, 2),
+        "variacion": _redondear(final / inicial - 1),
+        "cagr": _redondear(cagr) if cagr is not None else None,
+    }
+
+def herfindahl(participaciones: pd.Series) -> float:
+    """Índice Herfindahl-Hirschman (0-10000) a partir de cantidades no negativas."""
+    total = participaciones.sum()
+    if total <= 0:
+        return 0.0
+    return float((((participaciones / total) * 100) ** 2).sum())
+
+# ------------------------------------------------------------------
+# Un resumen por agregado
+# ------------------------------------------------------------------
+def resumen_programas_instituciones(registros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    df = pd.DataFrame(registros, columns=["PERIODO", "SECTOR", "NUM_INSTITUCIONES", "NUM_PROGRAMAS"])
+    resumen: Dict[str, Any] = {}
+    for campo in ("NUM_INSTITUCIONES", "NUM_PROGRAMAS"):
+        tabla = df.pivot_table(index="PERIODO", columns="SECTOR", values=campo, aggfunc="sum")
+        por_sector = {sector: crecimiento(tabla[sector]) for sector in tabla.columns}
+        total = tabla.sum(axis=1)
+        # Participación del sector privado en el último periodo
+        ultimo = tabla.loc[max(tabla.index, key=_anio)] if len(tabla) else pd.Series(dtype=float)
+        resumen[campo.lower()] = {
+            "por_sector": por_sector,
+            "total": crecimiento(total),
+            "participacion_privado_final": _redondear(ultimo.get("Privado", 0) / ultimo.sum()) if ultimo.sum() else None,
+        }
+    return resumen
+
+def resumen_estudiantes(resumen_num_est: Dict[str, Any]) -> Dict[str, Any]:
+    salida: Dict[str, Any] = {}
+    for grupo, datos in resumen_num_est.items():
+        num = pd.DataFrame(datos["valores"], index=datos["periodos"], columns=datos["procesos"])
+        crecimientos = {proceso: crecimiento(num[proceso]) for proceso in num.columns}
+
+        # Absorción del proceso de admisión por periodo
+        tasas = pd.DataFrame(index=num.index)
+        for nombre, num_col, den_col in [
+            ("admitidos_sobre_inscritos", "ADMITIDOS", "INSCRITOS"),
+            ("matriculados_sobre_inscritos", "MATRICULADOS", "INSCRITOS"),
+            ("nuevos_sobre_admitidos", "NUEVOS", "ADMITIDOS"),
+        ]:
+            if num_col in num and den_col in num:
+                tasas[nombre] = num[num_col] / num[den_col].where(num[den_col] > 0)
+
+        salida[grupo] = {
+            "crecimiento": crecimientos,
+            "absorcion_promedio": {c: _redondear(tasas[c].mean()) for c in tasas.columns},
+            "absorcion_por_periodo": {
+                periodo: {c: _redondear(v) for c, v in fila.items()}
+                for periodo, fila in tasas.iterrows()
+            },
+        }
+    return salida
+
+def resumen_precios(est_mat_ies_prog: Dict[str, Any]) -> Dict[str, Any]:
+    df = pd.DataFrame(
+        est_mat_ies_prog.get("programas", []),
+        columns=["sector", "matricula_2024", "num_estudiantes_promedio_2021_2023"],
+    )
+    df["matricula_millones"] = df["matricula_2024"] / 1e6
+    por_sector = {}
+    for sector, grupo in df.groupby("sector"):
+        cuartiles = grupo["matricula_millones"].quantile([0.25, 0.5, 0.75])
+        por_sector[sector] = {
+            "programas": int(len(grupo)),
+            "matricula_min": _redondear(grupo["matricula_millones"].min(), 2),
+            "matricula_q1": _redondear(cuartiles.loc[0.25], 2),
+            "matricula_mediana": _redondear(cuartiles.loc[0.5], 2),
+            "matricula_q3": _redondear(cuartiles.loc[0.75], 2),
+            "matricula_max": _redondear(grupo["matricula_millones"].max(), 2),
+            "estudiantes_mediana": _redondear(grupo["num_estudiantes_promedio_2021_2023"].median(), 2),
+            "correlacion_matricula_estudiantes": (
+                _redondear(grupo["matricula_millones"].corr(grupo["num_estudiantes_promedio_2021_2023"]))
+                if len(grupo) > 2 else None
+            ),
+        }
+    return {
+        "por_sector": por_sector,
+        "correlacion_matricula_estudiantes": _redondear(est_mat_ies_prog.get("correlacion_matricula_estudiantes")),
+    }
+
+def resumen_valor_matricula(series: List[Dict[str, Any]]) -> Dict[str, Any]:
+    df = pd.DataFrame(
+        [(s["sector"], p["periodo"], p["valor_matricula_millones"]) for s in series for p in s["serie"]],
+        columns=["sector", "periodo", "valor"],
+    )
+    # La tabla dinámica del lector rellena con 0 los periodos sin dato
+    df = df[df["valor"] > 0]
+    mediana = df.pivot_table(index="periodo", columns="sector", values="valor", aggfunc="median")
+    return {
+        "crecimiento_mediana_por_sector": {sector: crecimiento(mediana[sector]) for sector in mediana.columns},
+        "mediana_por_periodo": {
+            periodo: {sector: _redondear(v, 2) for sector, v in fila.items()}
+            for periodo, fila in mediana.sort_index(key=lambda i: i.map(_anio)).iterrows()
+        },
+    }
+
+def resumen_concentracion(registros: List[Dict[str, Any]], top: int = 5) -> Dict[str, Any]:
+    df = pd.DataFrame(registros, columns=["Departamento", "Municipio", "Numero_programas"])
+    total = int(df["Numero_programas"].sum())
+    por_departamento = df.groupby("Departamento")["Numero_programas"].sum().sort_values(ascending=False)
+    por_municipio = df.set_index(["Departamento", "Municipio"])["Numero_programas"].sort_values(ascending=False)
+    return {
+        "total_programas": total,
+        "departamentos": int(len(por_departamento)),
+        "municipios": int(len(por_municipio)),
+        "hhi_departamentos": _redondear(herfindahl(por_departamento), 1),
+        "hhi_municipios": _redondear(herfindahl(por_municipio), 1),
+        "participacion_top3_departamentos": _redondear(por_departamento.head(3).sum() / total) if total else None,
+        "principales_departamentos": {
+            d: _redondear(v / total) for d, v in por_departamento.head(top).items()
+        } if total else {},
+        "principales_municipios": {
+            f"{m} ({d})": _redondear(v / total) for (d, m), v in por_municipio.head(top).items()
+        } if total else {},
+    }
+
+def resumen_estadistico(num_programas_instituciones: List[Dict[str, Any]],
+                        dispersion: Dict[str, Any],
+                        valor_matricula: List[Dict[str, Any]],
+                        programas_municipio: List[Dict[str, Any]],
+                        num_estudiantes: Dict[str, Any]) -> Dict[str, Any]:
+    """Etapa del lector: un resumen por cada agregado, con las mismas claves."""
+    return {
+        "num_programas_instituciones_tiempo": resumen_programas_instituciones(num_programas_instituciones),
+        "dispersión_matricula_vs_estudiantes": resumen_precios(dispersion),
+        "valor_matricula_tiempo": resumen_valor_matricula(valor_matricula),
+        "programas_por_departamento_municipio": resumen_concentracion(programas_municipio),
+        "num_estudiantes_tiempo": resumen_estudiantes(num_estudiantes),
+    }
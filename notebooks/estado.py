@@ -46,3 +46,4 @@ class AgentState(BaseModel):
     analisis_numero_de_estudiantes: Optional[str] = ""
     informacion_programas_nacionales: Optional[List[programa_nacional]] = None
     target_index: Optional[int] = None #Campo que determina el programa que se está analizando en el nodo de búsqueda web
+    indice_enriquecimiento: int = 0 #Programas ya procesados por el nodo de enriquecimiento (avanza por bloques)
@@ -0,0 +1,164 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# -------------------------
+# Etapas con entradas declaradas y memoización en disco
+# -------------------------
+@dataclass(frozen=True)
+class Etapa:
+    """
+    Paso de un pipeline. `entradas` son nombres de parámetros del pipeline o de
+    otras etapas, en el orden en que los recibe `funcion`. Si `persistir` es
+    True el resultado (serializable a JSON) se guarda en disco. La clave
+    lleva la huella del código de `funcion` (ver huella_codigo). `version`,
+    si se da, recibe las mismas entradas y devuelve la versión de los datos
+    que lee la etapa; reemplaza en su clave a la versión del pipeline.
+    """
+    nombre: str
+    funcion: Callable[..., Any]
+    entradas: Tuple[str, ...]
+    persistir: bool = True
+    version: Optional[Callable[..., str]] = None
+
+def _json_default(o):
+    # Escalares de numpy/pandas que se cuelan en los registros
+    if hasattr(o, "item"):
+        return o.item()
+    raise TypeError(f"Objeto no serializable: {type(o).__name__}")
+
+def _hash(valor: Any) -> str:
+    texto = json.dumps(valor, ensure_ascii=False, sort_keys=True, default=_json_default)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:20]
+
+def _partes_codigo(codigo) -> list:
+    constantes = []
+    for c in codigo.co_consts:
+        if inspect.iscode(c):
+            constantes.append(_partes_codigo(c))
+        elif isinstance(c, frozenset):  # el orden de un frozenset cambia entre procesos
+            constantes.append(sorted(map(repr, c)))
+        else:
+            constantes.append(repr(c))
+    return [codigo.co_code.hex(), codigo.co_names, codigo.co_varnames, constantes]
+
+def _nombres_usados(codigo) -> set:
+    nombres = set(codigo.co_names)
+    for c in codigo.co_consts:
+        if inspect.iscode(c):
+            nombres |= _nombres_usados(c)
+    return nombres
+
+@lru_cache(maxsize=None)
+def huella_codigo(funcion: Callable) -> str:
+    """
+    Hash del bytecode de `funcion` y de las funciones de su mismo módulo que
+    llama por nombre (recursivamente): cambiar una etapa o un auxiliar suyo
+    invalida lo memoizado. Las funciones de otros módulos no entran.
+    """
+    vistas, partes, pendientes = set(), [], [funcion]
+    while pendientes:
+        f = pendientes.pop()
+        if f in vistas:
+            continue
+        vistas.add(f)
+        codigo = getattr(f, "__code__", None)
+        if codigo is None:  # builtins, parciales: solo el nombre
+            partes.append(getattr(f, "__qualname__", repr(f)))
+            continue
+        partes.append([f.__qualname__, _partes_codigo(codigo)])
+        for nombre in sorted(_nombres_usados(codigo)):
+            ref = f.__globals__.get(nombre)
+            if inspect.isfunction(ref) and ref.__module__ == funcion.__module__:
+                pendientes.append(ref)
+    return _hash(partes)
+
+class Pipeline:
+    """
+    Ejecuta etapas bajo demanda. La clave de una etapa combina su nombre, la
+    huella de su código, la versión de los datos y la huella de cada entrada;
+    la huella de una etapa persistida es el hash de su resultado, de modo que
+    si un cambio en los parámetros produce la misma salida intermedia (por
+    ejemplo, los mismos programas equivalentes) las etapas siguientes se leen
+    de disco.
+    """
+
+    def __init__(self, etapas: Iterable[Etapa], parametros: Dict[str, Any],
+                 version_datos: str, directorio: str):
+        self.etapas = {e.nombre: e for e in etapas}
+        self.parametros = parametros
+        self.version_datos = version_datos
+        self.directorio = directorio
+        self._valores: Dict[str, Any] = {}
+        self._huellas: Dict[str, str] = {}
+        self.calculadas: list = []
+
+    def clave(self, nombre: str) -> str:
+        etapa = self.etapas[nombre]
+        version = self.version_datos
+        if etapa.version is not None:
+            version = etapa.version(*[self.valor(e) for e in etapa.entradas])
+        return _hash([nombre, huella_codigo(etapa.funcion), version, [self.huella(e) for e in etapa.entradas]])
+
+    def huella(self, nombre: str) -> str:
+        if nombre not in self._huellas:
+            if nombre in self.parametros:
+                self._huellas[nombre] = _hash(self.parametros[nombre])
+            elif self.etapas[nombre].persistir:
+                self._huellas[nombre] = _hash(self.valor(nombre))
+            else:
+                self._huellas[nombre] = self.clave(nombre)
+        return self._huellas[nombre]
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, f"{nombre}-{self.clave(nombre)}.json")
+
+    def valor(self, nombre: str) -> Any:
+        if nombre in self.parametros:
+            return self.parametros[nombre]
+        if nombre in self._valores:
+            return self._valores[nombre]
+
+        etapa = self.etapas[nombre]
+        ruta = self._ruta(nombre) if etapa.persistir else None
+        if ruta and os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                self._valores[nombre] = json.load(f)
+            return self._valores[nombre]
+        argumentos = [self.valor(e) for e in etapa.entradas]
+        print(f"Etapa: {nombre}")
+        return self.fijar(nombre, etapa.funcion(*argumentos))
+
+    def pendiente(self, nombre: str) -> bool:
+        """True si valor(nombre) tendría que calcular la etapa (no está en memoria ni en disco)."""
+        if nombre in self.parametros or nombre in self._valores:
+            return False
+        return not (self.etapas[nombre].persistir and os.path.exists(self._ruta(nombre)))
+
+    def fijar(self, nombre: str, resultado: Any) -> Any:
+        """
+        Registra el resultado de una etapa calculado por fuera (p. ej. para
+        varios pipelines a la vez, ver lector.lector_snies_lote) como si lo
+        hubiera calculado valor(), guardándolo en disco si corresponde.
+        """
+        self.calculadas.append(nombre)
+        if self.etapas[nombre].persistir:
+            ruta = self._ruta(nombre)
+            texto = json.dumps(resultado, ensure_ascii=False, default=_json_default)
+            os.makedirs(self.directorio, exist_ok=True)
+            # Temporal propio de cada hilo/proceso: dos ejecuciones de la misma
+            # etapa a la vez (servicio HTTP) no se pisan el archivo
+            temporal = f"{ruta}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(texto)
+            os.replace(temporal, ruta)
+            # Lo que se devuelve es lo mismo que se leería de disco
+            resultado = json.loads(texto)
+
+        self._valores[nombre] = resultado
+        return resultado
@@ -1,7 +1,9 @@
 import re
 import unicodedata
 from dataclasses import dataclass
-from typing import List, Union
+from typing import Dict, List, Union
+
+import pandas as pd
 
 # -------------------------
 # 1) AST nodes
@@ -43,6 +45,14 @@ def _norm(s: str, *, casefold=True, strip_accents=True) -> str:
         s = s.casefold()
     return s
 
+# Subir cuando cambie normalizar_texto: invalida el catálogo normalizado, el
+# índice de nombres y las búsquedas memoizadas (almacen_snies.version_catalogo)
+VERSION_NORMALIZACION = 2
+
+def normalizar_texto(cadena: str) -> str:
+    """Plegado usado en todo el proyecto para nombres de programas (sin tildes, minúsculas)."""
+    return _norm(cadena)
+
 # -------------------------
 # 3) Tokenizer (ahora soporta '...' y "...")
 # -------------------------
@@ -268,4 +278,115 @@ def evaluar_debug(prog2: List[str], ecuacion_busqueda: str, *, substring=True, s
     print("\nEvaluación (debug):")
     res = eval_ast_debug(ast, prog2, substring=substring, strip_accents=strip_accents)
     print("\nRESULTADO FINAL:", res)
-    return res
\ No newline at end of file
+    return res
+
+# -------------------------
+# 9) Compilación (parsear una vez, evaluar muchas)
+# -------------------------
+@dataclass(frozen=True)
+class ConsultaCompilada:
+    """AST con los términos ya normalizados. Se construye con compile_query."""
+    ast: Node
+    substring: bool = True
+    strip_accents: bool = True
+
+    def __call__(self, prog2: List[str]) -> bool:
+        palabras = [_norm(w, strip_accents=self.strip_accents) for w in prog2]
+        return _eval_normalizado(self.ast, palabras, self.substring)
+
+    def evaluar_serie(self, programas: pd.Series) -> pd.Series:
+        return evaluar_serie(programas, self)
+
+def _normalizar_ast(node: Node, *, strip_accents=True) -> Node:
+    if isinstance(node, Term):
+        return Term(_norm(node.value, strip_accents=strip_accents))
+    if isinstance(node, Not):
+        return Not(_normalizar_ast(node.expr, strip_accents=strip_accents))
+    if isinstance(node, And):
+        return And(_normalizar_ast(node.left, strip_accents=strip_accents),
+                   _normalizar_ast(node.right, strip_accents=strip_accents))
+    if isinstance(node, Or):
+        return Or(_normalizar_ast(node.left, strip_accents=strip_accents),
+                  _normalizar_ast(node.right, strip_accents=strip_accents))
+    raise TypeError("Nodo AST desconocido.")
+
+def terminos(node: Node) -> List[str]:
+    """Términos distintos de la expresión, en orden de aparición."""
+    if isinstance(node, Term):
+        return [node.value]
+    if isinstance(node, Not):
+        return terminos(node.expr)
+    if isinstance(node, (And, Or)):
+        vistos = terminos(node.left)
+        return vistos + [t for t in terminos(node.right) if t not in vistos]
+    raise TypeError("Nodo AST desconocido.")
+
+def _eval_normalizado(node: Node, palabras: List[str], substring: bool) -> bool:
+    # Igual que eval_ast, pero términos y palabras ya vienen normalizados
+    if isinstance(node, Term):
+        if substring:
+            return any(node.value in w for w in palabras)
+        return node.value in palabras
+    if isinstance(node, Not):
+        return not _eval_normalizado(node.expr, palabras, substring)
+    if isinstance(node, And):
+        return _eval_normalizado(node.left, palabras, substring) and \
+               _eval_normalizado(node.right, palabras, substring)
+    if isinstance(node, Or):
+        return _eval_normalizado(node.left, palabras, substring) or \
+               _eval_normalizado(node.right, palabras, substring)
+    raise TypeError("Nodo AST desconocido.")
+
+def compile_query(ecuacion_busqueda: str, *, substring=True, strip_accents=True) -> ConsultaCompilada:
+    ast = parse_query(ecuacion_busqueda)
+    return ConsultaCompilada(
+        ast=_normalizar_ast(ast, strip_accents=strip_accents),
+        substring=substring,
+        strip_accents=strip_accents,
+    )
+
+# -------------------------
+# 10) Evaluación vectorizada sobre una Serie de pandas
+# -------------------------
+def _mascara_termino(nombres: pd.Series, termino: str, substring: bool) -> pd.Series:
+    # La semántica es la de _match_term: el término debe estar contenido en
+    # alguna palabra. Un término con espacios nunca cabe dentro de una palabra.
+    if any(c.isspace() for c in termino):
+        return pd.Series(False, index=nombres.index)
+    if termino == "":
+        return nombres.str.strip() != "" if substring else pd.Series(False, index=nombres.index)
+    if substring:
+        return nombres.str.contains(termino, regex=False)
+    return nombres.str.contains(rf"(?:^|\s){re.escape(termino)}(?:\s|$)", regex=True)
+
+def _eval_mascaras(node: Node, mascaras: Dict[str, pd.Series]) -> pd.Series:
+    if isinstance(node, Term):
+        return mascaras[node.value]
+    if isinstance(node, Not):
+        return ~_eval_mascaras(node.expr, mascaras)
+    if isinstance(node, And):
+        return _eval_mascaras(node.left, mascaras) & _eval_mascaras(node.right, mascaras)
+    if isinstance(node, Or):
+        return _eval_mascaras(node.left, mascaras) | _eval_mascaras(node.right, mascaras)
+    raise TypeError("Nodo AST desconocido.")
+
+def evaluar_serie(programas: pd.Series, consulta: Union[str, ConsultaCompilada], *,
+                  substring=True, strip_accents=True) -> pd.Series:
+    """
+    Evalúa una consulta contra todos los nombres de una Serie en una sola pasada.
+    Devuelve una máscara booleana alineada con el índice de `programas`.
+    """
+    if isinstance(consulta, str):
+        consulta = compile_query(consulta, substring=substring, strip_accents=strip_accents)
+
+    # Normalizamos cada nombre distinto una sola vez
+    textos = programas.fillna("").astype(str)
+    unicos = textos.unique()
+    normalizados = {u: _norm(u, strip_accents=consulta.strip_accents) for u in unicos}
+    nombres = textos.map(normalizados)
+
+    mascaras = {
+        t: _mascara_termino(nombres, t, consulta.substring).fillna(False).astype(bool)
+        for t in terminos(consulta.ast)
+    }
+    return _eval_mascaras(consulta.ast, mascaras)
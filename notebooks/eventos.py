@@ -0,0 +1,20 @@
+from langgraph.config import get_stream_writer
+
+# -------------------------
+# Resultados parciales del grafo
+# -------------------------
+# Los nodos avisan aquí cada resultado apenas está listo (un análisis, un
+# programa enriquecido, una figura). Quien sigue el grafo con
+# stream_mode="custom" (ver grafo.aeventos) los recibe en ese momento; en
+# ejecuciones sin streaming o fuera del grafo no hacen nada.
+#
+# Solo funciona desde el hilo del nodo: los hilos de un ThreadPoolExecutor
+# propio no tienen el contexto de LangGraph, así que allí se emite al
+# recoger cada resultado.
+
+def emitir(tipo: str, **datos) -> None:
+    try:
+        escribir = get_stream_writer()
+    except RuntimeError:  # fuera de un nodo del grafo
+        return
+    escribir({"tipo": tipo, **datos})
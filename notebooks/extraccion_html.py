@@ -0,0 +1,209 @@
+from html.parser import HTMLParser
+from typing import List
+
+try:
+    from lxml import etree
+except ImportError:  # lxml es opcional: sin él se usa html.parser de la librería estándar
+    etree = None
+
+# -------------------------
+# Extracción de texto de páginas HTML
+# -------------------------
+# En lugar de armar el árbol completo y recortar al final, el HTML se procesa
+# por fragmentos y se deja de leer en cuanto se llena el presupuesto de
+# caracteres. Solo se conservan bloques de contenido (títulos, párrafos,
+# elementos de lista, celdas) fuera de menús, encabezados y pies de página.
+MAX_CARACTERES = 20000
+TAMANO_FRAGMENTO = 64 * 1024
+
+TITULOS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOQUES = TITULOS | {"p", "li", "dt", "dd", "td", "th", "caption", "blockquote", "pre"}
+# Contenedores que cierran un bloque abierto (HTML con <p> o <li> sin cerrar)
+CONTENEDORES = {"ul", "ol", "dl", "table", "tr", "div", "section", "article", "main", "body"}
+SALTAR = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "header",
+          "footer", "aside", "form", "button", "select"}
+
+# Si los bloques dan menos que esto, la página no usa etiquetas de contenido
+# (todo en <div>/<span>) y se usa todo el texto visible, que se junta en la
+# misma pasada (también con tope de max_caracteres)
+MIN_CARACTERES_BLOQUES = 500
+
+class _Bloques:
+    """Acumula los bloques de texto hasta completar el presupuesto."""
+
+    def __init__(self, max_caracteres: int, separador: str = "\n"):
+        self.max_caracteres = max_caracteres
+        self.separador = separador
+        self.partes: List[str] = []
+        self.total = 0
+
+    @property
+    def lleno(self) -> bool:
+        return self.total >= self.max_caracteres
+
+    def agregar(self, etiqueta: str, texto: str) -> None:
+        texto = " ".join(texto.split())[:self.max_caracteres - self.total]
+        if not texto or self.lleno:
+            return
+        if etiqueta in TITULOS:
+            texto = "## " + texto
+        elif etiqueta == "li":
+            texto = "- " + texto
+        self.partes.append(texto)
+        self.total += len(texto) + 1
+
+    def texto(self) -> str:
+        return self.separador.join(self.partes)[:self.max_caracteres]
+
+class _ParserEstandar(HTMLParser):
+    """Backend con html.parser: eventos de inicio/fin, sin armar árbol."""
+
+    def __init__(self, bloques: _Bloques, visible: _Bloques):
+        super().__init__(convert_charrefs=True)
+        self.bloques = bloques
+        self.visible = visible
+        self.saltar = 0
+        self.abierto = None
+        self.buffer: List[str] = []
+        # Texto visible desde la última etiqueta (llega partido entre fragmentos)
+        self.corrido: List[str] = []
+        self.largo_corrido = 0
+
+    def _vaciar(self) -> None:
+        self.visible.agregar("", "".join(self.corrido))
+        self.corrido = []
+        self.largo_corrido = 0
+
+    def _cerrar(self) -> None:
+        if self.abierto is not None:
+            self.bloques.agregar(self.abierto, "".join(self.buffer))
+        self.abierto = None
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        self._vaciar()
+        if tag in SALTAR:
+            self.saltar += 1
+        elif tag in BLOQUES:
+            # Los bloques no se anidan: uno nuevo cierra el anterior
+            self._cerrar()
+            self.abierto = tag
+        elif tag == "br":
+            self.buffer.append(" ")
+
+    def handle_endtag(self, tag):
+        self._vaciar()
+        if tag in SALTAR:
+            self.saltar = max(0, self.saltar - 1)
+        elif tag in BLOQUES or tag in CONTENEDORES:
+            self._cerrar()
+
+    def handle_data(self, data):
+        if self.saltar:
+            return
+        if self.largo_corrido < self.visible.max_caracteres:
+            self.corrido.append(data)
+            self.largo_corrido += len(data)
+        if self.abierto is not None:
+            self.buffer.append(data)
+
+    def alimentar(self, fragmento: str) -> None:
+        self.feed(fragmento)
+
+    def terminar(self) -> None:
+        self.close()
+        self._vaciar()
+        self._cerrar()
+
+class _ParserLxml:
+    """Backend con lxml.etree.HTMLPullParser; cada bloque se libera al emitirse."""
+
+    def __init__(self, bloques: _Bloques, visible: _Bloques):
+        self.bloques = bloques
+        self.visible = visible
+        # Sin comentarios: todo texto queda en el .text o .tail de un elemento con eventos
+        self.parser = etree.HTMLPullParser(events=("start", "end"), remove_comments=True, remove_pis=True)
+        self.saltar = 0
+        self.en_bloque = 0
+
+    def _procesar(self) -> None:
+        for evento, elemento in self.parser.read_events():
+            etiqueta = elemento.tag if isinstance(elemento.tag, str) else ""
+            # El texto visible va en orden de documento: al abrir un elemento ya
+            # está completo el que lo precede y al cerrarlo, el que cierra su contenido
+            if evento == "start":
+                if self.saltar == 0:
+                    anterior = elemento.getprevious()
+                    padre = elemento.getparent()
+                    if anterior is not None:
+                        self.visible.agregar("", anterior.tail or "")
+                    elif padre is not None:
+                        self.visible.agregar("", padre.text or "")
+                if etiqueta in SALTAR:
+                    self.saltar += 1
+                elif etiqueta in BLOQUES:
+                    self.en_bloque += 1
+                continue
+            if self.saltar == 0:
+                self.visible.agregar("", (elemento[-1].tail if len(elemento) else elemento.text) or "")
+            if etiqueta in SALTAR:
+                self.saltar -= 1
+            elif etiqueta in BLOQUES:
+                self.en_bloque -= 1
+                # Solo el bloque más externo: su texto incluye el de los anidados
+                if self.en_bloque == 0 and self.saltar == 0:
+                    for salto in elemento.iter("br"):
+                        salto.tail = " " + (salto.tail or "")
+                    self.bloques.agregar(etiqueta, "".join(elemento.itertext()))
+            if self.en_bloque == 0:
+                # Lo que ya se cerró fuera de un bloque no se vuelve a leer
+                elemento.clear(keep_tail=True)
+            if self.bloques.lleno:
+                return
+
+    def alimentar(self, fragmento: str) -> None:
+        self.parser.feed(fragmento)
+        self._procesar()
+
+    def terminar(self) -> None:
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        self._procesar()
+
+class ExtractorTexto:
+    """
+    Extracción incremental: `alimentar(fragmento)` devuelve True cuando ya se
+    llenó el presupuesto y no hace falta leer más; `texto()` da el resultado.
+    """
+
+    def __init__(self, max_caracteres: int = MAX_CARACTERES, usar_lxml: bool = True):
+        self.max_caracteres = max_caracteres
+        self.bloques = _Bloques(max_caracteres)
+        self.visible = _Bloques(max_caracteres, separador=" ")
+        backend = _ParserLxml if (usar_lxml and etree is not None) else _ParserEstandar
+        self.parser = backend(self.bloques, self.visible)
+
+    def alimentar(self, fragmento: str) -> bool:
+        if not self.bloques.lleno:
+            self.parser.alimentar(fragmento)
+        return self.bloques.lleno
+
+    def texto(self) -> str:
+        if not self.bloques.lleno:
+            self.parser.terminar()
+        texto = self.bloques.texto()
+        if len(texto) < MIN_CARACTERES_BLOQUES and not self.bloques.lleno:
+            completo = self.visible.texto()
+            if len(completo) > len(texto):
+                return completo
+        return texto
+
+def extraer_texto(html: str, max_caracteres: int = MAX_CARACTERES) -> str:
+    """Texto de los bloques de contenido de un HTML, leyendo solo hasta llenar max_caracteres."""
+    extractor = ExtractorTexto(max_caracteres)
+    for inicio in range(0, len(html), TAMANO_FRAGMENTO):
+        if extractor.alimentar(html[inicio:inicio + TAMANO_FRAGMENTO]):
+            break
+    return extractor.texto()
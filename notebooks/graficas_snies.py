@@ -0,0 +1,282 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+# -------------------------
+# Figuras del lector de SNIES
+# -------------------------
+# Cada figura se dibuja a partir del agregado que ya va en state.snies, así que
+# puede generarse después (o en otro proceso) sin volver a tocar los datos.
+#
+# Modos (variable de entorno SNIES_GRAFICAS o argumento `modo`):
+#   "inline"   -> se dibujan en el mismo proceso antes de devolver (por defecto)
+#   "deferred" -> se envían a un pool de procesos y el lector no las espera
+#   "none"     -> no se generan (despliegue en servidor)
+MODOS = ("none", "deferred", "inline")
+MODO_GRAFICAS = os.getenv("SNIES_GRAFICAS", "inline")
+SALIDA = "./salida"
+
+def graficar_num_programas_instituciones(registros: List[Dict[str, Any]], directorio: str = SALIDA) -> List[str]:
+    progs_periodo_sector = pd.DataFrame(registros)
+    # Pivot para la figura
+    progs_pivot = pd.pivot_table(
+        data=progs_periodo_sector,
+        index="PERIODO",
+        columns="SECTOR",
+        values=["NUM_INSTITUCIONES", "NUM_PROGRAMAS"],
+        aggfunc="sum",
+    )
+    progs_pivot.columns = [
+        "Num. Instituciones oficiales",
+        "Num Instituciones privadas",
+        "Num. Programas oficiales",
+        "Num Programas privados",
+    ]
+
+    colores = ["red", "blue", "red", "blue"]
+    estilos = [(1, 0), (1, 0), (2, 2), (2, 2)]
+
+    fig = plt.figure(figsize=(10, 6))
+    sns.lineplot(data=progs_pivot, palette=colores, dashes=estilos)
+    plt.xticks(rotation=90)
+    plt.grid()
+    plt.tight_layout()
+    ruta = os.path.join(directorio, "num_programas_instituciones_tiempo.png")
+    plt.savefig(ruta, dpi=300)
+    plt.close(fig)
+    return [ruta]
+
+
+def graficar_dispersion_matricula(est_mat_ies_prog: Dict[str, Any], directorio: str = SALIDA) -> List[str]:
+    df2 = pd.DataFrame(
+        est_mat_ies_prog["programas"],
+        columns=["nombre_ies_programa", "departamento", "sector",
+                 "matricula_2024", "num_estudiantes_promedio_2021_2023"],
+    ).rename(columns={
+        "nombre_ies_programa": "Nombre_ies",
+        "departamento": "DEPARTAMENTO_PROGRAMA",
+        "sector": "SECTOR_IES",
+        "matricula_2024": "MATRICULA",
+        "num_estudiantes_promedio_2021_2023": "CANTIDAD",
+    })
+
+    fig = plt.figure(figsize=(12, 6))
+    df2["MATRICULA"] = df2["MATRICULA"].astype(float) / 1e6
+    sns.scatterplot(
+        data=df2,
+        x="CANTIDAD",
+        y="MATRICULA",
+        hue="SECTOR_IES",
+        palette={"Privado": "blue", "Oficial": "red"},
+    )
+    plt.xlabel("Número promedio de estudiantes matriculados (2021-2023)")
+    plt.ylabel("Valor de la matrícula (2024) (Millones de COP)")
+    plt.title("Relación entre número de estudiantes y valor de la matrícula")
+    # Etiquetas: se arman por columnas y luego una llamada a text por punto
+    partes = df2["Nombre_ies"].str.split(" - ", n=1, expand=True).reindex(columns=[0, 1])
+    etiquetas = partes[0] + " (" + df2["DEPARTAMENTO_PROGRAMA"] + ")\n" + partes[1]
+    colores = df2["SECTOR_IES"].map({"Oficial": "red"}).fillna("blue")
+    texts = [
+        plt.text(x + 0.03, y + 0.03, etiqueta, fontsize=8, ha="center", va="bottom", color=color)
+        for x, y, etiqueta, color in zip(df2["CANTIDAD"], df2["MATRICULA"], etiquetas, colores)
+    ]
+    #adjust_text(texts, arrowprops=dict(arrowstyle="->", color="black"))
+    plt.legend(
+        bbox_to_anchor=(1.05, 1),
+        loc="upper left",
+        borderaxespad=0.0,
+    )
+    plt.tight_layout()
+    plt.grid(True)
+    ruta = os.path.join(directorio, "dispersión_estudiantes_matricula.png")
+    plt.savefig(ruta, dpi=300)
+    plt.close(fig)
+    return [ruta]
+
+
+def graficar_valor_matricula_tiempo(series_por_ies: List[Dict[str, Any]], directorio: str = SALIDA) -> List[str]:
+    valor_long = pd.DataFrame(
+        [
+            (s["nombre_ies_programa"], s["sector"], p["periodo"], p["valor_matricula_millones"])
+            for s in series_por_ies
+            for p in s["serie"]
+        ],
+        columns=["Nombre", "Sector", "Período", "Valor_Matricula"],
+    )
+
+    # Figura con etiquetas a la derecha
+    fig = plt.figure(figsize=(16, 6))
+    texts_pos = {}
+    colores = {}
+    for nombre in valor_long["Nombre"].unique():
+        df_temp = valor_long[valor_long["Nombre"] == nombre].sort_values(
+            "Período"
+        )
+        x = range(len(df_temp))
+        if df_temp["Sector"].unique()[0] == "Privado":
+            line, = plt.plot(x, df_temp["Valor_Matricula"], "-")
+        else:
+            line, = plt.plot(x, df_temp["Valor_Matricula"], "--")
+        color = line.get_color()
+        texts_pos[nombre] = float(df_temp["Valor_Matricula"].iloc[-1])
+        colores[nombre] = color
+
+    ax = plt.gca()
+    texts_pos = dict(sorted(texts_pos.items(), key=lambda x: x[1]))
+    dL = 5
+    base_y = 0.01
+    dy = 0.6
+
+    # usamos coordenadas de datos para y y eje extendido para x
+    for i, (nombre, value) in enumerate(texts_pos.items()):
+        x_data = len(x) - 1
+        x_label = x_data + 1
+        y_label = base_y + i * dy
+        ax.text(x_label, y_label, nombre, color=colores[nombre])
+        plt.plot([x_data, x_label], [value, y_label], ":", color=colores[nombre])
+
+    plt.xticks(
+        range(len(valor_long["Período"].unique())),
+        sorted(valor_long["Período"].unique()),
+        rotation=90,
+    )
+    plt.ylim(0, 15)
+    plt.xlim(0, len(x) + dL)
+    plt.xlabel("Período")
+    plt.ylabel("Valor de matrícula en millones de COP")
+    plt.tight_layout()
+    plt.grid(True)
+    ruta = os.path.join(directorio, "valor_matriculas_por_periodo.png")
+    plt.savefig(ruta, dpi=300)
+    plt.close(fig)
+    return [ruta]
+
+
+def graficar_programas_por_municipio(registros: List[Dict[str, Any]], directorio: str = SALIDA) -> List[str]:
+    df_geo2 = pd.DataFrame(registros, columns=["Departamento", "Municipio", "Numero_programas"])
+    df_geo2["Ubicacion"] = df_geo2["Departamento"].astype(str) + " - " + df_geo2["Municipio"].astype(str)
+
+    fig = plt.figure(figsize=(12, 6))
+    sns.barplot(
+        x="Numero_programas",
+        y="Ubicacion",
+        data=df_geo2,
+        hue="Departamento",
+        legend=False,
+    )
+    plt.tight_layout()
+    ruta = os.path.join(directorio, "programas_por_departamento_municipio.png")
+    plt.savefig(ruta, dpi=300)
+    plt.close(fig)
+    return [ruta]
+
+
+def graficar_num_estudiantes_tiempo(resumen_num_est: Dict[str, Any], directorio: str = SALIDA) -> List[str]:
+    rutas = []
+    for exp, num_est in resumen_num_est.items():
+        num = pd.DataFrame(
+            num_est["valores"], index=num_est["periodos"], columns=num_est["procesos"]
+        )
+        num.index.name = "PERIODO"
+        num.columns.name = "PROCESO"
+
+        fig = plt.figure(figsize=(12, 6))
+        sns.lineplot(num)
+        plt.xlabel("Período académico")
+        plt.ylabel("Número de estudiantes")
+        plt.xticks(rotation=90)
+        plt.legend(
+            bbox_to_anchor=(1.05, 1),
+            loc="upper left",
+            borderaxespad=0.0,
+        )
+        plt.tight_layout()
+        plt.grid(True)
+        plt.title("Número de estudiantes en el tiempo en " + exp)
+        ruta = os.path.join(
+            directorio, "num_estudiantes_tiempo_" + exp.replace(" ", "_") + ".png"
+        )
+        plt.savefig(ruta, dpi=300)
+        plt.close(fig)
+        rutas.append(ruta)
+    return rutas
+
+
+GRAFICAS = {
+    "num_programas_instituciones_tiempo": graficar_num_programas_instituciones,
+    "dispersión_matricula_vs_estudiantes": graficar_dispersion_matricula,
+    "valor_matricula_tiempo": graficar_valor_matricula_tiempo,
+    "programas_por_departamento_municipio": graficar_programas_por_municipio,
+    "num_estudiantes_tiempo": graficar_num_estudiantes_tiempo,
+}
+
+# -------------------------
+# Ejecución según el modo
+# -------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pendientes: List[Future] = []
+
+def _iniciar_proceso() -> None:
+    # Los procesos del pool no tienen pantalla: backend sin interfaz
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv("SNIES_GRAFICAS_PROCESOS", "2"))
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_proceso)
+    return _pool
+
+def _graficar(clave: str, payload: Any, directorio: str) -> List[str]:
+    return GRAFICAS[clave](payload, directorio)
+
+def renderizar(snies: Dict[str, Any], modo: Optional[str] = None,
+               directorio: str = SALIDA,
+               al_terminar: Optional[Callable[[str, List[str]], None]] = None) -> Dict[str, Any]:
+    """
+    Genera las figuras de los agregados presentes en `snies`.
+    Devuelve {clave: rutas} en modo "inline", {clave: Future} en modo
+    "deferred" y {} en modo "none". En modo "inline" se llama
+    al_terminar(clave, rutas) apenas se guarda cada figura.
+    """
+    modo = modo or MODO_GRAFICAS
+    if modo not in MODOS:
+        raise ValueError(f"Modo de gráficas desconocido: {modo!r}. Opciones: {MODOS}")
+    if modo == "none":
+        return {}
+
+    os.makedirs(directorio, exist_ok=True)
+    claves = [c for c in GRAFICAS if c in snies]
+    if modo == "inline":
+        rutas = {}
+        for c in claves:
+            rutas[c] = _graficar(c, snies[c], directorio)
+            if al_terminar is not None:
+                al_terminar(c, rutas[c])
+        return rutas
+
+    futuros = graficar_en_procesos(snies, directorio)
+    _pendientes.extend(futuros.values())
+    return futuros
+
+def graficar_en_procesos(snies: Dict[str, Any], directorio: str) -> Dict[str, Future]:
+    """
+    Envía las figuras al pool de procesos (backend Agg) y devuelve {clave:
+    Future}. A diferencia del modo "deferred" no las registra para
+    esperar_graficas: quien llama espera sus futuros (ver servicio.py).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    pool = _obtener_pool()
+    return {c: pool.submit(_graficar, c, snies[c], directorio) for c in GRAFICAS if c in snies}
+
+def esperar_graficas() -> List[str]:
+    """Espera las figuras enviadas en modo "deferred" y devuelve sus rutas."""
+    rutas = []
+    while _pendientes:
+        rutas.extend(_pendientes.pop(0).result())
+    return rutas
@@ -0,0 +1,169 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langgraph.graph import StateGraph, START, END
+
+from estado import AgentState
+from lector import nodo_lector_snies
+from agentes_de_analisis import (
+    MAX_CONCURRENCIA_LLM,
+    NODOS_ANALISIS,
+    anodo_analisis_concurrente,
+    nodo_analisis_concurrente,
+)
+from buscador_programas import build_query_agent, build_query_agent_lote, decide_iterate
+from enriquecedor_programas import anodo_enriquecer_programas, decide_enriquecer, nodo_enriquecer_programas
+from puntos_control import puntos_control_por_defecto
+
+# Modos de ejecución de los análisis:
+#   "ramas" -> un nodo por análisis, en ramas paralelas de LangGraph (fan-out/fan-in)
+#   "lote"  -> un solo nodo que lanza los cinco análisis en hilos
+#   "async" -> un solo nodo asíncrono con llm.ainvoke (usar con ainvoke/astream)
+MODOS_ANALISIS = ("ramas", "lote", "async")
+
+# Generación de consultas de búsqueda:
+#   "lote"      -> un solo paso del grafo genera las de todos los programas (llm.batch)
+#   "iterativo" -> un programa por paso; decide_iterate vuelve a "consultas" hasta terminar
+MODOS_CONSULTAS = ("lote", "iterativo")
+
+def construir_grafo(modo_analisis: str = "ramas", modo_consultas: str = "lote",
+                    enriquecer: bool = True, **compile_kwargs):
+    """
+    Con `enriquecer`, después de las consultas se buscan, descargan y extraen
+    Descripcion, Perfil y Plan_de_estudios de cada programa (nodo "enriquecimiento",
+    un bloque de programas por paso). Para poder reanudar ejecuciones pasar
+    `checkpointer=puntos_control_por_defecto()` (ver ejecutar).
+    """
+    if modo_analisis not in MODOS_ANALISIS:
+        raise ValueError(f"Modo de análisis desconocido: {modo_analisis!r}. Opciones: {MODOS_ANALISIS}")
+    if modo_consultas not in MODOS_CONSULTAS:
+        raise ValueError(f"Modo de consultas desconocido: {modo_consultas!r}. Opciones: {MODOS_CONSULTAS}")
+
+    grafo = StateGraph(AgentState)
+    grafo.add_node("lector_snies", nodo_lector_snies)
+    grafo.add_node("consultas", build_query_agent_lote if modo_consultas == "lote" else build_query_agent)
+    grafo.add_edge(START, "lector_snies")
+
+    if modo_analisis == "ramas":
+        for nombre, nodo in NODOS_ANALISIS.items():
+            grafo.add_node(nombre, nodo)
+            grafo.add_edge("lector_snies", nombre)
+        # "consultas" espera a que terminen las cinco ramas
+        grafo.add_edge(list(NODOS_ANALISIS), "consultas")
+    else:
+        nodo = nodo_analisis_concurrente if modo_analisis == "lote" else anodo_analisis_concurrente
+        grafo.add_node("analisis", nodo)
+        grafo.add_edge("lector_snies", "analisis")
+        grafo.add_edge("analisis", "consultas")
+
+    fin = END
+    if enriquecer:
+        grafo.add_node("enriquecimiento",
+                       anodo_enriquecer_programas if modo_analisis == "async" else nodo_enriquecer_programas)
+        grafo.add_conditional_edges("enriquecimiento", decide_enriquecer,
+                                    {"continuar": "enriquecimiento", "finish": END})
+        fin = "enriquecimiento"
+
+    if modo_consultas == "lote":
+        grafo.add_edge("consultas", fin)
+    else:
+        grafo.add_conditional_edges("consultas", decide_iterate, {"iterate": "consultas", "finish": fin})
+    return grafo.compile(**compile_kwargs)
+
+def configuracion(max_concurrencia: Optional[int] = None, hilo: Optional[str] = None, **extra) -> Dict[str, Any]:
+    """
+    Config de ejecución: limita cuántos nodos corre LangGraph a la vez (ramas
+    paralelas). `hilo` es el thread_id con el que el checkpointer guarda la ejecución.
+    """
+    config = {
+        "max_concurrency": max_concurrencia or MAX_CONCURRENCIA_LLM,
+        # Consultas (modo iterativo) y enriquecimiento dan una vuelta por programa o
+        # por bloque: el límite por defecto (25) se queda corto
+        "recursion_limit": 1000,
+        **extra,
+    }
+    if hilo is not None:
+        config["configurable"] = {**config.get("configurable", {}), "thread_id": hilo}
+    return config
+
+# -------------------------
+# Ejecuciones reanudables
+# -------------------------
+def _entrada(instantanea, entrada, hilo: str):
+    """None (seguir desde el último punto de control) si el hilo tiene una ejecución sin terminar."""
+    if instantanea.values and instantanea.next:
+        print(f"Reanudando {hilo} desde: {', '.join(instantanea.next)}")
+        return None
+    return entrada
+
+def ejecutar(entrada, hilo: str, modo_analisis: str = "lote", **opciones) -> Dict[str, Any]:
+    """
+    Corre el grafo guardando un punto de control por paso (puntos_control_por_defecto).
+    Si el hilo quedó a medias (error, interrupción) continúa desde el último
+    paso completo en lugar de empezar de nuevo; si ya terminó devuelve su estado.
+    """
+    grafo = construir_grafo(modo_analisis, checkpointer=puntos_control_por_defecto(), **opciones)
+    config = configuracion(hilo=hilo)
+    instantanea = grafo.get_state(config)
+    if instantanea.values and not instantanea.next:
+        print(f"La ejecución {hilo} ya terminó")
+        return instantanea.values
+    return grafo.invoke(_entrada(instantanea, entrada, hilo), config)
+
+async def aejecutar(entrada, hilo: str, **opciones) -> Dict[str, Any]:
+    """Versión asíncrona de ejecutar (modo de análisis "async")."""
+    puntos_control = await asyncio.to_thread(puntos_control_por_defecto)
+    grafo = construir_grafo("async", checkpointer=puntos_control, **opciones)
+    config = configuracion(hilo=hilo)
+    instantanea = await grafo.aget_state(config)
+    if instantanea.values and not instantanea.next:
+        print(f"La ejecución {hilo} ya terminó")
+        return instantanea.values
+    return await grafo.ainvoke(_entrada(instantanea, entrada, hilo), config)
+
+# -------------------------
+# Resultados parciales en streaming
+# -------------------------
+async def aeventos(entrada, hilo: Optional[str] = None, modo_analisis: str = "ramas",
+                   **opciones) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Corre el grafo y entrega cada resultado apenas está listo, como dicts con "tipo":
+      "paso"     -> terminó un nodo ({"nodo", "campos"} que actualizó)
+      "analisis" -> texto de un análisis ({"campo", "texto"})
+      "figura"   -> figura guardada ({"clave", "rutas"}; solo en modo de gráficas "inline")
+      "programa" -> programa enriquecido ({"indice", "programa"})
+      "fin"      -> terminó el grafo
+    Con `hilo` la ejecución se guarda en los puntos de control y se reanuda como en ejecutar.
+    """
+    if hilo is not None:
+        if "checkpointer" not in opciones:
+            opciones["checkpointer"] = await asyncio.to_thread(puntos_control_por_defecto)
+    grafo = construir_grafo(modo_analisis, **opciones)
+    config = configuracion(hilo=hilo)
+    if hilo is not None:
+        instantanea = await grafo.aget_state(config)
+        if instantanea.values and not instantanea.next:
+            print(f"La ejecución {hilo} ya terminó")
+            yield {"tipo": "fin", "hilo": hilo}
+            return
+        entrada = _entrada(instantanea, entrada, hilo)
+
+    # En modo "ramas" cada análisis llega como actualización de su nodo; en
+    # "lote"/"async" el nodo los avisa uno a uno y la actualización final se omite
+    avisados = set()
+    async for modo, dato in grafo.astream(entrada, config, stream_mode=["updates", "custom"]):
+        if modo == "custom":
+            if dato.get("tipo") == "analisis":
+                avisados.add(dato["campo"])
+            yield dato
+            continue
+        for nodo, actualizacion in dato.items():
+            if not isinstance(actualizacion, dict):  # nodos sin cambios (None) o interrupciones
+                actualizacion = {}
+            for campo, texto in actualizacion.items():
+                if campo.startswith("analisis_") and texto and campo not in avisados:
+                    avisados.add(campo)
+                    yield {"tipo": "analisis", "campo": campo, "texto": texto}
+            yield {"tipo": "paso", "nodo": nodo, "campos": sorted(actualizacion)}
+    yield {"tipo": "fin", "hilo": hilo}
+
@@ -0,0 +1,157 @@
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from almacen_snies import DIRECTORIO, en_memoria, version_catalogo
+from evaluador_expresiones import And, ConsultaCompilada, Node, Not, Or, Term, compile_query, normalizar_texto
+
+RUTA_INDICE = os.path.join(DIRECTORIO, "indice_programas.json")
+# Subir cuando cambie la forma de construir o guardar el índice
+FORMATO_INDICE = 1
+
+def _trigramas(palabra: str) -> Set[str]:
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+class IndiceProgramas:
+    """
+    Índice invertido sobre los nombres normalizados de PROGRAMAS.
+
+    - palabras: palabra -> ids de los nombres que la contienen
+    - trigramas: trigrama -> ids de las palabras del vocabulario que lo contienen
+
+    Un término se resuelve con los trigramas a palabras candidatas, se verifica
+    la subcadena sobre cada candidata (misma semántica de _match_term) y se unen
+    sus listas de nombres. El índice no se modifica después de construido, así
+    que puede compartirse entre búsquedas concurrentes.
+    """
+
+    def __init__(self, nombres: List[str], palabras: Dict[str, List[int]],
+                 trigramas: Dict[str, List[int]], version: Optional[str] = None):
+        self.nombres = nombres
+        self.version = version
+        self.vocabulario = list(palabras)
+        self.palabras = {w: set(ids) for w, ids in palabras.items()}
+        self.trigramas = {t: set(ids) for t, ids in trigramas.items()}
+        self.universo = set(range(len(nombres)))
+        self.no_vacios = set().union(*self.palabras.values()) if self.palabras else set()
+
+    @classmethod
+    def construir(cls, nombres: Iterable[str], version: Optional[str] = None) -> "IndiceProgramas":
+        nombres = [str(n) for n in nombres]
+        palabras: Dict[str, List[int]] = defaultdict(list)
+        for i, nombre in enumerate(nombres):
+            for w in dict.fromkeys(normalizar_texto(p) for p in nombre.split()):
+                palabras[w].append(i)
+        trigramas: Dict[str, List[int]] = defaultdict(list)
+        for j, w in enumerate(palabras):
+            for t in _trigramas(w):
+                trigramas[t].append(j)
+        return cls(nombres, dict(palabras), dict(trigramas), version)
+
+    # -------------------------
+    # Persistencia
+    # -------------------------
+    def guardar(self, ruta: str = RUTA_INDICE) -> None:
+        datos = {
+            "version": self.version,
+            "nombres": self.nombres,
+            "palabras": {w: sorted(ids) for w, ids in self.palabras.items()},
+            "trigramas": {t: sorted(ids) for t, ids in self.trigramas.items()},
+        }
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_INDICE) -> "IndiceProgramas":
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        return cls(datos["nombres"], datos["palabras"], datos["trigramas"], datos["version"])
+
+    # -------------------------
+    # Búsqueda
+    # -------------------------
+    def _palabras_con(self, termino: str) -> List[str]:
+        if len(termino) < 3:
+            return [w for w in self.vocabulario if termino in w]
+        candidatas: Optional[Set[int]] = None
+        for t in _trigramas(termino):
+            ids = self.trigramas.get(t)
+            if not ids:
+                return []
+            candidatas = set(ids) if candidatas is None else candidatas & ids
+        return [self.vocabulario[j] for j in candidatas if termino in self.vocabulario[j]]
+
+    def resolver_termino(self, termino: str, *, substring=True) -> Set[int]:
+        if any(c.isspace() for c in termino):
+            return set()
+        if not substring:
+            return set(self.palabras.get(termino, ()))
+        if termino == "":
+            return set(self.no_vacios)
+        ids: Set[int] = set()
+        for w in self._palabras_con(termino):
+            ids |= self.palabras[w]
+        return ids
+
+    def evaluar(self, node: Node, *, substring=True,
+                resueltos: Optional[Dict[Tuple[str, bool], Set[int]]] = None) -> Set[int]:
+        """
+        Ids de los nombres que cumplen el AST. Con `resueltos` (compartido entre
+        varias consultas) cada término distinto se busca una sola vez.
+        """
+        if isinstance(node, Term):
+            if resueltos is None:
+                return self.resolver_termino(node.value, substring=substring)
+            clave = (node.value, substring)
+            if clave not in resueltos:
+                resueltos[clave] = self.resolver_termino(node.value, substring=substring)
+            return resueltos[clave]
+        if isinstance(node, Not):
+            return self.universo - self.evaluar(node.expr, substring=substring, resueltos=resueltos)
+        if isinstance(node, And):
+            return (self.evaluar(node.left, substring=substring, resueltos=resueltos)
+                    & self.evaluar(node.right, substring=substring, resueltos=resueltos))
+        if isinstance(node, Or):
+            return (self.evaluar(node.left, substring=substring, resueltos=resueltos)
+                    | self.evaluar(node.right, substring=substring, resueltos=resueltos))
+        raise TypeError("Nodo AST desconocido.")
+
+    def buscar(self, consulta: Union[str, ConsultaCompilada]) -> List[str]:
+        """Nombres que cumplen la consulta, en el orden del catálogo."""
+        if isinstance(consulta, str):
+            consulta = compile_query(consulta)
+        ids = self.evaluar(consulta.ast, substring=consulta.substring)
+        return [self.nombres[i] for i in sorted(ids)]
+
+    def buscar_lote(self, consultas: Iterable[Union[str, ConsultaCompilada]]) -> List[List[str]]:
+        """buscar para varias consultas, resolviendo contra el índice una vez cada término distinto."""
+        resueltos: Dict[Tuple[str, bool], Set[int]] = {}
+        resultados = []
+        for consulta in consultas:
+            if isinstance(consulta, str):
+                consulta = compile_query(consulta)
+            ids = self.evaluar(consulta.ast, substring=consulta.substring, resueltos=resueltos)
+            resultados.append([self.nombres[i] for i in sorted(ids)])
+        return resultados
+
+def obtener_indice(nombres: Iterable[str], ruta: str = RUTA_INDICE) -> IndiceProgramas:
+    """
+    Carga el índice persistido si corresponde a la versión actual del
+    catálogo, de la normalización de nombres y del formato del índice; si
+    no, lo reconstruye con `nombres` y lo guarda.
+    """
+    version = f"{version_catalogo()}-f{FORMATO_INDICE}"
+    return en_memoria(f"indice:{ruta}", version, lambda: _cargar_o_construir(nombres, ruta, version))
+
+def _cargar_o_construir(nombres: Iterable[str], ruta: str, version: str) -> IndiceProgramas:
+    if os.path.exists(ruta):
+        indice = IndiceProgramas.cargar(ruta)
+        if indice.version == version:
+            return indice
+    print("Construyendo índice de programas")
+    indice = IndiceProgramas.construir(nombres, version)
+    indice.guardar(ruta)
+    return indice
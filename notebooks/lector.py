@@ -1,12 +1,17 @@
-from typing import Any, List, Dict
+from collections import defaultdict
+from typing import Any, Iterable, List, Dict, Optional, Union
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import unicodedata
 import json
 import os
-import seaborn as sns
 from estado import AgentState, Nivel, programa_nacional
-from evaluador_expresiones import evaluar   
+from evaluador_expresiones import compile_query
+from almacen_snies import DIRECTORIO, leer_hechos, programas_normalizados, version_catalogo, version_hechos
+from indice_programas import obtener_indice
+from etapas import Etapa, Pipeline
+from graficas_snies import renderizar
+from estadisticas_snies import resumen_estadistico
+from eventos import emitir
 
 def nodo_lector_snies(state: AgentState) -> Dict[str, Any]:
     print('\nAgente: análisis de información existente de SNIES')
@@ -28,123 +33,40 @@ def nodo_lector_snies(state: AgentState) -> Dict[str, Any]:
             "informacion_programas_nacionales": resultado['informacion_programas_nacionales']
         }
 
-def lector_snies(state) -> dict:
-    print('Lector de Snies')
-    #Primero verificamos si existe un campo de informacion_programas_nacionales en el estado. 
-    #Pero en el estado que tenemos guardado en el archivo de texto si exsite. Si ese campo existe, entonces no se hace la consulta
-    #pero debe verificar que el nombre del programa y la información básica sean correctas. 
-
-    def cargar_parquet_cache(url: str, local_path: str):
-        if os.path.exists(local_path):
-            return pd.read_parquet(local_path)
-        df = pd.read_parquet(url)
-        df.to_parquet(local_path, index=False)
-        return df
-
-    def normalizar_texto(cadena: str) -> str:
-        cadena = cadena.lower()
-        cadena = cadena.replace("ñ", "n").replace("Ñ", "n")
-        cadena_normalizada = unicodedata.normalize("NFD", cadena)
-        cadena_sin_tildes = "".join(
-            c for c in cadena_normalizada
-            if unicodedata.category(c) != "Mn"
-        )
-        return cadena_sin_tildes
-
-    respuesta: dict = {
-        "snies": {},          # aquí irán los datos numéricos de cada gráfica
-        "informacion_programas_nacionales": [],        # Programas que se cargan desde el SNIES
-    }
-    nombre = state.nombre
-    nivel = state.nivel
-    descripcion = state.descripcion
-    requerido = state.requerido
-
-    programa = set(normalizar_texto(nombre).split())
-    #requerido = {normalizar_texto(ci) for ci in requerido}
-    prohibido = { normalizar_texto(ci) for ci in ["pregrado","tecnica","tecnologia","especializacion","maestria","doctorado","licenciatura"] 
-        if ci != nivel}
-    n = len(programa)
-
-    print("Proceso de carga de los archivos de SNIES")
-    maestro = cargar_parquet_cache(
-        "https://robertohincapie.com/data/snies/MAESTRO.parquet",
-        "MAESTRO.parquet",
-    )
-    oferta = cargar_parquet_cache(
-        "https://robertohincapie.com/data/snies/OFERTA.parquet",
-        "OFERTA.parquet",
-    )
-    programas = cargar_parquet_cache(
-        "https://robertohincapie.com/data/snies/PROGRAMAS.parquet",
-        "PROGRAMAS.parquet",
-    )
-    ies = cargar_parquet_cache(
-        "https://robertohincapie.com/data/snies/IES.parquet",
-        "IES.parquet",
-    )
-    print("Archivos de SNIES cargados correctamente")
-
-    programas["PROGRAMA_ACADEMICO_NORMALIZADO"] = programas[
-        "PROGRAMA_ACADEMICO"
-    ].apply(lambda x: normalizar_texto(str(x)))
-
-    # Selección de programas equivalentes
-    equivalentes = []
-    def evaluar2(prog2, requerido, prohibido):
-        # Si hay palabra prohibida exacta → False
-        if any(p in prog2 for p in prohibido):
-            return False
-        
-        # Si alguna requerida está contenida en alguna palabra de prog2 → True
-        if any(req in palabra for req in requerido for palabra in prog2):
-            return True
-        
-        return False
-    
-    for prg in programas["PROGRAMA_ACADEMICO_NORMALIZADO"].unique():
-        prg2 = str(prg).lower().split()
-        #Vamos a considerar que en alguno de los términos del programa estén las palabras de la lista requerida y no estén las palabras prohibidas. Además, el programa debe tener al menos n-1 términos en común con el programa objetivo (para permitir pequeñas variaciones)
-        if(evaluar(prg2, requerido)):
-            equivalentes.append(prg)
+# ----------------------------------------------------------------------
+# Etapas del lector. Cada una declara sus entradas (parámetros del estado u
+# otras etapas) y su resultado se memoiza en disco (ver etapas.Pipeline).
+# ----------------------------------------------------------------------
+DIRECTORIO_ETAPAS = os.path.join(DIRECTORIO, "etapas")
+
+def programas_equivalentes(requerido: str) -> List[str]:
+    # La expresión se compila una vez y se resuelve contra el índice invertido
+    # de nombres (persistido en disco)
+    programas = programas_normalizados()
+    consulta = compile_query(requerido)
+    indice = obtener_indice(programas["PROGRAMA_ACADEMICO_NORMALIZADO"].unique())
+    equivalentes = indice.buscar(consulta)
     print('Programas equivalentes encontrados: ',equivalentes)
+    return equivalentes
+
+def codigos_snies(equivalentes: List[str]) -> List[Any]:
+    programas = programas_normalizados()
     programas2 = programas[
         programas["PROGRAMA_ACADEMICO_NORMALIZADO"].isin(equivalentes)
     ]
-    snies2 = list(programas2["CODIGO_SNIES"].unique())
-    maestro2 = maestro[maestro["CODIGO_SNIES"].isin(snies2)]
+    return sorted(programas2["CODIGO_SNIES"].unique(), key=str)
 
-    maestro3 = maestro2.merge(
-        programas, left_on="CODIGO_SNIES", right_on="CODIGO_SNIES", how="left"
-    )
-    maestro4 = maestro3.merge(oferta, on=["CODIGO_SNIES", "PERIODO"], how="left")
-    maestro5 = maestro4.merge(
-        ies[
-            [
-                "CODIGO_INSTITUCION",
-                "INSTITUCION",
-                "NATURALEZA_JURIDICA",
-                "SECTOR_IES",
-                "CARACTER_IES",
-                "PAGINA_WEB",
-                "ACREDITACION_ALTA_CALIDAD",
-            ]
-        ],
-        left_on="CODIGO_INSTITUCION_x",
-        right_on="CODIGO_INSTITUCION",
-        how="left",
-        suffixes=("__x", "__y"),
-    )
-    #maestro5.to_excel('borrar.xlsx', index=False)
-    #os.makedirs("./figuras_snies", exist_ok=True)
+def hechos_programas(codigos: List[Any]) -> pd.DataFrame:
+    # Filas ya unidas (MAESTRO + PROGRAMAS + OFERTA + IES) solo de esos programas
+    return leer_hechos(codigos)
 
-    # ------------------------------------------------------------------
-    # 1. Número de instituciones y programas en el tiempo
-    # ------------------------------------------------------------------
-    
+# ------------------------------------------------------------------
+# 1. Número de instituciones y programas en el tiempo
+# ------------------------------------------------------------------
+def agregado_num_programas_instituciones(hechos: pd.DataFrame) -> List[Dict[str, Any]]:
     progs = (
-        maestro5.groupby(by=["PERIODO", "SECTOR_IES__x", "DEPARTAMENTO_PROGRAMA"])
-        .agg({"CODIGO_INSTITUCION_x": "nunique", "CODIGO_SNIES": "nunique"})
+        hechos.groupby(by=["PERIODO", "SECTOR_IES", "DEPARTAMENTO_PROGRAMA"])
+        .agg({"CODIGO_INSTITUCION": "nunique", "CODIGO_SNIES": "nunique"})
         .reset_index()
     )
     progs.columns = [
@@ -161,47 +83,17 @@ def lector_snies(state) -> dict:
         .agg({"NUM_INSTITUCIONES": "sum", "NUM_PROGRAMAS": "sum"})
         .reset_index()
     )
-
-    # Pivot para la figura
-    progs_pivot = pd.pivot_table(
-        data=progs_periodo_sector,
-        index="PERIODO",
-        columns="SECTOR",
-        values=["NUM_INSTITUCIONES", "NUM_PROGRAMAS"],
-        aggfunc="sum",
-    )
-    progs_pivot.columns = [
-        "Num. Instituciones oficiales",
-        "Num Instituciones privadas",
-        "Num. Programas oficiales",
-        "Num Programas privados",
-    ]
-
-    colores = ["red", "blue", "red", "blue"]
-    estilos = [(1, 0), (1, 0), (2, 2), (2, 2)]
-
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(data=progs_pivot, palette=colores, dashes=estilos)
-    plt.xticks(rotation=90)
-    plt.grid()
-    plt.tight_layout()
-    plt.savefig(
-        f"./salida/num_programas_instituciones_tiempo.png", dpi=300
-    )
-
-    # JSON para el agente
-    respuesta["snies"]["num_programas_instituciones_tiempo"] = progs_periodo_sector.to_dict(orient="records")
-
-    # ------------------------------------------------------------------
-    # 2. Dispersión matrícula 2024 vs promedio matriculados 2021-2023
-    # ------------------------------------------------------------------
-    maestro4["PROXY_PER"] = maestro4["PROXY_PER"].astype(int)
-    df = maestro4[
-        (maestro4["PROXY_PER"] >= 20211) & (maestro4["PROXY_PER"] <= 20242)
+    return progs_periodo_sector.to_dict(orient="records")
+
+# ------------------------------------------------------------------
+# 2. Dispersión matrícula 2024 vs promedio matriculados 2021-2023
+# ------------------------------------------------------------------
+def matriculados_2021_2024(hechos: pd.DataFrame) -> pd.DataFrame:
+    df = hechos[
+        (hechos["PROXY_PER"] >= 20211) & (hechos["PROXY_PER"] <= 20242)
     ].copy()
     df.loc[:, "Nombre_ies"] = df["INSTITUCION"] + " - " + df["PROGRAMA_ACADEMICO"]
-    df = df[df["PROCESO"] == "MATRICULADOS"].copy()
-    df["CANTIDAD"] = df["CANTIDAD"].astype(int)
+    df = df[df["PROCESO"] == "MATRICULADOS"]
 
     df = df[
         [
@@ -213,10 +105,10 @@ def lector_snies(state) -> dict:
             "SECTOR_IES",
         ]
     ]
-    df = df.dropna()
-    df = df[df["MATRICULA"] != "null"].copy()
-    df["MATRICULA"] = df["MATRICULA"].astype(float)
+    # CANTIDAD y MATRICULA ya vienen numéricas; los "null" originales son NA
+    return df.dropna()
 
+def agregado_dispersion_matricula(df: pd.DataFrame) -> Dict[str, Any]:
     df2 = (
         df.groupby(by="Nombre_ies")
         .agg(
@@ -230,72 +122,26 @@ def lector_snies(state) -> dict:
         .reset_index()
     )
 
-    # JSON básico con la nube de puntos
-    est_mat_ies_prog = {
-        "programas": [
-            {
-                "nombre_ies_programa": row["Nombre_ies"],
-                "departamento": row["DEPARTAMENTO_PROGRAMA"],
-                "sector": row["SECTOR_IES"],
-                "matricula_2024": float(row["MATRICULA"]),
-                "num_estudiantes_promedio_2021_2023": float(row["CANTIDAD"]),
-            }
-            for _, row in df2.iterrows()
-        ]
-    }
+    # JSON básico con la nube de puntos (registros armados por columnas)
+    puntos = pd.DataFrame({
+        "nombre_ies_programa": df2["Nombre_ies"].astype(object),
+        "departamento": df2["DEPARTAMENTO_PROGRAMA"].astype(object),
+        "sector": df2["SECTOR_IES"].astype(object),
+        "matricula_2024": df2["MATRICULA"].astype(float),
+        "num_estudiantes_promedio_2021_2023": df2["CANTIDAD"].astype(float),
+    })
+    est_mat_ies_prog = {"programas": puntos.to_dict(orient="records")}
     # Correlación global entre matrícula y número de estudiantes
     if len(df2) > 1:
         est_mat_ies_prog["correlacion_matricula_estudiantes"] = float(
             df2["MATRICULA"].corr(df2["CANTIDAD"])
         )
+    return est_mat_ies_prog
 
-    respuesta["snies"]["dispersión_matricula_vs_estudiantes"] = est_mat_ies_prog
-
-    # Figura
-    plt.figure(figsize=(12, 6))
-    df2["MATRICULA"] = df2["MATRICULA"].astype(float) / 1e6
-    sns.scatterplot(
-        data=df2,
-        x="CANTIDAD",
-        y="MATRICULA",
-        hue="SECTOR_IES",
-        palette={"Privado": "blue", "Oficial": "red"},
-    )
-    plt.xlabel("Número promedio de estudiantes matriculados (2021-2023)")
-    plt.ylabel("Valor de la matrícula (2024) (Millones de COP)")
-    plt.title("Relación entre número de estudiantes y valor de la matrícula")
-    texts = []
-    for _, row in df2.iterrows():
-        tipo = " (" + row["DEPARTAMENTO_PROGRAMA"] + ")"
-        color = "red" if row["SECTOR_IES"] == "Oficial" else "blue"
-        t = plt.text(
-            row["CANTIDAD"] + 0.03,
-            row["MATRICULA"] + 0.03,
-            "\n".join(
-                [
-                    row["Nombre_ies"].split(" - ")[0] + tipo,
-                    row["Nombre_ies"].split(" - ")[1],
-                ]
-            ),
-            fontsize=8,
-            ha="center",
-            va="bottom",
-            color=color,
-        )
-        texts.append(t)
-    #adjust_text(texts, arrowprops=dict(arrowstyle="->", color="black"))
-    plt.legend(
-        bbox_to_anchor=(1.05, 1),
-        loc="upper left",
-        borderaxespad=0.0,
-    )
-    plt.tight_layout()
-    plt.grid(True)
-    plt.savefig(f"./salida/dispersión_estudiantes_matricula.png", dpi=300)
-
-    # ------------------------------------------------------------------
-    # 3. Valor de matrícula en el tiempo por institución
-    # ------------------------------------------------------------------
+# ------------------------------------------------------------------
+# 3. Valor de matrícula en el tiempo por institución
+# ------------------------------------------------------------------
+def agregado_valor_matricula_tiempo(df: pd.DataFrame) -> List[Dict[str, Any]]:
     valor = pd.pivot_table(
         df,
         index="Nombre_ies",
@@ -315,79 +161,37 @@ def lector_snies(state) -> dict:
     )
     valor_long.columns = ["Nombre", "Sector", "Período", "Valor_Matricula"]
 
-    # JSON con series por institución
-    series_por_ies = []
-    for nombre, grupo in valor_long.groupby("Nombre"):
-        grupo_orden = grupo.sort_values("Período")
-        serie = {
-            "nombre_ies_programa": nombre,
-            "sector": grupo_orden["Sector"].iloc[0],
-            "serie": [
-                {"periodo": per, "valor_matricula_millones": float(v)}
-                for per, v in zip(
-                    grupo_orden["Período"], grupo_orden["Valor_Matricula"]
-                )
-            ],
+    # JSON con series por institución: un solo ordenamiento y luego se corta
+    # en los puntos donde cambia el nombre
+    valor_long = valor_long.sort_values(["Nombre", "Período"], kind="stable")
+    nombres = valor_long["Nombre"].to_numpy()
+    cortes = np.flatnonzero(nombres[1:] != nombres[:-1]) + 1
+    inicios = [0, *cortes]
+    finales = [*cortes, len(nombres)]
+    sectores = valor_long["Sector"].tolist()
+    puntos = pd.DataFrame({
+        "periodo": valor_long["Período"].astype(object),
+        "valor_matricula_millones": valor_long["Valor_Matricula"].astype(float),
+    }).to_dict(orient="records")
+
+    return [
+        {
+            "nombre_ies_programa": nombres[i],
+            "sector": sectores[i],
+            "serie": puntos[i:f],
         }
-        series_por_ies.append(serie)
-
-    respuesta["snies"]["valor_matricula_tiempo"] = series_por_ies
+        for i, f in zip(inicios, finales)
+        if f > i
+    ]
 
-    # Figura con etiquetas a la derecha
-    plt.figure(figsize=(16, 6))
-    texts_pos = {}
-    colores = {}
-    for nombre in valor_long["Nombre"].unique():
-        df_temp = valor_long[valor_long["Nombre"] == nombre].sort_values(
-            "Período"
-        )
-        x = range(len(df_temp))
-        if df_temp["Sector"].unique()[0] == "Privado":
-            line, = plt.plot(x, df_temp["Valor_Matricula"], "-")
-        else:
-            line, = plt.plot(x, df_temp["Valor_Matricula"], "--")
-        color = line.get_color()
-        texts_pos[nombre] = float(df_temp["Valor_Matricula"].iloc[-1])
-        colores[nombre] = color
-
-    ax = plt.gca()
-    texts_pos = dict(sorted(texts_pos.items(), key=lambda x: x[1]))
-    dL = 5
-    base_y = 0.01
-    dy = 0.6
-
-    # usamos coordenadas de datos para y y eje extendido para x
-    for i, (nombre, value) in enumerate(texts_pos.items()):
-        x_data = len(x) - 1
-        x_label = x_data + 1
-        y_label = base_y + i * dy
-        ax.text(x_label, y_label, nombre, color=colores[nombre])
-        plt.plot([x_data, x_label], [value, y_label], ":", color=colores[nombre])
-
-    plt.xticks(
-        range(len(valor_long["Período"].unique())),
-        sorted(valor_long["Período"].unique()),
-        rotation=90,
-    )
-    plt.ylim(0, 15)
-    plt.xlim(0, len(x) + dL)
-    plt.xlabel("Período")
-    plt.ylabel("Valor de matrícula en millones de COP")
-    plt.tight_layout()
-    plt.grid(True)
-    plt.savefig(f"./salida/valor_matriculas_por_periodo.png", dpi=300)
-
-    # ------------------------------------------------------------------
-    # 4. Número de programas por departamento y municipio
-    # ------------------------------------------------------------------
-    df_geo = maestro4[
-        (maestro4["PROXY_PER"] >= 20211) & (maestro4["PROXY_PER"] <= 20242)
-    ].copy()
-    df_geo.loc[:, "Nombre_ies"] = (
-        df_geo["INSTITUCION"] + " - " + df_geo["PROGRAMA_ACADEMICO"]
-    )
-    df_geo = df_geo[df_geo["PROCESO"] == "MATRICULADOS"].copy()
-    df_geo["CANTIDAD"] = df_geo["CANTIDAD"].astype(int)
+# ------------------------------------------------------------------
+# 4. Número de programas por departamento y municipio
+# ------------------------------------------------------------------
+def agregado_programas_por_municipio(hechos: pd.DataFrame) -> List[Dict[str, Any]]:
+    df_geo = hechos[
+        (hechos["PROXY_PER"] >= 20211) & (hechos["PROXY_PER"] <= 20242)
+    ]
+    df_geo = df_geo[df_geo["PROCESO"] == "MATRICULADOS"]
 
     df_geo2 = (
         df_geo.groupby(["DEPARTAMENTO_PROGRAMA", "MUNICIPIO_PROGRAMA"])
@@ -396,39 +200,22 @@ def lector_snies(state) -> dict:
         .reset_index()
     )
     df_geo2.columns = ["Departamento", "Municipio", "Numero_programas"]
-    df_geo2["Ubicacion"] = df_geo2["Departamento"] + " - " + df_geo2["Municipio"]
-
-    # Figura
-    plt.figure(figsize=(12, 6))
-    sns.barplot(
-        x="Numero_programas",
-        y="Ubicacion",
-        data=df_geo2,
-        hue="Departamento",
-        legend=False,
-    )
-    plt.tight_layout()
-    plt.savefig(
-        f"./salida/programas_por_departamento_municipio.png", dpi=300
-    )
-
-    # JSON
-    respuesta["snies"]["programas_por_departamento_municipio"] = df_geo2[
+    return df_geo2[
             ["Departamento", "Municipio", "Numero_programas"]
         ].to_dict(orient="records")
 
-    # ------------------------------------------------------------------
-    # 5. Número de estudiantes en el tiempo (todos / oficial / privado)
-    # ------------------------------------------------------------------
-    maestro4 = maestro4[maestro4["CANTIDAD"] != "null"]
-    maestro4["CANTIDAD"] = maestro4["CANTIDAD"].astype(float)
+# ------------------------------------------------------------------
+# 5. Número de estudiantes en el tiempo (todos / oficial / privado)
+# ------------------------------------------------------------------
+def agregado_num_estudiantes_tiempo(hechos: pd.DataFrame) -> Dict[str, Any]:
+    hechos = hechos[hechos["CANTIDAD"].notna()]
 
     resumen_num_est = {}
 
     for df_est, exp in [
-        (maestro4, "Todos los sectores"),
-        (maestro4[maestro4["SECTOR_IES"] == "Oficial"], "Universidades Oficiales"),
-        (maestro4[maestro4["SECTOR_IES"] == "Privado"], "Universidades Privadas"),
+        (hechos, "Todos los sectores"),
+        (hechos[hechos["SECTOR_IES"] == "Oficial"], "Universidades Oficiales"),
+        (hechos[hechos["SECTOR_IES"] == "Privado"], "Universidades Privadas"),
     ]:
         num = pd.pivot_table(
             df_est,
@@ -441,66 +228,199 @@ def lector_snies(state) -> dict:
         num_est = {
             "periodos": list(num.index),
             "procesos": list(num.columns),
-            "valores": [
-                {proc: float(num.loc[per, proc]) for proc in num.columns}
-                for per in num.index
-            ],
+            "valores": num.astype(float).to_dict(orient="records"),
         }
         resumen_num_est[exp] = num_est
+    return resumen_num_est
+
+# ------------------------------------------------------------------
+# 6. Listado de programas (para el agente de búsqueda)
+# ------------------------------------------------------------------
+def _entero_o_cero(serie: pd.Series) -> pd.Series:
+    # Equivale a int(x) if str(x).isdigit() else 0, pero sobre la columna completa
+    numeros = pd.to_numeric(serie, errors="coerce")
+    validos = numeros.notna() & (numeros >= 0) & (numeros % 1 == 0)
+    return numeros.where(validos, 0).astype("int64")
+
+def listado_programas(hechos: pd.DataFrame) -> List[Dict[str, Any]]:
+    unicos = hechos[
+        ["INSTITUCION_IES", "PROGRAMA_ACADEMICO", "MUNICIPIO_PROGRAMA", "PAGINA_WEB", "PROGRAMA_ACREDITADO",
+         "MODALIDAD", "NUMERO_CREDITOS", "NUMERO_PERIODO", "PERIODICIDAD"]
+    ].drop_duplicates()
+
+    programas = pd.DataFrame({
+        "Programa": unicos["PROGRAMA_ACADEMICO"].astype(object),
+        "Institucion": unicos["INSTITUCION_IES"].astype(object),
+        "Municipio": unicos["MUNICIPIO_PROGRAMA"].astype(object),
+        "URL": unicos["PAGINA_WEB"].astype(object).map(str).str.lower(),
+        "acreditado": unicos["PROGRAMA_ACREDITADO"].astype(object).where(unicos["PROGRAMA_ACREDITADO"].notna(), "").map(str),
+        "modalidad": unicos["MODALIDAD"].astype(object),
+        "numero_creditos": _entero_o_cero(unicos["NUMERO_CREDITOS"]),
+        "numero_periodo": _entero_o_cero(unicos["NUMERO_PERIODO"]),
+        "periodicidad": unicos["PERIODICIDAD"].astype(object).map(str),
+    }).to_dict(orient="records")
+
+    # Campos que completa después el agente de búsqueda; iteraciones=0 significa
+    # que falta buscar la información detallada del programa
+    for p in programas:
+        p.update(URL_programa="", Descripcion="", Perfil="", Plan_de_estudios=[], queries=[], iteraciones=0)
+    return programas
+
+ETAPAS_SNIES = [
+    Etapa("equivalentes", programas_equivalentes, ("requerido",)),
+    Etapa("codigos_snies", codigos_snies, ("equivalentes",)),
+    # Versión propia: las particiones de HECHOS donde están esos códigos, así
+    # un periodo nuevo solo invalida los estudios con programas en él
+    Etapa("hechos", hechos_programas, ("codigos_snies",), persistir=False, version=version_hechos),
+    Etapa("matriculados_2021_2024", matriculados_2021_2024, ("hechos",), persistir=False),
+    Etapa("num_programas_instituciones_tiempo", agregado_num_programas_instituciones, ("hechos",)),
+    Etapa("dispersión_matricula_vs_estudiantes", agregado_dispersion_matricula, ("matriculados_2021_2024",)),
+    Etapa("valor_matricula_tiempo", agregado_valor_matricula_tiempo, ("matriculados_2021_2024",)),
+    Etapa("programas_por_departamento_municipio", agregado_programas_por_municipio, ("hechos",)),
+    Etapa("num_estudiantes_tiempo", agregado_num_estudiantes_tiempo, ("hechos",)),
+    Etapa("resumen_estadistico", resumen_estadistico, (
+        "num_programas_instituciones_tiempo",
+        "dispersión_matricula_vs_estudiantes",
+        "valor_matricula_tiempo",
+        "programas_por_departamento_municipio",
+        "num_estudiantes_tiempo",
+    )),
+    Etapa("programas", listado_programas, ("hechos",)),
+]
+
+# Agregados que van a state.snies (las figuras se generan en graficas_snies)
+AGREGADOS_SNIES = [
+    "num_programas_instituciones_tiempo",
+    "dispersión_matricula_vs_estudiantes",
+    "valor_matricula_tiempo",
+    "programas_por_departamento_municipio",
+    "num_estudiantes_tiempo",
+    # Crecimientos, absorción, cuartiles de precio y concentración (para los agentes)
+    "resumen_estadistico",
+]
+
+def pipeline_snies(state) -> Pipeline:
+    parametros = {"requerido": state.requerido, "nivel": str(state.nivel)}
+    # Las etapas hasta los códigos solo dependen del catálogo; de "hechos" en
+    # adelante la clave lleva la versión de sus particiones (version_hechos)
+    return Pipeline(ETAPAS_SNIES, parametros, version_catalogo(), DIRECTORIO_ETAPAS)
+
+def lector_snies(state, graficas: Optional[str] = None) -> dict:
+    print('Lector de Snies')
+    #Primero verificamos si existe un campo de informacion_programas_nacionales en el estado. 
+    #Pero en el estado que tenemos guardado en el archivo de texto si exsite. Si ese campo existe, entonces no se hace la consulta
+    #pero debe verificar que el nombre del programa y la información básica sean correctas. 
 
-        plt.figure(figsize=(12, 6))
-        sns.lineplot(num)
-        plt.xlabel("Período académico")
-        plt.ylabel("Número de estudiantes")
-        plt.xticks(rotation=90)
-        plt.legend(
-            bbox_to_anchor=(1.05, 1),
-            loc="upper left",
-            borderaxespad=0.0,
-        )
-        plt.tight_layout()
-        plt.grid(True)
-        plt.title("Número de estudiantes en el tiempo en " + exp)
-        plt.savefig(
-            f"./salida/num_estudiantes_tiempo_"
-            + exp.replace(" ", "_")
-            + ".png",
-            dpi=300,
-        )
+    respuesta: dict = {
+        "snies": {},          # aquí irán los datos numéricos de cada gráfica
+        "informacion_programas_nacionales": [],        # Programas que se cargan desde el SNIES
+    }
 
-    respuesta["snies"]["num_estudiantes_tiempo"] = resumen_num_est
-    print('Maestro 5, columnas: ', maestro5.columns)
-    # ------------------------------------------------------------------
-    # 6. Prompt con listado de programas (para otro agente)
-    # ------------------------------------------------------------------
-    programas = []
-    i = 1
-    for ies_name, prg, mpio, url, acreditado, modalidad, num_creditos, num_periodo, periodicidad in (
-        maestro5[["INSTITUCION__y", "PROGRAMA_ACADEMICO", "MUNICIPIO_PROGRAMA","PAGINA_WEB", 'PROGRAMA_ACREDITADO', 'MODALIDAD', 'NUMERO_CREDITOS', 'NUMERO_PERIODO', 'PERIODICIDAD',
-]]
-        .drop_duplicates()
-        .values
-    ):
-        url=str(url).lower()
-        programas.append(
-            programa_nacional(
-                Programa=prg,
-                Institucion=ies_name,
-                Municipio=mpio,
-                URL=url,
-                acreditado="" if pd.isna(acreditado) else str(acreditado),
-                modalidad=modalidad,
-                numero_creditos=int(num_creditos) if str(num_creditos).isdigit() else 0,
-                numero_periodo=int(num_periodo) if str(num_periodo).isdigit() else 0,
-                periodicidad=str(periodicidad), 
-                URL_programa="",
-                Descripcion="",
-                Perfil="",
-                Plan_de_estudios=[],
-                iteraciones=0   #Significa que apenas estamos creando. Falta buscar la información detallada del programa y cargarla en este campo para que el agente de búsqueda de información pueda usarla como referencia para encontrar la información correcta.
-            )
-        )
+    # Solo se recalculan las etapas cuya clave (requerido, nivel, versión de
+    # los datos y entradas) no esté ya en disco
+    pipeline = pipeline_snies(state)
+    for clave in AGREGADOS_SNIES:
+        respuesta["snies"][clave] = pipeline.valor(clave)
 
-    respuesta["informacion_programas_nacionales"] = programas
+    # Las figuras no forman parte de lo que reciben los agentes; según el modo
+    # se dibujan aquí, en un pool de procesos o no se dibujan. Las que se
+    # dibujan aquí se avisan una a una a quien siga el grafo (eventos.py)
+    renderizar(respuesta["snies"], modo=graficas,
+               al_terminar=lambda clave, rutas: emitir("figura", clave=clave, rutas=rutas))
+
+    respuesta["informacion_programas_nacionales"] = [
+        programa_nacional(**p) for p in pipeline.valor("programas")
+    ]
+    print('Etapas recalculadas: ', pipeline.calculadas)
 
     return respuesta
+
+# ----------------------------------------------------------------------
+# Lote de estudios: una pasada por el índice, el catálogo y los hechos
+# ----------------------------------------------------------------------
+def _como_estado(estudio: Union[AgentState, Dict[str, Any]]) -> AgentState:
+    if isinstance(estudio, AgentState):
+        return estudio
+    return AgentState.model_validate({"nombre": "", "descripcion": "", **estudio})
+
+def lector_snies_lote(estudios: Iterable[Union[AgentState, Dict[str, Any]]]) -> List[dict]:
+    """
+    lector_snies para varios estudios (AgentState o dicts con nivel y
+    requerido), en el mismo orden. En lugar de repetir búsqueda, cruce y
+    lectura por estudio: las expresiones se resuelven juntas contra el índice
+    (cada término distinto una vez), los códigos salen de un solo agrupamiento
+    del catálogo y la tabla de hechos se lee una vez para la unión de códigos
+    y se reparte por estudio con un groupby. Los resultados quedan en las
+    mismas etapas memoizadas que usa lector_snies. No dibuja figuras (ver
+    graficas_snies.renderizar con un directorio por estudio).
+    Cada respuesta lleva "error": None, o el mensaje del parser si la
+    expresión del estudio está mal formada (sus agregados quedan vacíos y
+    los demás estudios siguen).
+    """
+    estados = [_como_estado(e) for e in estudios]
+    todos = [pipeline_snies(s) for s in estados]
+
+    # Cada expresión se compila aparte: una mal formada solo descarta su estudio
+    consultas, errores = {}, {}
+    for requerido in dict.fromkeys(p.parametros["requerido"] for p in todos):
+        try:
+            consultas[requerido] = compile_query(requerido)
+        except ValueError as exc:
+            errores[requerido] = str(exc)
+    pipelines = [p for p in todos if p.parametros["requerido"] in consultas]
+
+    sin_equivalentes = [p for p in pipelines if p.pendiente("equivalentes")]
+    if sin_equivalentes:
+        programas = programas_normalizados()
+        indice = obtener_indice(programas["PROGRAMA_ACADEMICO_NORMALIZADO"].unique())
+        requeridos = list(dict.fromkeys(p.parametros["requerido"] for p in sin_equivalentes))
+        equivalentes = dict(zip(requeridos, indice.buscar_lote([consultas[r] for r in requeridos])))
+        for p in sin_equivalentes:
+            p.fijar("equivalentes", equivalentes[p.parametros["requerido"]])
+
+    sin_codigos = [p for p in pipelines if p.pendiente("codigos_snies")]
+    if sin_codigos:
+        programas = programas_normalizados()
+        codigos_por_nombre = programas.groupby("PROGRAMA_ACADEMICO_NORMALIZADO")["CODIGO_SNIES"].unique()
+        for p in sin_codigos:
+            codigos = set()
+            for nombre in p.valor("equivalentes"):
+                if nombre in codigos_por_nombre.index:
+                    codigos.update(codigos_por_nombre[nombre])
+            p.fijar("codigos_snies", sorted(codigos, key=str))
+
+    # Solo leen hechos los estudios a los que les falta algún resultado en disco
+    finales = AGREGADOS_SNIES + ["programas"]
+    con_calculo = [i for i, p in enumerate(pipelines) if any(p.pendiente(n) for n in finales)]
+    if con_calculo:
+        estudios_por_codigo: Dict[Any, List[int]] = defaultdict(list)
+        for i in con_calculo:
+            for codigo in pipelines[i].valor("codigos_snies"):
+                estudios_por_codigo[codigo].append(i)
+        hechos = leer_hechos(list(estudios_por_codigo))
+        # Una fila por (estudio, fila de hechos): cada programa va a todos los estudios que lo encontraron
+        hechos["ESTUDIO"] = hechos["CODIGO_SNIES"].map(estudios_por_codigo)
+        grupos = dict(tuple(hechos.explode("ESTUDIO").groupby("ESTUDIO", sort=False)))
+        for i in con_calculo:
+            grupo = grupos.get(i, hechos.iloc[0:0]).drop(columns="ESTUDIO").reset_index(drop=True)
+            # Como en leer_hechos: solo las categorías presentes en el estudio
+            for col in grupo.select_dtypes("category").columns:
+                grupo[col] = grupo[col].cat.remove_unused_categories()
+            pipelines[i].fijar("hechos", grupo)
+        print(f"Hechos leídos una vez: {len(hechos)} filas para {len(con_calculo)} estudios")
+
+    respuestas = []
+    for p in todos:
+        error = errores.get(p.parametros["requerido"])
+        if error is not None:
+            respuestas.append({"snies": {}, "informacion_programas_nacionales": [], "error": error})
+            continue
+        respuestas.append({
+            "snies": {clave: p.valor(clave) for clave in AGREGADOS_SNIES},
+            "informacion_programas_nacionales": [programa_nacional(**x) for x in p.valor("programas")],
+            "error": None,
+        })
+    print(f"Lote de {len(todos)} estudios ({len(todos) - len(pipelines)} con expresión inválida); "
+          f"etapas recalculadas: {sum(len(p.calculadas) for p in pipelines)}")
+    return respuestas
+
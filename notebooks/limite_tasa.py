@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from almacen_snies import DIRECTORIO
+
+# -------------------------
+# Cupo global de llamadas (LLM y HTTP) compartido entre procesos
+# -------------------------
+# Cubeta de tokens guardada en SQLite: todos los procesos que usan el mismo
+# archivo (p. ej. los trabajadores de cola_trabajos) descuentan de la misma
+# cubeta. Cada llamada reserva su token aunque la cubeta quede en negativo y
+# espera lo que falte; así las esperas quedan en orden de llegada y no hay
+# reintentos contra la base. Tasa 0 = sin límite (no se toca la base).
+RUTA_LIMITES = os.getenv("LIMITES_RUTA", os.path.join(DIRECTORIO, "limites_tasa.sqlite"))
+LIMITE_LLM_POR_MIN = float(os.getenv("LIMITE_LLM_POR_MIN", "0"))
+LIMITE_HTTP_POR_S = float(os.getenv("LIMITE_HTTP_POR_S", "0"))
+
+class CubetaTokens:
+    """`tasa_por_s` llamadas por segundo en promedio, con ráfagas de hasta `rafaga`."""
+
+    def __init__(self, nombre: str, tasa_por_s: float, rafaga: Optional[float] = None,
+                 ruta: str = RUTA_LIMITES):
+        self.nombre = nombre
+        self.tasa_por_s = tasa_por_s
+        self.rafaga = rafaga or max(1.0, tasa_por_s)
+        self.ruta = ruta
+        if self.activa:
+            with sqlite3.connect(self.ruta, timeout=30) as con:
+                con.execute("CREATE TABLE IF NOT EXISTS cubetas (nombre TEXT PRIMARY KEY, tokens REAL, actualizado REAL)")
+
+    @property
+    def activa(self) -> bool:
+        return self.tasa_por_s > 0
+
+    def reservar(self, n: float = 1) -> float:
+        """Descuenta n tokens y devuelve los segundos que hay que esperar antes de usarlos."""
+        if not self.activa:
+            return 0.0
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE: leer y escribir la cubeta sin que otro proceso se cuele
+            con.execute("BEGIN IMMEDIATE")
+            fila = con.execute("SELECT tokens, actualizado FROM cubetas WHERE nombre = ?", (self.nombre,)).fetchone()
+            ahora = time.time()
+            tokens = self.rafaga if fila is None else min(self.rafaga, fila[0] + (ahora - fila[1]) * self.tasa_por_s)
+            tokens -= n
+            con.execute("INSERT OR REPLACE INTO cubetas VALUES (?, ?, ?)", (self.nombre, tokens, ahora))
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        return max(0.0, -tokens / self.tasa_por_s)
+
+    def esperar(self, n: float = 1) -> None:
+        espera = self.reservar(n)
+        if espera > 0:
+            time.sleep(espera)
+
+    async def aesperar(self, n: float = 1) -> None:
+        espera = await asyncio.to_thread(self.reservar, n) if self.activa else 0.0
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+limite_llm = CubetaTokens("llm", LIMITE_LLM_POR_MIN / 60)
+limite_http = CubetaTokens("http", LIMITE_HTTP_POR_S)
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from almacen_snies import DIRECTORIO
+
+# -------------------------
+# Puntos de control del grafo en SQLite
+# -------------------------
+# LangGraph guarda un punto de control al terminar cada paso (superstep). Los
+# valores de cada campo del estado van en `blobs`, uno por versión del canal:
+# un paso solo escribe los campos que cambió (el resumen de SNIES se escribe
+# una vez, no en cada paso). Las escrituras de nodos que terminaron dentro de
+# un paso interrumpido quedan en `escrituras` y no se repiten al reanudar.
+RUTA_PUNTOS_CONTROL = os.getenv("PUNTOS_CONTROL_RUTA", os.path.join(DIRECTORIO, "puntos_control.sqlite"))
+
+# Tipos propios del estado que se pueden reconstruir desde un punto de control
+TIPOS_ESTADO = [("estado", "programa_nacional"), ("estado", "Nivel")]
+
+class PuntosControlSQLite(BaseCheckpointSaver):
+    """Checkpointer de LangGraph sobre sqlite3. Los hilos (thread_id) identifican cada ejecución."""
+
+    def __init__(self, ruta: str = RUTA_PUNTOS_CONTROL, *, serde=None):
+        super().__init__(serde=serde or JsonPlusSerializer(allowed_msgpack_modules=TIPOS_ESTADO))
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS puntos ("
+                " hilo TEXT, ns TEXT, id TEXT, padre TEXT, tipo TEXT, punto BLOB,"
+                " tipo_metadata TEXT, metadata BLOB, creado REAL,"
+                " PRIMARY KEY (hilo, ns, id))"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " hilo TEXT, ns TEXT, canal TEXT, version TEXT, tipo TEXT, valor BLOB,"
+                " PRIMARY KEY (hilo, ns, canal, version))"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS escrituras ("
+                " hilo TEXT, ns TEXT, id TEXT, tarea TEXT, idx INTEGER, canal TEXT,"
+                " tipo TEXT, valor BLOB, ruta_tarea TEXT,"
+                " PRIMARY KEY (hilo, ns, id, tarea, idx))"
+            )
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def _tupla(self, con: sqlite3.Connection, hilo: str, ns: str, fila: Tuple) -> CheckpointTuple:
+        id_punto, padre, tipo, punto, tipo_metadata, metadata = fila
+        punto = self.serde.loads_typed((tipo, punto))
+        valores = {}
+        for canal, version in punto["channel_versions"].items():
+            blob = con.execute(
+                "SELECT tipo, valor FROM blobs WHERE hilo = ? AND ns = ? AND canal = ? AND version = ?",
+                (hilo, ns, canal, str(version)),
+            ).fetchone()
+            if blob is not None and blob[0] != "empty":
+                valores[canal] = self.serde.loads_typed(blob)
+        pendientes = con.execute(
+            "SELECT tarea, canal, tipo, valor FROM escrituras"
+            " WHERE hilo = ? AND ns = ? AND id = ? ORDER BY tarea, idx",
+            (hilo, ns, id_punto),
+        ).fetchall()
+        configurable = {"thread_id": hilo, "checkpoint_ns": ns}
+        return CheckpointTuple(
+            config={"configurable": {**configurable, "checkpoint_id": id_punto}},
+            checkpoint={**punto, "channel_values": valores},
+            metadata=self.serde.loads_typed((tipo_metadata, metadata)),
+            parent_config={"configurable": {**configurable, "checkpoint_id": padre}} if padre else None,
+            pending_writes=[(tarea, canal, self.serde.loads_typed((t, v))) for tarea, canal, t, v in pendientes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        hilo = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        consulta = "SELECT id, padre, tipo, punto, tipo_metadata, metadata FROM puntos WHERE hilo = ? AND ns = ?"
+        if id_punto := get_checkpoint_id(config):
+            consulta, parametros = consulta + " AND id = ?", (hilo, ns, id_punto)
+        else:
+            # Los ids (uuid6) crecen con el tiempo: el mayor es el último punto
+            consulta, parametros = consulta + " ORDER BY id DESC LIMIT 1", (hilo, ns)
+        with self._lock, self._conectar() as con:
+            fila = con.execute(consulta, parametros).fetchone()
+            return self._tupla(con, hilo, ns, fila) if fila else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        condiciones, parametros = [], []
+        if config is not None:
+            condiciones.append("hilo = ?")
+            parametros.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                condiciones.append("ns = ?")
+                parametros.append(config["configurable"]["checkpoint_ns"])
+            if id_punto := get_checkpoint_id(config):
+                condiciones.append("id = ?")
+                parametros.append(id_punto)
+        if before is not None and (anterior := get_checkpoint_id(before)):
+            condiciones.append("id < ?")
+            parametros.append(anterior)
+        consulta = "SELECT hilo, ns, id, padre, tipo, punto, tipo_metadata, metadata FROM puntos"
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY id DESC"
+
+        with self._lock, self._conectar() as con:
+            tuplas = []
+            for hilo, ns, *fila in con.execute(consulta, parametros).fetchall():
+                tupla = self._tupla(con, hilo, ns, tuple(fila))
+                # El filtro de metadata se aplica en Python: la metadata va serializada
+                if filter and any(tupla.metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                tuplas.append(tupla)
+                if limit and len(tuplas) >= limit:
+                    break
+        yield from tuplas
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        hilo = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        punto = dict(checkpoint)
+        valores = punto.pop("channel_values")
+        # Solo los canales con versión nueva: los demás ya están guardados
+        blobs = [
+            (hilo, ns, canal, str(version),
+             *(self.serde.dumps_typed(valores[canal]) if canal in valores else ("empty", b"")))
+            for canal, version in new_versions.items()
+        ]
+        tipo, serializado = self.serde.dumps_typed(punto)
+        tipo_metadata, serializada = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock, self._conectar() as con:
+            con.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+            con.execute(
+                "INSERT OR REPLACE INTO puntos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (hilo, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 tipo, serializado, tipo_metadata, serializada, time.time()),
+            )
+        return {"configurable": {"thread_id": hilo, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        hilo = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        id_punto = config["configurable"]["checkpoint_id"]
+        filas = [
+            (hilo, ns, id_punto, task_id, WRITES_IDX_MAP.get(canal, idx), canal,
+             *self.serde.dumps_typed(valor), task_path)
+            for idx, (canal, valor) in enumerate(writes)
+        ]
+        # Las escrituras especiales (error, interrupción) se reemplazan; las normales no se duplican
+        verbo = "INSERT OR REPLACE" if all(canal in WRITES_IDX_MAP for canal, _ in writes) else "INSERT OR IGNORE"
+        with self._lock, self._conectar() as con:
+            con.executemany(f"{verbo} INTO escrituras VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", filas)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self._conectar() as con:
+            for tabla in ("puntos", "blobs", "escrituras"):
+                con.execute(f"DELETE FROM {tabla} WHERE hilo = ?", (thread_id,))
+
+    # ------------------------------------------------------------------
+    # Versiones asíncronas (ainvoke/astream): las mismas operaciones en un hilo
+    # ------------------------------------------------------------------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuplas = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for tupla in tuplas:
+            yield tupla
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def hilos(self) -> Dict[str, float]:
+        """Ejecuciones guardadas: thread_id -> fecha (epoch) de su último punto de control."""
+        with self._conectar() as con:
+            return dict(con.execute("SELECT hilo, MAX(creado) FROM puntos GROUP BY hilo ORDER BY 2 DESC"))
+
+# Se crea al primer uso: importar el módulo (grafo, servicio, cada trabajador) no escribe nada en DIRECTORIO
+_puntos_control: Optional[PuntosControlSQLite] = None
+_lock_puntos_control = threading.Lock()
+
+def puntos_control_por_defecto() -> PuntosControlSQLite:
+    global _puntos_control
+    with _lock_puntos_control:
+        if _puntos_control is None:
+            _puntos_control = PuntosControlSQLite()
+        return _puntos_control
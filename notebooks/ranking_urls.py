@@ -0,0 +1,117 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+from cache_paginas import normalizar_url
+from evaluador_expresiones import normalizar_texto
+
+# -------------------------
+# Canonicalización y ranking de URLs antes de descargar
+# -------------------------
+# Las cuatro consultas por programa devuelven muchas veces la misma página
+# (con parámetros de rastreo, http/https, "www." o "/" final) y páginas fuera
+# del sitio de la institución. Aquí se decide qué vale la pena descargar.
+PARAMETROS_RASTREO = re.compile(
+    r"^(utm_\w+|gclid|gbraid|wbraid|fbclid|msclkid|dclid|yclid|mc_cid|mc_eid|_ga|_gl|_hs\w+|hsa_\w+|ref|ref_src|igshid|si)$",
+    re.IGNORECASE,
+)
+
+# Sitios que no describen programas (redes, agregadores, rankings)
+DOMINIOS_EXCLUIDOS = {
+    "facebook.com", "instagram.com", "linkedin.com", "twitter.com", "x.com", "youtube.com",
+    "tiktok.com", "wikipedia.org", "pinterest.com", "reddit.com", "scribd.com", "issuu.com",
+}
+
+# Sufijos de segundo nivel colombianos: udea.edu.co es el dominio, no edu.co
+_SUFIJOS_DOBLES = {"edu.co", "gov.co", "com.co", "org.co", "net.co", "mil.co", "gob.co"}
+
+PALABRAS_PROGRAMA = ("programa", "posgrado", "postgrado", "pregrado", "especializacion", "maestria",
+                     "doctorado", "facultad", "escuela", "oferta", "academic")
+PALABRAS_PLAN = ("plan", "estudio", "malla", "curricul", "pensum", "asignatura", "microcurricul")
+PALABRAS_DESCARTAR = ("noticia", "blog", "evento", "agenda", "prensa", "convocatoria", "egresados/historias")
+
+def quitar_rastreo(url: str) -> str:
+    partes = urlsplit(url.strip())
+    consulta = [(k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+                if not PARAMETROS_RASTREO.match(k)]
+    return urlunsplit((partes.scheme, partes.netloc, partes.path, urlencode(consulta), ""))
+
+def canonizar_url(url: str) -> str:
+    """URL a descargar: normalizada (ver cache_paginas.normalizar_url) y sin parámetros de rastreo."""
+    if "://" not in url:
+        url = "https://" + url
+    return normalizar_url(quitar_rastreo(url))
+
+def clave_url(url: str) -> str:
+    """Clave de duplicados: además ignora el esquema y el "www." inicial."""
+    partes = urlsplit(canonizar_url(url))
+    host = partes.netloc[4:] if partes.netloc.startswith("www.") else partes.netloc
+    return urlunsplit(("", host, partes.path, partes.query, ""))
+
+def dominio_registrable(url_o_host: Optional[str]) -> str:
+    if not url_o_host or str(url_o_host).lower() in ("nan", "null", "none"):
+        return ""
+    texto = str(url_o_host).strip().lower()
+    host = urlsplit(texto if "://" in texto else "http://" + texto).hostname or ""
+    etiquetas = host.split(".")
+    n = 3 if ".".join(etiquetas[-2:]) in _SUFIJOS_DOBLES else 2
+    return ".".join(etiquetas[-n:])
+
+def _tokens(texto: str) -> set:
+    # Sin tildes antes de partir: "Ingeniería" da "ingenieria", no "ingenier" y "a"
+    return {t for t in re.split(r"[^a-z0-9]+", normalizar_texto(texto)) if len(t) > 3}
+
+def puntuar_url(url: str, puntaje_busqueda: float, dominio_institucion: str,
+                nombre_programa: str = "", titulo: str = "") -> Optional[float]:
+    """
+    Puntaje de una URL para un programa, o None si no vale la pena
+    descargarla (redes sociales, PDFs que no parecen plan de estudios).
+    """
+    partes = urlsplit(url)
+    dominio = dominio_registrable(partes.hostname)
+    if dominio in DOMINIOS_EXCLUIDOS:
+        return None
+    ruta = (partes.path + "?" + partes.query).lower()
+    texto = normalizar_texto(unquote(ruta) + " " + titulo)
+    if ruta.split("?")[0].endswith(".pdf") and not any(p in texto for p in PALABRAS_PLAN):
+        return None
+
+    puntaje = puntaje_busqueda
+    if dominio_institucion and dominio == dominio_institucion:
+        puntaje += 1.0
+    if any(p in ruta for p in PALABRAS_PROGRAMA):
+        puntaje += 0.3
+    if any(p in texto for p in PALABRAS_PLAN):
+        puntaje += 0.2
+    comunes = _tokens(nombre_programa) & _tokens(texto.replace("-", " ").replace("_", " "))
+    puntaje += 0.1 * min(len(comunes), 3)
+    if any(p in ruta for p in PALABRAS_DESCARTAR):
+        puntaje -= 0.5
+    return puntaje
+
+def rankear_urls(resultados: Iterable[Dict[str, Any]], url_institucion: Optional[str],
+                 nombre_programa: str = "", maximo: Optional[int] = None) -> List[str]:
+    """
+    resultados: [{"url", "score", "title"}] de los buscadores. Devuelve URLs
+    canónicas sin duplicados, de mayor a menor puntaje.
+    """
+    dominio_institucion = dominio_registrable(url_institucion)
+    mejores: Dict[str, Tuple[float, str]] = {}
+    for r in resultados:
+        if not r.get("url"):
+            continue
+        url = canonizar_url(r["url"])
+        puntaje = puntuar_url(url, float(r.get("score") or 0), dominio_institucion,
+                              nombre_programa, r.get("title") or "")
+        if puntaje is None:
+            continue
+        clave = clave_url(url)
+        if clave in mejores:
+            # Variantes de la misma página: el mayor puntaje y, si alguna es https, esa
+            anterior_puntaje, anterior_url = mejores[clave]
+            puntaje = max(puntaje, anterior_puntaje)
+            if not url.startswith("https://") and anterior_url.startswith("https://"):
+                url = anterior_url
+        mejores[clave] = (puntaje, url)
+    ordenadas = [url for _, url in sorted(mejores.values(), key=lambda c: -c[0])]
+    return ordenadas[:maximo] if maximo else ordenadas
@@ -0,0 +1,233 @@
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# -------------------------
+# Serialización compacta de los agregados de SNIES para los prompts
+# -------------------------
+# En lugar de json.dumps(..., indent=2) los datos se envían como tablas con
+# separador "|" y números redondeados. Si la tabla supera el presupuesto de
+# tokens del nodo, se reduce (menos decimales, periodos muestreados, filas
+# recortadas con una nota de lo omitido) hasta que quepa.
+PRESUPUESTO_POR_DEFECTO = int(os.getenv("PRESUPUESTO_TOKENS_LLM", "2000"))
+
+PRESUPUESTO_TOKENS = {
+    "analisis_num_programas_instituciones_tiempo": PRESUPUESTO_POR_DEFECTO,
+    "analisis_dispersion_matricula_vs_estudiantes": PRESUPUESTO_POR_DEFECTO,
+    "analisis_valor_matricula_tiempo": PRESUPUESTO_POR_DEFECTO,
+    "analisis_programas_municipios": PRESUPUESTO_POR_DEFECTO,
+    "analisis_numero_de_estudiantes": PRESUPUESTO_POR_DEFECTO,
+}
+# Cuando el prompt lleva el resumen estadístico (estadisticas_snies.py), los
+# datos crudos son solo una muestra de referencia y caben en menos tokens
+PRESUPUESTO_CRUDO_CON_RESUMEN = int(os.getenv("PRESUPUESTO_TOKENS_CRUDO", "600"))
+
+try:
+    import tiktoken
+    _codificador = tiktoken.get_encoding("o200k_base")
+except Exception:  # sin tiktoken (o sin el archivo de la codificación) se estima
+    _codificador = None
+
+def contar_tokens(texto: str) -> int:
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return max(1, len(texto) // 4)
+
+def reportar_tokens(campo: str, original: Any, compacto: str) -> None:
+    antes = contar_tokens(json.dumps(original, ensure_ascii=False, indent=2))
+    despues = contar_tokens(compacto)
+    print(f"Tokens de datos ({campo}): {antes} -> {despues}")
+
+# -------------------------
+# Utilidades
+# -------------------------
+def _fmt(valor: Any, decimales: int) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ""
+        if decimales == 0 or valor.is_integer():
+            return str(int(round(valor)))
+        return f"{valor:.{decimales}f}"
+    return str(valor)
+
+def tabla(columnas: List[str], filas: Iterable[List[Any]], decimales: int = 2) -> str:
+    lineas = ["|".join(columnas)]
+    lineas += ["|".join(_fmt(v, decimales) for v in fila) for fila in filas]
+    return "\n".join(lineas)
+
+def muestrear(elementos: List[Any], maximo: int) -> List[Any]:
+    """Elementos equiespaciados, conservando siempre el primero y el último."""
+    if maximo <= 0 or len(elementos) <= maximo:
+        return list(elementos)
+    if maximo == 1:
+        return [elementos[-1]]
+    paso = (len(elementos) - 1) / (maximo - 1)
+    return [elementos[round(i * paso)] for i in range(maximo)]
+
+def _tamanos(n: int) -> List[int]:
+    # n, n/2, n/4, ... hasta 1
+    tamanos = []
+    while n >= 1:
+        tamanos.append(n)
+        n //= 2
+    return tamanos or [0]
+
+def ajustar(construir: Callable[[Any, int], str], tamanos: List[Any], presupuesto: int) -> str:
+    """
+    construir(tamano, decimales) arma el texto con a lo sumo `tamano` filas o
+    periodos. Se prueba cada tamaño, de mayor a menor, hasta que quepa.
+    """
+    texto = ""
+    for tamano in tamanos:
+        for decimales in (2, 1, 0):
+            texto = construir(tamano, decimales)
+            if contar_tokens(texto) <= presupuesto:
+                return texto
+    return texto
+
+def _nota(omitidos: int, que: str) -> str:
+    return f"\n({omitidos} {que} omitidos por límite de tamaño)" if omitidos > 0 else ""
+
+# -------------------------
+# Codificadores por agregado
+# -------------------------
+def compactar_num_programas_instituciones(registros: List[Dict[str, Any]], presupuesto: int) -> str:
+    def clave(p: str):
+        partes = str(p).split("-")
+        return int(partes[0]), int(partes[1])
+
+    periodos = sorted({r["PERIODO"] for r in registros}, key=clave)
+    por_periodo = {(r["PERIODO"], r["SECTOR"]): r for r in registros}
+
+    def construir(tamano: int, decimales: int) -> str:
+        elegidos = muestrear(periodos, tamano)
+        filas = []
+        for p in elegidos:
+            fila = [p]
+            for campo in ("NUM_INSTITUCIONES", "NUM_PROGRAMAS"):
+                for sector in ("Oficial", "Privado"):
+                    fila.append(por_periodo.get((p, sector), {}).get(campo, 0))
+            filas.append(fila)
+        columnas = ["PERIODO", "INST_OFICIAL", "INST_PRIVADO", "PROG_OFICIAL", "PROG_PRIVADO"]
+        return tabla(columnas, filas, decimales) + _nota(len(periodos) - len(elegidos), "periodos intermedios")
+
+    return ajustar(construir, _tamanos(len(periodos)), presupuesto)
+
+def compactar_dispersion(datos: Dict[str, Any], presupuesto: int) -> str:
+    programas = sorted(
+        datos.get("programas", []),
+        key=lambda r: r["num_estudiantes_promedio_2021_2023"],
+        reverse=True,
+    )
+    encabezado = ""
+    if "correlacion_matricula_estudiantes" in datos:
+        encabezado = f"correlacion_matricula_estudiantes={datos['correlacion_matricula_estudiantes']:.3f}\n"
+
+    def construir(tamano: int, decimales: int) -> str:
+        elegidos = programas[:tamano]
+        filas = [
+            [r["nombre_ies_programa"], r["departamento"], r["sector"],
+             r["matricula_2024"] / 1e6, r["num_estudiantes_promedio_2021_2023"]]
+            for r in elegidos
+        ]
+        columnas = ["IES_PROGRAMA", "DEPARTAMENTO", "SECTOR", "MATRICULA_MILLONES", "ESTUDIANTES_PROM"]
+        return encabezado + tabla(columnas, filas, decimales) + _nota(len(programas) - len(elegidos), "programas con menos estudiantes")
+
+    return ajustar(construir, _tamanos(len(programas)), presupuesto)
+
+def compactar_valor_matricula(series: List[Dict[str, Any]], presupuesto: int) -> str:
+    periodos = sorted({p["periodo"] for s in series for p in s["serie"]})
+    valores = {
+        s["nombre_ies_programa"]: {p["periodo"]: p["valor_matricula_millones"] for p in s["serie"]}
+        for s in series
+    }
+
+    def construir(tamano, decimales: int) -> str:
+        n_periodos, n_series = tamano
+        elegidos = muestrear(periodos, n_periodos)
+        filas = [
+            [s["nombre_ies_programa"], s["sector"]] + [valores[s["nombre_ies_programa"]].get(p) for p in elegidos]
+            for s in muestrear(series, n_series)
+        ]
+        return (
+            tabla(["IES_PROGRAMA", "SECTOR"] + elegidos, filas, decimales)
+            + _nota(len(periodos) - len(elegidos), "periodos intermedios")
+            + _nota(len(series) - len(filas), "programas")
+        )
+
+    # Primero se muestrean los periodos (sin bajar de 4); si aún no cabe, los programas
+    minimo = min(4, len(periodos))
+    tamanos = [(n, len(series)) for n in _tamanos(len(periodos)) if n >= minimo]
+    tamanos += [(minimo, n) for n in _tamanos(len(series))[1:]]
+    return ajustar(construir, tamanos, presupuesto)
+
+def compactar_programas_municipio(registros: List[Dict[str, Any]], presupuesto: int) -> str:
+    # Los registros ya vienen ordenados de mayor a menor número de programas
+    def construir(tamano: int, decimales: int) -> str:
+        elegidos = registros[:tamano]
+        resto = registros[tamano:]
+        filas = [[r["Departamento"], r["Municipio"], r["Numero_programas"]] for r in elegidos]
+        texto = tabla(["DEPARTAMENTO", "MUNICIPIO", "NUM_PROGRAMAS"], filas, decimales)
+        if resto:
+            total = sum(r["Numero_programas"] for r in resto)
+            texto += f"\n({len(resto)} municipios más con {total} programas en total)"
+        return texto
+
+    return ajustar(construir, _tamanos(len(registros)), presupuesto)
+
+def compactar_num_estudiantes(resumen: Dict[str, Any], presupuesto: int) -> str:
+    n = max((len(g["periodos"]) for g in resumen.values()), default=0)
+
+    def construir(tamano: int, decimales: int) -> str:
+        bloques = []
+        for grupo, datos in resumen.items():
+            pares = muestrear(list(zip(datos["periodos"], datos["valores"])), tamano)
+            filas = [[p] + [v.get(proc) for proc in datos["procesos"]] for p, v in pares]
+            bloques.append(
+                f"## {grupo}\n"
+                + tabla(["PERIODO"] + list(datos["procesos"]), filas, decimales)
+                + _nota(len(datos["periodos"]) - len(pares), "periodos intermedios")
+            )
+        return "\n\n".join(bloques)
+
+    return ajustar(construir, _tamanos(n), presupuesto)
+
+def _es_tabla(valor: Any) -> bool:
+    # {fila: {columna: escalar}} con las mismas columnas en todas las filas
+    if not isinstance(valor, dict) or not valor:
+        return False
+    filas = list(valor.values())
+    if not all(isinstance(f, dict) and f for f in filas):
+        return False
+    columnas = list(filas[0])
+    return all(list(f) == columnas and not any(isinstance(v, dict) for v in f.values()) for f in filas)
+
+def compactar_resumen(resumen: Dict[str, Any], sangria: int = 0) -> str:
+    """
+    Diccionario anidado como líneas "clave: valor" indentadas, sin los valores
+    vacíos; los grupos de filas con las mismas columnas van como tabla.
+    """
+    prefijo = "  " * sangria
+    lineas = []
+    for clave, valor in resumen.items():
+        if valor is None or valor == {}:
+            continue
+        if _es_tabla(valor):
+            columnas = list(next(iter(valor.values())))
+            texto = tabla([""] + columnas, ([k] + list(f.values()) for k, f in valor.items()), 4)
+            lineas.append(f"{prefijo}{clave}:")
+            lineas.extend(prefijo + "  " + l for l in texto.split("\n"))
+        elif isinstance(valor, dict):
+            lineas.append(f"{prefijo}{clave}:")
+            lineas.append(compactar_resumen(valor, sangria + 1))
+        else:
+            lineas.append(f"{prefijo}{clave}: {_fmt(valor, 4)}")
+    return "\n".join(l for l in lineas if l)
+
+def presupuesto(campo: str, valor: Optional[int] = None, con_resumen: bool = False) -> int:
+    if valor:
+        return valor
+    base = PRESUPUESTO_TOKENS.get(campo, PRESUPUESTO_POR_DEFECTO)
+    return min(base, PRESUPUESTO_CRUDO_CON_RESUMEN) if con_resumen else base
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+import threading
+import traceback
+import uuid
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, field_validator
+
+import graficas_snies
+from almacen_snies import precargar, programas_normalizados
+from estado import Nivel
+from evaluador_expresiones import compile_query
+from graficas_snies import SALIDA, graficar_en_procesos
+from grafo import aeventos, configuracion, construir_grafo, ejecutar
+from indice_programas import obtener_indice
+from lector import AGREGADOS_SNIES, lector_snies_lote, pipeline_snies
+from puntos_control import puntos_control_por_defecto
+
+# -------------------------
+# Servicio HTTP sobre el lector de SNIES y el grafo de agentes
+# -------------------------
+# Al arrancar se cargan una vez el catálogo normalizado, la tabla de hechos y
+# el índice de nombres (almacen_snies.precargar); todas las peticiones los
+# comparten en memoria, solo lectura. Las etapas del lector siguen
+# memoizadas en disco, así que una búsqueda repetida no recalcula nada.
+# Varias ejecuciones del grafo corren a la vez en hilos: dentro del grafo no
+# se dibujan figuras (pyplot no es seguro entre hilos y todas irían a
+# ./salida); cada ejecución las genera en el pool de procesos de
+# graficas_snies, en salida/<id>/.
+# Ejecutar desde notebooks/:  fastapi run servicio.py   (o `python main.py`)
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    def _cargar():
+        precargar()
+        obtener_indice(programas_normalizados()["PROGRAMA_ACADEMICO_NORMALIZADO"].unique())
+
+    graficas_snies.MODO_GRAFICAS = "none"
+    print("Cargando datos de SNIES en memoria")
+    await asyncio.to_thread(_cargar)
+    yield
+
+app = FastAPI(title="Agentes de programas", lifespan=ciclo_de_vida)
+
+class Busqueda(BaseModel):
+    requerido: str
+    nivel: Nivel
+
+    @field_validator("requerido")
+    @classmethod
+    def _expresion_valida(cls, requerido: str) -> str:
+        # Una expresión mal formada se responde con 422 y el mensaje del parser,
+        # no con un 500 al evaluarla dentro del lector
+        compile_query(requerido)
+        return requerido
+
+class Solicitud(Busqueda):
+    nombre: str
+    descripcion: str
+
+# Estado de los trabajos lanzados por este proceso; el estado del grafo en
+# sí queda en los puntos de control (el id del trabajo es el thread_id)
+_trabajos: Dict[str, Dict[str, Any]] = {}
+_lock_trabajos = threading.Lock()
+
+def _marcar(id_trabajo: str, **campos) -> None:
+    with _lock_trabajos:
+        _trabajos.setdefault(id_trabajo, {}).update(campos)
+
+def _directorio_figuras(id_ejecucion: str) -> str:
+    return os.path.abspath(os.path.join(SALIDA, id_ejecucion))
+
+def _agregados(busqueda: Busqueda) -> Dict[str, Any]:
+    pipeline = pipeline_snies(busqueda)
+    return {clave: pipeline.valor(clave) for clave in AGREGADOS_SNIES}
+
+def _correr_trabajo(id_trabajo: str, solicitud: Solicitud) -> None:
+    _marcar(id_trabajo, estado="en_curso")
+    try:
+        estado = ejecutar({**solicitud.model_dump(), "informacion_programas_nacionales": []}, hilo=id_trabajo)
+        futuros = graficar_en_procesos(estado.get("snies") or {}, _directorio_figuras(id_trabajo))
+        _marcar(id_trabajo, estado="terminado", figuras={c: f.result() for c, f in futuros.items()})
+    except Exception as exc:
+        traceback.print_exc()
+        _marcar(id_trabajo, estado="error", error=f"{type(exc).__name__}: {exc}")
+
+# ------------------------------------------------------------------
+# Endpoints (funciones síncronas: FastAPI las corre en su pool de hilos)
+# ------------------------------------------------------------------
+@app.get("/programas")
+def buscar_programas(busqueda: Annotated[Busqueda, Query()]) -> Dict[str, List[Any]]:
+    """Nombres equivalentes a `requerido` y el listado de programas que les corresponde."""
+    pipeline = pipeline_snies(busqueda)
+    return {"equivalentes": pipeline.valor("equivalentes"), "programas": pipeline.valor("programas")}
+
+@app.get("/snies")
+def agregados_snies(busqueda: Annotated[Busqueda, Query()]) -> Dict[str, Any]:
+    """Los agregados que recibe el grafo en state.snies (sin dibujar figuras)."""
+    return _agregados(busqueda)
+
+@app.post("/snies/lote")
+def agregados_snies_lote(busquedas: List[Busqueda]) -> List[Dict[str, Any]]:
+    """/snies y /programas para varias búsquedas con una sola lectura de los datos (lector_snies_lote)."""
+    respuestas = lector_snies_lote([b.model_dump() for b in busquedas])
+    return [
+        {"snies": r["snies"], "programas": jsonable_encoder(r["informacion_programas_nacionales"])}
+        for r in respuestas
+    ]
+
+@app.post("/trabajos", status_code=202)
+def crear_trabajo(solicitud: Solicitud, tareas: BackgroundTasks) -> Dict[str, str]:
+    """Lanza el grafo completo en segundo plano; consultar el avance en /trabajos/{id}."""
+    id_trabajo = uuid.uuid4().hex
+    _marcar(id_trabajo, estado="pendiente")
+    tareas.add_task(_correr_trabajo, id_trabajo, solicitud)
+    return {"id": id_trabajo, "estado": "pendiente"}
+
+@app.get("/trabajos/{id_trabajo}")
+def consultar_trabajo(id_trabajo: str) -> Dict[str, Any]:
+    with _lock_trabajos:
+        trabajo = dict(_trabajos.get(id_trabajo, {}))
+    instantanea = construir_grafo("lote", checkpointer=puntos_control_por_defecto()).get_state(configuracion(hilo=id_trabajo))
+    if not trabajo and not instantanea.values:
+        raise HTTPException(status_code=404, detail="Trabajo desconocido")
+    respuesta = {
+        "id": id_trabajo,
+        # Sin registro en este proceso (p. ej. tras reiniciar) el estado sale de los puntos de control
+        "estado": trabajo.get("estado") or ("interrumpido" if instantanea.next else "terminado"),
+        "siguientes": list(instantanea.next),
+    }
+    for campo in ("error", "figuras"):
+        if campo in trabajo:
+            respuesta[campo] = trabajo[campo]
+    if respuesta["estado"] == "terminado":
+        respuesta["resultado"] = jsonable_encoder(instantanea.values)
+    return respuesta
+
+@app.post("/eventos")
+def seguir_ejecucion(solicitud: Solicitud, hilo: Optional[str] = None) -> StreamingResponse:
+    """
+    Corre el grafo y transmite como Server-Sent Events cada análisis, figura y
+    programa enriquecido apenas está listo (ver grafo.aeventos). Con `hilo`
+    se guarda en los puntos de control y se puede reanudar o consultar en /trabajos/{hilo}.
+    Las figuras se dibujan en el pool de procesos, en salida/<hilo>/ (o un id
+    nuevo), en cuanto el lector termina, y el evento "fin" va al final.
+    """
+    directorio = _directorio_figuras(hilo or uuid.uuid4().hex)
+
+    def _formato(evento: Dict[str, Any]) -> str:
+        return f"event: {evento['tipo']}\ndata: {json.dumps(jsonable_encoder(evento), ensure_ascii=False)}\n\n"
+
+    async def _enviar_figuras() -> Dict[str, asyncio.Future]:
+        futuros = await asyncio.to_thread(lambda: graficar_en_procesos(_agregados(solicitud), directorio))
+        return {clave: asyncio.wrap_future(futuro) for clave, futuro in futuros.items()}
+
+    async def _sse() -> AsyncIterator[str]:
+        entrada = {**solicitud.model_dump(), "informacion_programas_nacionales": []}
+        figuras: Optional[Dict[str, asyncio.Future]] = None
+        fin = None
+        try:
+            async for evento in aeventos(entrada, hilo=hilo):
+                if evento["tipo"] == "fin":
+                    fin = evento
+                    continue
+                yield _formato(evento)
+                if figuras is None and evento["tipo"] == "paso" and evento["nodo"] == "lector_snies":
+                    figuras = await _enviar_figuras()
+                for clave in [c for c, f in (figuras or {}).items() if f.done()]:
+                    yield _formato({"tipo": "figura", "clave": clave, "rutas": figuras.pop(clave).result()})
+            # Ejecución reanudada después del lector: las figuras salen de las etapas memoizadas
+            if figuras is None:
+                figuras = await _enviar_figuras()
+            for clave, futuro in figuras.items():
+                yield _formato({"tipo": "figura", "clave": clave, "rutas": await futuro})
+            if fin is not None:
+                yield _formato(fin)
+        except Exception as exc:
+            traceback.print_exc()
+            yield f"event: error\ndata: {json.dumps({'error': f'{type(exc).__name__}: {exc}'}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(_sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Los módulos de notebooks/ leen su configuración de variables de entorno al
+# importarse: los archivos de datos y cachés de las pruebas van a un
+# directorio temporal y no al del repositorio.
+os.environ.setdefault("SNIES_DIR", tempfile.mkdtemp(prefix="snies-pruebas-"))
+os.environ.setdefault("OPENAI_API_KEY", "pruebas")
+os.environ.setdefault("TAVILY_API_KEY", "pruebas")
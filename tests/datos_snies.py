@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import pandas as pd
+
+# -------------------------
+# SNIES sintético: las cuatro tablas con la forma del origen (todo como texto, "null" en numéricos)
+# -------------------------
+NOTEBOOKS = Path(__file__).resolve().parent.parent / "notebooks"
+
+NOMBRES = [
+    "Especialización en Educación para la Salud", "Maestría en Formación Médica",
+    "Ingeniería de Sistemas", "Especialización en Medicina Deportiva", "Maestría en Educación",
+    "Especialización en Salud Pública", "Maestría en Ingeniería de Software", "Maestría en Derecho",
+]
+DEPARTAMENTOS = [("Antioquia", "Medellín"), ("Valle", "Cali"), ("Bogotá", "Bogotá D.C.")]
+PROCESOS = ["ADMITIDOS", "GRADUADOS", "INSCRITOS", "MATRICULADOS", "NUEVOS"]
+
+ESTUDIOS = [
+    {"nivel": "maestria", "requerido": '("especializacion" o "maestria") y ("educacion" o "formacion")'},
+    {"nivel": "maestria", "requerido": '"ingenieria" y ("sistemas" o "software")'},
+    {"nivel": "especializacion", "requerido": '"salud" y "publica"'},
+]
+
+def periodos(desde: int, hasta: int) -> list:
+    return [f"{anio}-{semestre}" for anio in range(desde, hasta + 1) for semestre in (1, 2)]
+
+def escribir_remoto(carpeta: Path, lista_periodos: Iterable[str], num_programas: int = 48,
+                    corregido: Optional[str] = None) -> None:
+    """
+    Escribe MAESTRO, OFERTA, PROGRAMAS e IES en `carpeta`; las cifras son
+    deterministas por programa y periodo. En el periodo `corregido` las
+    cantidades de MAESTRO suben en uno (una corrección del origen).
+    """
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ies = pd.DataFrame([
+        {"CODIGO_INSTITUCION": str(1000 + i), "INSTITUCION": f"Universidad {i}", "NATURALEZA_JURIDICA": "x",
+         "SECTOR_IES": "Oficial" if i % 3 == 0 else "Privado", "CARACTER_IES": "U",
+         "PAGINA_WEB": f"WWW.U{i}.EDU.CO", "ACREDITACION_ALTA_CALIDAD": "SI"}
+        for i in range(6)
+    ])
+    programas, maestro, oferta = [], [], []
+    for k in range(num_programas):
+        institucion = ies.iloc[k % len(ies)]
+        departamento, municipio = DEPARTAMENTOS[k % len(DEPARTAMENTOS)]
+        programas.append({
+            "CODIGO_SNIES": str(10000 + k), "CODIGO_INSTITUCION": institucion.CODIGO_INSTITUCION,
+            "PROGRAMA_ACADEMICO": NOMBRES[k % len(NOMBRES)], "DEPARTAMENTO_PROGRAMA": departamento,
+            "MUNICIPIO_PROGRAMA": municipio, "PROGRAMA_ACREDITADO": "SI" if k % 2 else None,
+            "MODALIDAD": "Presencial", "NUMERO_CREDITOS": ["30", "45", "null"][k % 3],
+            "NUMERO_PERIODO": ["2", "4"][k % 2], "PERIODICIDAD": "Semestral",
+        })
+        for periodo in lista_periodos:
+            semilla = (k * 31 + int(periodo.replace("-", ""))) % 997
+            for j, proceso in enumerate(PROCESOS):
+                cantidad = (semilla * (j + 3)) % 200 + (periodo == corregido)
+                cantidad = "null" if (semilla + j) % 17 == 0 and proceso != "MATRICULADOS" else str(cantidad)
+                maestro.append((str(10000 + k), institucion.CODIGO_INSTITUCION, periodo, periodo.replace("-", ""),
+                                proceso, cantidad, institucion.INSTITUCION, institucion.SECTOR_IES))
+            oferta.append((str(10000 + k), periodo, "null" if semilla % 11 == 0 else str((semilla % 12 + 1) * 1_000_000)))
+
+    columnas = ["CODIGO_SNIES", "CODIGO_INSTITUCION", "PERIODO", "PROXY_PER", "PROCESO", "CANTIDAD",
+                "INSTITUCION", "SECTOR_IES"]
+    pd.DataFrame(maestro, columns=columnas).to_parquet(carpeta / "MAESTRO.parquet", index=False)
+    pd.DataFrame(oferta, columns=["CODIGO_SNIES", "PERIODO", "MATRICULA"]).to_parquet(carpeta / "OFERTA.parquet", index=False)
+    pd.DataFrame(programas).to_parquet(carpeta / "PROGRAMAS.parquet", index=False)
+    ies.to_parquet(carpeta / "IES.parquet", index=False)
+
+# -------------------------
+# Ejecución en un proceso aparte: los módulos fijan SNIES_DIR y SNIES_URL_BASE al importarse
+# -------------------------
+PREAMBULO = """
+import json, sys
+import matplotlib
+matplotlib.use("Agg")
+
+def salida_lector(respuesta):
+    programas = sorted(json.dumps(p.model_dump(), sort_keys=True, default=str)
+                       for p in respuesta["informacion_programas_nacionales"])
+    return {"snies": json.loads(json.dumps(respuesta["snies"], sort_keys=True, default=str)),
+            "programas": programas, "error": respuesta.get("error")}
+
+# Salida del lector para `estudios`, tabla de hechos completa y versiones del manifiesto
+def instantanea(estudios):
+    import almacen_snies, lector
+    lote = [salida_lector(r) for r in lector.lector_snies_lote(estudios)]
+    hechos = almacen_snies.leer_hechos(almacen_snies.programas_normalizados()["CODIGO_SNIES"])
+    tablas = {tabla: {clave: entrada.get(clave) for clave in ("version", "particiones")}
+              for tabla, entrada in almacen_snies._leer_manifiesto()["tablas"].items()}
+    return {"lote": lote, "tablas": tablas,
+            "hechos": {"tipos": hechos.dtypes.astype(str).to_dict(), "filas": hechos.to_json(orient="split")}}
+"""
+
+def correr_con_snies(codigo: str, datos: Path, remoto: Path) -> Any:
+    """Corre `codigo` con SNIES_DIR=datos y SNIES_URL_BASE=remoto; devuelve lo que deje en `resultado` (JSON)."""
+    datos.mkdir(parents=True, exist_ok=True)
+    archivo = datos.parent / f"resultado-{datos.name}.json"
+    programa = PREAMBULO + textwrap.dedent(codigo) + (
+        "\njson.dump(resultado, open(sys.argv[1], 'w'), sort_keys=True, default=str)\n")
+    entorno = {**os.environ, "SNIES_DIR": str(datos), "SNIES_URL_BASE": str(remoto), "PYTHONPATH": str(NOTEBOOKS)}
+    subprocess.run([sys.executable, "-c", programa, str(archivo)], cwd=datos, env=entorno, check=True,
+                   stdout=subprocess.DEVNULL)
+    return json.loads(archivo.read_text())
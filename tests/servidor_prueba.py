@@ -0,0 +1,34 @@
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Tuple
+
+# Respuesta de una ruta: (estado, encabezados, cuerpo)
+Respuesta = Tuple[int, Dict[str, str], bytes]
+
+@contextmanager
+def servidor(rutas: Dict[str, Callable[[BaseHTTPRequestHandler], Respuesta]]) -> Iterator[str]:
+    """Servidor HTTP local en un hilo; entrega la URL base. Rutas desconocidas dan 404."""
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ruta = rutas.get(self.path)
+            estado, encabezados, cuerpo = ruta(self) if ruta else (404, {}, b"no existe")
+            self.send_response(estado)
+            for nombre, valor in encabezados.items():
+                self.send_header(nombre, valor)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    hilo = threading.Thread(target=http.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield f"http://127.0.0.1:{http.server_address[1]}"
+    finally:
+        http.shutdown()
+        http.server_close()
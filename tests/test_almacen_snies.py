@@ -0,0 +1,59 @@
+import os
+
+from datos_snies import ESTUDIOS, correr_con_snies, escribir_remoto, periodos
+
+INSTANTANEA = f"resultado = instantanea({ESTUDIOS!r})"
+
+def _archivos(directorio):
+    """mtime de cada archivo bajo `directorio` (lo que se reescriba cambia)."""
+    return {
+        os.path.relpath(os.path.join(raiz, nombre), directorio): os.stat(os.path.join(raiz, nombre)).st_mtime_ns
+        for raiz, _, nombres in os.walk(directorio) for nombre in nombres
+    }
+
+def test_actualizacion_incremental_igual_a_construir_de_cero(tmp_path):
+    remoto, incremental, de_cero = tmp_path / "remoto", tmp_path / "incremental", tmp_path / "de_cero"
+    escribir_remoto(remoto, periodos(2018, 2020))
+    correr_con_snies(INSTANTANEA, incremental, remoto)
+
+    # El origen publica 2021 y corrige 2019-1
+    escribir_remoto(remoto, periodos(2018, 2021), corregido="2019-1")
+    actualizado = correr_con_snies(f"""
+    import almacen_snies
+    cambios = almacen_snies.actualizar()
+    resultado = {{"cambios": cambios, **instantanea({ESTUDIOS!r})}}
+    """, incremental, remoto)
+    nuevo = correr_con_snies(INSTANTANEA, de_cero, remoto)
+
+    assert actualizado.pop("cambios") == {
+        "MAESTRO": {"nuevos": ["2021-1", "2021-2"], "cambiados": ["2019-1"], "eliminados": []},
+        "OFERTA": {"nuevos": ["2021-1", "2021-2"], "cambiados": [], "eliminados": []},
+    }
+    assert actualizado == nuevo
+    assert sorted(nuevo["tablas"]["MAESTRO"]["particiones"]) == periodos(2018, 2021)
+
+def test_actualizar_sin_cambios_no_toca_nada(tmp_path):
+    remoto, datos = tmp_path / "remoto", tmp_path / "datos"
+    escribir_remoto(remoto, periodos(2018, 2020))
+    antes = correr_con_snies(INSTANTANEA, datos, remoto)
+    archivos = _archivos(datos)
+    manifiesto = (datos / "snies_manifiesto.json").read_text()
+
+    cambios = correr_con_snies("""
+    import almacen_snies
+    resultado = almacen_snies.actualizar()
+    """, datos, remoto)
+    assert cambios == {}
+    assert _archivos(datos) == archivos
+
+    # Forzando se descarga y compara todo, pero con el mismo contenido no cambia ningún dato
+    despues = correr_con_snies(f"""
+    import almacen_snies
+    cambios = almacen_snies.actualizar(forzar=True)
+    resultado = {{"cambios": cambios, **instantanea({ESTUDIOS!r})}}
+    """, datos, remoto)
+    assert despues.pop("cambios") == {}
+    assert despues == antes
+    assert (datos / "snies_manifiesto.json").read_text() == manifiesto
+    sin_manifiesto = {ruta: mtime for ruta, mtime in _archivos(datos).items() if ruta != "snies_manifiesto.json"}
+    assert sin_manifiesto == {ruta: mtime for ruta, mtime in archivos.items() if ruta != "snies_manifiesto.json"}
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import cache_llm
+from cache_llm import CacheLLM, ainvocar, invocar
+
+class LimiteTasa(Exception):
+    status_code = 429
+
+class LLMLimitado:
+    """Responde después de `limitadas` respuestas 429; cuenta las llamadas."""
+
+    def __init__(self, limitadas: int):
+        self.limitadas = limitadas
+        self.llamadas = 0
+
+    def _responder(self, mensajes):
+        self.llamadas += 1
+        if self.llamadas <= self.limitadas:
+            raise LimiteTasa("429 Too Many Requests")
+        return AIMessage(content=f"respuesta a {mensajes[-1].content}")
+
+    def invoke(self, mensajes):
+        return self._responder(mensajes)
+
+    async def ainvoke(self, mensajes):
+        await asyncio.sleep(0)
+        return self._responder(mensajes)
+
+@pytest.fixture(autouse=True)
+def sin_espera(monkeypatch):
+    monkeypatch.setattr(cache_llm, "ESPERA_BASE_LLM_S", 0.0)
+
+@pytest.mark.parametrize("asincrono", [False, True])
+def test_reintenta_los_limites_de_tasa(tmp_path, asincrono):
+    llm, cache = LLMLimitado(limitadas=2), CacheLLM(str(tmp_path / "llm.sqlite"))
+    mensajes = [HumanMessage(content="hola")]
+    llamar = (lambda: asyncio.run(ainvocar(llm, mensajes, cache))) if asincrono else (lambda: invocar(llm, mensajes, cache))
+
+    assert llamar() == "respuesta a hola"
+    assert llm.llamadas == 3
+    assert llamar() == "respuesta a hola" and llm.llamadas == 3  # desde el caché
+
+@pytest.mark.parametrize("asincrono", [False, True])
+def test_agotados_los_reintentos_propaga_el_error(asincrono):
+    llm = LLMLimitado(limitadas=5)
+    mensajes = [HumanMessage(content="hola")]
+    with pytest.raises(LimiteTasa):
+        if asincrono:
+            asyncio.run(cache_llm.acon_reintentos(lambda: llm.ainvoke(mensajes), reintentos=1))
+        else:
+            cache_llm.con_reintentos(lambda: llm.invoke(mensajes), reintentos=1)
+    assert llm.llamadas == 2
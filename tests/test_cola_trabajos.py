@@ -0,0 +1,92 @@
+import os
+import time
+
+import cola_trabajos
+from cola_trabajos import MAX_INTENTOS_TRABAJO, ColaTrabajos
+
+def test_solo_se_liberan_los_arriendos_vencidos(tmp_path):
+    cola = ColaTrabajos(str(tmp_path / "cola.sqlite"), arriendo_s=0.2)
+    vivo = cola.encolar({"nombre": "vivo"})
+    muerto = cola.encolar({"nombre": "muerto"})
+    assert cola.tomar("a")[0] == vivo
+    assert cola.tomar("b")[0] == muerto
+
+    time.sleep(0.3)
+    assert cola.renovar(vivo, "a")  # "a" sigue latiendo; "b" no
+    assert cola.liberar_interrumpidos() == 1
+    assert cola.trabajo(vivo)["estado"] == "en_curso"
+    assert cola.trabajo(muerto)["estado"] == "pendiente"
+    assert "dejó de responder" in cola.trabajo(muerto)["error"]
+
+    # Otro lo retoma; el trabajador original ya no puede cerrarlo ni renovarlo
+    assert cola.tomar("c")[0] == muerto
+    assert not cola.renovar(muerto, "b")
+    assert not cola.terminar(muerto, trabajador="b")
+    assert cola.terminar(muerto, trabajador="c")
+    assert cola.trabajo(muerto)["estado"] == "terminado"
+
+def test_agotados_los_intentos_pasa_a_error(tmp_path):
+    cola = ColaTrabajos(str(tmp_path / "cola.sqlite"), arriendo_s=0.05)
+    id_trabajo = cola.encolar({"nombre": "x"})
+    for intento in range(MAX_INTENTOS_TRABAJO):
+        assert cola.tomar(f"t{intento}")[0] == id_trabajo
+        time.sleep(0.1)
+    # tomar también recupera los vencidos: no queda nada que tomar
+    assert cola.tomar("otro") is None
+    trabajo = cola.trabajo(id_trabajo)
+    assert trabajo["estado"] == "error" and trabajo["intentos"] == MAX_INTENTOS_TRABAJO
+
+def test_el_latido_mantiene_el_arriendo(tmp_path):
+    cola = ColaTrabajos(str(tmp_path / "cola.sqlite"), arriendo_s=0.15)
+    id_trabajo = cola.encolar({"nombre": "largo"})
+    cola.tomar("a")
+    with cola_trabajos._latido(cola, id_trabajo, "a"):
+        time.sleep(0.4)
+        assert cola.liberar_interrumpidos() == 0
+    time.sleep(0.2)
+    assert cola.liberar_interrumpidos() == 1
+
+def _trabajador_de_prueba(ruta, modo_analisis, prefijo=""):
+    cola = ColaTrabajos(ruta)
+    nombre, hechos = f"{prefijo}{os.getpid()}", 0
+    while (tomado := cola.tomar(nombre)) is not None:
+        id_trabajo, solicitud = tomado
+        if solicitud.get("juntos") and cola.trabajo(id_trabajo)["intentos"] == 1:
+            # Primer intento: espera a que el otro trabajo "juntos" también esté en curso
+            limite = time.time() + 30
+            while len(cola.listar("en_curso")) < 2 and time.time() < limite:
+                time.sleep(0.05)
+        if solicitud.get("morir"):
+            os._exit(1)
+        time.sleep(solicitud.get("dormir", 0))
+        hechos += cola.terminar(id_trabajo, trabajador=nombre)
+    return hechos
+
+def test_un_trabajador_caido_no_detiene_la_corrida(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "cola.sqlite")
+    cola = ColaTrabajos(ruta)
+    buenos = [cola.encolar({"nombre": f"estudio {i}"}) for i in range(3)]
+    veneno = cola.encolar({"nombre": "tumba al proceso", "morir": True})
+    monkeypatch.setattr(cola_trabajos, "_trabajador", _trabajador_de_prueba)
+
+    resumen = cola_trabajos.correr_cola(procesos=2, ruta=ruta)
+
+    assert resumen == {"pendiente": 0, "en_curso": 0, "terminado": 3, "error": 1}
+    assert all(cola.trabajo(b)["estado"] == "terminado" for b in buenos)
+    trabajo = cola.trabajo(veneno)
+    assert trabajo["estado"] == "error" and trabajo["intentos"] == MAX_INTENTOS_TRABAJO
+
+def test_la_caida_de_un_trabajador_no_cobra_a_los_demas(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "cola.sqlite")
+    cola = ColaTrabajos(ruta)
+    # El lento sigue corriendo en otro proceso cuando el veneno tumba el suyo (dos veces)
+    lento = cola.encolar({"nombre": "lento", "dormir": 2, "juntos": True})
+    veneno = cola.encolar({"nombre": "tumba al proceso", "morir": True, "juntos": True})
+    monkeypatch.setattr(cola_trabajos, "_trabajador", _trabajador_de_prueba)
+
+    resumen = cola_trabajos.correr_cola(procesos=2, ruta=ruta)
+
+    assert resumen == {"pendiente": 0, "en_curso": 0, "terminado": 1, "error": 1}
+    trabajo = cola.trabajo(lento)
+    assert trabajo["estado"] == "terminado" and trabajo["intentos"] == 1 and trabajo["error"] is None
+    assert cola.trabajo(veneno)["intentos"] == MAX_INTENTOS_TRABAJO
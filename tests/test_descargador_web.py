@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import subprocess
+import sys
+
+from cache_paginas import CachePaginas
+from descargador_web import correr_sincrono, descargar_urls
+from servidor_prueba import servidor
+
+HTML = b"<html><body><h1>Ingenieria</h1><p>Perfil del egresado</p></body></html>"
+HTML_FALLA = b"<html><body><p>falla</p></body></html>"
+
+def _pagina(cuerpo=HTML):
+    return lambda _: (200, {"Content-Type": "text/html; charset=utf-8"}, cuerpo)
+
+def _falla_una_vez():
+    pedidos = itertools.count()
+    def ruta(_):
+        if next(pedidos) == 0:
+            return 500, {"Retry-After": "0"}, b"error"
+        return _pagina()(None)
+    return ruta
+
+RUTAS = {
+    "/ok": _pagina(),
+    "/ciclo": lambda _: (302, {"Location": "/ciclo"}, b""),
+    "/gzip-malo": lambda _: (200, {"Content-Type": "text/html", "Content-Encoding": "gzip"}, b"esto no es gzip"),
+    "/inestable": _falla_una_vez(),
+    "/falla": _pagina(HTML_FALLA),
+}
+
+def _extraer(html: str) -> str:
+    if "falla" in html:
+        raise ValueError("página inesperada")
+    return html
+
+def test_errores_por_url_no_cancelan_las_demas():
+    with servidor(RUTAS) as base:
+        urls = [f"{base}/ok", f"{base}/ciclo", f"{base}/gzip-malo", f"{base}/inestable",
+                f"{base}/no-existe", "http://[::1", "ftp://ejemplo.org/"]
+        ok, ciclo, gzip_malo, inestable, no_existe, invalida, protocolo = descargar_urls(
+            urls, cache=None, reintentos=2)
+
+    assert ok.ok and "## Ingenieria" in ok.texto and "Perfil del egresado" in ok.texto
+    assert ciclo.error.startswith("TooManyRedirects") and ciclo.intentos == 1
+    assert gzip_malo.error.startswith("DecodingError") and gzip_malo.intentos == 1
+    assert inestable.ok and inestable.intentos == 2
+    assert no_existe.error == "HTTP 404" and no_existe.intentos == 1
+    assert invalida.error.startswith("InvalidURL")
+    assert protocolo.error.startswith("UnsupportedProtocol")
+
+def test_falla_del_extractor_queda_en_la_descarga():
+    with servidor(RUTAS) as base:
+        ok, falla = descargar_urls([f"{base}/ok", f"{base}/falla"], cache=None, extraer=_extraer)
+
+    assert ok.ok and ok.texto == HTML.decode()
+    assert not falla.ok and falla.intentos == 1
+    assert falla.error == "Extracción: ValueError: página inesperada"
+
+def _con_etag(pedidos):
+    def ruta(manejador):
+        pedidos.append(manejador.headers.get("If-None-Match"))
+        if manejador.headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"Content-Type": "text/html", "ETag": '"v1"'}, HTML
+    return ruta
+
+def test_cache_sirve_frescas_y_revalida_vencidas(tmp_path):
+    ruta = str(tmp_path / "paginas.sqlite")
+    pedidos = []
+    with servidor({"/etag": _con_etag(pedidos)}) as base:
+        url = f"{base}/etag"
+        primera, = descargar_urls([url], cache=CachePaginas(ruta))
+        fresca, = descargar_urls([url], cache=CachePaginas(ruta))
+        vencida, = descargar_urls([url], cache=CachePaginas(ruta, frescura_s=-1))
+
+    assert primera.ok and not primera.desde_cache
+    assert fresca.desde_cache and fresca.texto == primera.texto
+    assert vencida.desde_cache and vencida.estado == 304 and vencida.texto == primera.texto
+    assert pedidos == [None, '"v1"']
+
+def test_importar_no_crea_el_cache(tmp_path):
+    entorno = {**os.environ, "SNIES_DIR": str(tmp_path), "PYTHONPATH": os.path.abspath("notebooks")}
+    subprocess.run([sys.executable, "-c", "import descargador_web, buscador_programas"],
+                   cwd=tmp_path, env=entorno, check=True)
+    assert not (tmp_path / "cache_paginas.sqlite").exists()
+
+def test_descargar_urls_desde_un_event_loop():
+    with servidor(RUTAS) as base:
+        async def en_jupyter():
+            return descargar_urls([f"{base}/ok"], cache=None)
+        ok, = asyncio.run(en_jupyter())
+    assert ok.ok and "Perfil del egresado" in ok.texto
+
+def test_correr_sincrono_conserva_el_contexto():
+    variable = contextvars.ContextVar("variable")
+    async def leer():
+        return variable.get()
+    async def principal():
+        variable.set("del nodo")
+        return correr_sincrono(leer())
+    assert asyncio.run(principal()) == "del nodo"
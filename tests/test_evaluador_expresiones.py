@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluador_expresiones import compile_query, evaluar, evaluar_serie
+
+NOMBRES = pd.Series([
+    "Especialización en Educación para la Salud", "MAESTRÍA EN FORMACIÓN MÉDICA", "Ingeniería de Sistemas",
+    "Especialización en Salud Pública", "Licenciatura en Educación Física", "Diseño Gráfico",
+    "Maestría en Educación de la Primera Infancia", "Técnico en Atención a la Niñez",
+    "Pequeña y Mediana Empresa", "Ingeniería en Nanomateriales", "Salud  Pública\tVeterinaria",
+    "Administración de Empresas", "   ", "", np.nan, None, "nan",
+])
+
+EXPRESIONES = [
+    '"salud"',
+    '"salud" y "publica"',
+    '"salud" o "medicina"',
+    '"educacion" y no "fisica"',
+    'no "ingenieria"',
+    '("especializacion" o "maestria") y ("educacion" o "formacion") y ("salud" o "medicina")',
+    '"Educación" y "FÍSICA"',
+    "'pequeña' o ('diseño' y no 'grafico')",
+    '"niñez" o "nino" o "infancia"',
+    'salud y no (publica o veterinaria)',
+    '"salud publica"',
+    '"a"',
+    '"en" y "de"',
+    '""',
+    '"nan"',
+    'no no "empresas"',
+]
+
+def _fila_por_fila(nombres: pd.Series, expresion: str, substring: bool) -> pd.Series:
+    # Como lo hacía lector_snies antes de la versión vectorizada (un nombre faltante no tiene palabras)
+    return nombres.map(lambda x: evaluar(("" if pd.isna(x) else str(x)).lower().split(), expresion,
+                                         substring=substring))
+
+@pytest.mark.parametrize("substring", [True, False])
+@pytest.mark.parametrize("expresion", EXPRESIONES)
+def test_evaluar_serie_igual_a_evaluar_por_fila(expresion, substring):
+    consulta = compile_query(expresion, substring=substring)
+    mascara = evaluar_serie(NOMBRES, consulta)
+    assert mascara.dtype == bool and mascara.index.equals(NOMBRES.index)
+    assert mascara.tolist() == _fila_por_fila(NOMBRES, expresion, substring).tolist()
+    assert consulta.evaluar_serie(NOMBRES).tolist() == mascara.tolist()
+
+def test_tildes_y_enie_se_pliegan():
+    mascara = evaluar_serie(NOMBRES, '"diseno" o "PEQUENA" o "formacion medica"')
+    assert NOMBRES[mascara].tolist() == ["Diseño Gráfico", "Pequeña y Mediana Empresa"]
+
+def test_respeta_el_indice_de_la_serie():
+    nombres = pd.Series(["Salud Pública", "Derecho", np.nan], index=[10, 3, 7])
+    assert evaluar_serie(nombres, '"salud"').to_dict() == {10: True, 3: False, 7: False}
+
+@pytest.mark.parametrize("expresion", ['("salud"', '"salud")', '"salud" y', 'y "salud"', "no", '"a" "b"', "()", ""])
+def test_expresion_mal_formada(expresion):
+    with pytest.raises(ValueError):
+        compile_query(expresion)
+    with pytest.raises(ValueError):
+        evaluar_serie(NOMBRES, expresion)
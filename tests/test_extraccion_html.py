@@ -0,0 +1,41 @@
+import pytest
+
+from extraccion_html import ExtractorTexto
+
+SOLO_DIVS = """<html><head><title>Programa</title><style>p{}</style></head><body>
+Intro <!-- comentario --> suelta
+<div>Hola <span>mundo</span>! <b>negrita</b> cola<br>linea</div>
+<script>var x = "<div>no</div>";</script>
+<div><div>Anidado <i>uno</i></div> y <div>dos &amp; tres</div> fin</div>
+<nav>menu</nav> tras menu
+<p>parrafo corto</p> despues
+</body></html>"""
+
+VISIBLE = ("Programa Intro suelta Hola mundo ! negrita cola linea Anidado uno y dos & tres fin"
+           " tras menu parrafo corto despues")
+
+def _extraer(html: str, usar_lxml: bool, paso: int, max_caracteres: int = 20000) -> str:
+    extractor = ExtractorTexto(max_caracteres, usar_lxml=usar_lxml)
+    for inicio in range(0, len(html), paso):
+        if extractor.alimentar(html[inicio:inicio + paso]):
+            break
+    return extractor.texto()
+
+@pytest.mark.parametrize("usar_lxml", [True, False])
+@pytest.mark.parametrize("paso", [1, 7, 1 << 16])
+def test_sin_bloques_usa_el_texto_visible_de_la_misma_pasada(usar_lxml, paso):
+    assert _extraer(SOLO_DIVS, usar_lxml, paso) == VISIBLE
+
+@pytest.mark.parametrize("usar_lxml", [True, False])
+def test_texto_visible_con_tope(usar_lxml):
+    extractor = ExtractorTexto(30, usar_lxml=usar_lxml)
+    extractor.alimentar("<div>" + "palabra " * 10000 + "</div>")
+    assert extractor.texto() == "palabra palabra palabra palabr"
+    assert sum(map(len, extractor.visible.partes)) <= 30
+
+@pytest.mark.parametrize("usar_lxml", [True, False])
+def test_con_bloques_usa_los_bloques(usar_lxml):
+    html = "<nav><p>menu</p></nav><h2>Perfil</h2><ul><li>" + "competencia " * 60 + "</ul><div>suelto</div>"
+    texto = _extraer(html, usar_lxml, 7)
+    assert texto.startswith("## Perfil\n- competencia")
+    assert "menu" not in texto and "suelto" not in texto
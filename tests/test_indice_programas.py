@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import almacen_snies
+import indice_programas
+from evaluador_expresiones import compile_query, evaluar
+from indice_programas import IndiceProgramas, obtener_indice
+
+CATALOGO = [
+    "Especialización en Educación para la Salud", "Maestría en Formación Médica", "Ingeniería de Sistemas",
+    "Especialización en Salud Pública", "Licenciatura en Educación Física", "Diseño Gráfico",
+    "Maestría en Educación de la Primera Infancia", "Técnico en Atención a la Niñez", "Pequeña y Mediana Empresa",
+    "Ingeniería en Nanomateriales", "Salud  Pública\tVeterinaria", "Administración de Empresas",
+    "Enseñanza de las Ciencias", "Maestría en Salud", "Ingeniería Ambiental y Sanitaria", "IA Aplicada",
+    "Derecho", "", "   ",
+]
+
+EXPRESIONES = [
+    '"salud"', '"salud" y "publica"', '"educacion" y no "fisica"', 'no "ingenieria"',
+    '("especializacion" o "maestria") y ("educacion" o "formacion") y ("salud" o "medicina")',
+    '"Diseño" o "NIÑEZ" o "pequena"', "'ensenanza' y no 'ciencia'",
+    # Términos de menos de tres letras (sin trigramas)
+    '"a"', '"ia"', '"de" y no "en"', '"y"', '""', 'no ""',
+    # Subcadenas que solo existen cruzando palabras
+    '"ensalud"', '"deingenieria"', '"lasalud"', '"enseñanzade"', '"ciaa"', '"salud publica"',
+    # Todos sus trigramas están en "ensenanza" sin ser subcadena de ella
+    '"nsens"', '"ensen" y no "nsens"',
+    # Términos que no están en ninguna palabra
+    '"xyz"', '"sal" y "lud" y no "saludable"',
+]
+
+def _fuerza_bruta(expresion: str, substring: bool) -> list:
+    return [n for n in CATALOGO if evaluar(n.split(), expresion, substring=substring)]
+
+@pytest.fixture(scope="module")
+def indices(tmp_path_factory):
+    indice = IndiceProgramas.construir(CATALOGO, version="v")
+    ruta = str(tmp_path_factory.mktemp("indice") / "indice.json")
+    indice.guardar(ruta)
+    return {"construido": indice, "cargado": IndiceProgramas.cargar(ruta)}
+
+@pytest.mark.parametrize("cual", ["construido", "cargado"])
+@pytest.mark.parametrize("substring", [True, False])
+@pytest.mark.parametrize("expresion", EXPRESIONES)
+def test_indice_igual_a_fuerza_bruta(indices, cual, expresion, substring):
+    assert indices[cual].buscar(compile_query(expresion, substring=substring)) == _fuerza_bruta(expresion, substring)
+
+@pytest.mark.parametrize("substring", [True, False])
+def test_buscar_lote_igual_a_buscar(indices, substring):
+    indice = indices["construido"]
+    consultas = [compile_query(e, substring=substring) for e in EXPRESIONES]
+    assert indice.buscar_lote(consultas) == [indice.buscar(c) for c in consultas]
+
+def test_se_reconstruye_al_cambiar_normalizacion_o_formato(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "indice.json")
+    monkeypatch.setattr(almacen_snies, "version_tabla", lambda tabla: "programas-v1")
+
+    assert obtener_indice(["uno"], ruta).nombres == ["uno"]
+    # Misma versión: se usa el guardado aunque lleguen otros nombres
+    assert obtener_indice(["dos"], ruta).nombres == ["uno"]
+
+    monkeypatch.setattr(almacen_snies, "VERSION_NORMALIZACION", almacen_snies.VERSION_NORMALIZACION + 1)
+    assert obtener_indice(["dos"], ruta).nombres == ["dos"]
+    assert obtener_indice(["tres"], ruta).nombres == ["dos"]
+
+    monkeypatch.setattr(indice_programas, "FORMATO_INDICE", indice_programas.FORMATO_INDICE + 1)
+    assert obtener_indice(["tres"], ruta).nombres == ["tres"]
+    with open(ruta, encoding="utf-8") as f:
+        guardado = json.load(f)
+    assert guardado["nombres"] == ["tres"]
+    assert guardado["version"] == (f"programas-v1-n{almacen_snies.VERSION_NORMALIZACION}"
+                                   f"-f{indice_programas.FORMATO_INDICE}")
@@ -0,0 +1,25 @@
+import datos_snies
+from datos_snies import correr_con_snies, escribir_remoto, periodos
+
+ESTUDIOS = [datos_snies.ESTUDIOS[0], {"nivel": "especializacion", "requerido": '"salud" y ('}, *datos_snies.ESTUDIOS[1:]]
+
+def test_lote_con_una_expresion_invalida_responde_los_demas(tmp_path):
+    remoto = tmp_path / "remoto"
+    escribir_remoto(remoto, periodos(2018, 2021))
+    lote = correr_con_snies(f"""
+    import lector
+    resultado = [salida_lector(r) for r in lector.lector_snies_lote({ESTUDIOS!r})]
+    """, tmp_path / "lote", remoto)
+    # En otro directorio para no reutilizar las etapas memoizadas por el lote
+    uno_a_uno = correr_con_snies(f"""
+    import lector
+    resultado = [salida_lector(lector.lector_snies(lector._como_estado(e), graficas="none"))
+                 for i, e in enumerate({ESTUDIOS!r}) if i != 1]
+    """, tmp_path / "uno_a_uno", remoto)
+
+    assert len(lote) == 4
+    assert lote[1]["error"] == "Paréntesis desbalanceados."
+    assert lote[1]["snies"] == {} and lote[1]["programas"] == []
+    validos = [r for i, r in enumerate(lote) if i != 1]
+    assert all(r["error"] is None and r["programas"] and r["snies"] for r in validos)
+    assert uno_a_uno == validos
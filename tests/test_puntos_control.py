@@ -0,0 +1,102 @@
+import asyncio
+import operator
+import os
+import subprocess
+import sys
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from puntos_control import PuntosControlSQLite
+
+class Estado(TypedDict):
+    pasos: Annotated[List[str], operator.add]
+    resumen: str
+
+def _grafo(checkpointer, llamadas, fallar):
+    """inicio -> (rama_a, rama_b en paralelo) -> fin; rama_b falla mientras fallar[0]."""
+    def nodo(nombre, salida=None):
+        def f(estado):
+            llamadas.append(nombre)
+            if nombre == "rama_b" and fallar[0]:
+                raise RuntimeError("caída")
+            return salida(estado) if salida else {"pasos": [nombre]}
+        return f
+
+    g = StateGraph(Estado)
+    g.add_node("inicio", nodo("inicio", lambda e: {"pasos": ["inicio"], "resumen": "x" * 1000}))
+    g.add_node("rama_a", nodo("rama_a"))
+    g.add_node("rama_b", nodo("rama_b"))
+    g.add_node("fin", nodo("fin"))
+    g.add_edge(START, "inicio")
+    g.add_edge("inicio", "rama_a")
+    g.add_edge("inicio", "rama_b")
+    g.add_edge(["rama_a", "rama_b"], "fin")
+    g.add_edge("fin", END)
+    return g.compile(checkpointer=checkpointer)
+
+@pytest.fixture
+def puntos(tmp_path):
+    return PuntosControlSQLite(str(tmp_path / "puntos.sqlite"))
+
+def test_reanuda_sin_repetir_nodos_terminados(puntos, tmp_path):
+    llamadas, fallar = [], [True]
+    config = {"configurable": {"thread_id": "h1"}}
+    with pytest.raises(RuntimeError):
+        _grafo(puntos, llamadas, fallar).invoke({"pasos": []}, config)
+    assert sorted(llamadas) == ["inicio", "rama_a", "rama_b"]
+
+    # Otro proceso: checkpointer nuevo sobre el mismo archivo
+    fallar[0] = False
+    llamadas.clear()
+    reabierto = PuntosControlSQLite(str(tmp_path / "puntos.sqlite"))
+    salida = _grafo(reabierto, llamadas, fallar).invoke(None, config)
+    assert llamadas == ["rama_b", "fin"]  # rama_a quedó en las escrituras pendientes
+    assert sorted(salida["pasos"]) == ["fin", "inicio", "rama_a", "rama_b"]
+    assert reabierto.get_tuple(config).checkpoint["channel_values"]["resumen"] == "x" * 1000
+
+def test_list_orden_limite_antes_y_filtro(puntos):
+    llamadas, fallar = [], [False]
+    grafo = _grafo(puntos, llamadas, fallar)
+    for hilo in ("h1", "h2"):
+        grafo.invoke({"pasos": []}, {"configurable": {"thread_id": hilo}})
+
+    config = {"configurable": {"thread_id": "h1"}}
+    todos = list(puntos.list(config))
+    ids = [t.config["configurable"]["checkpoint_id"] for t in todos]
+    assert ids == sorted(ids, reverse=True) and len(ids) == 5  # entrada + 4 pasos
+    assert todos[0].config == puntos.get_tuple(config).config
+    # Cada punto apunta al anterior
+    assert [t.parent_config["configurable"]["checkpoint_id"] for t in todos[:-1]] == ids[1:]
+    assert todos[-1].parent_config is None
+
+    assert [t.config for t in puntos.list(config, limit=2)] == [t.config for t in todos[:2]]
+    antes = list(puntos.list(config, before=todos[1].config))
+    assert [t.config for t in antes] == [t.config for t in todos[2:]]
+    entrada = list(puntos.list(config, filter={"source": "input"}))
+    assert [t.config for t in entrada] == [todos[-1].config]
+    assert {t.config["configurable"]["thread_id"] for t in puntos.list(None)} == {"h1", "h2"}
+    assert set(puntos.hilos()) == {"h1", "h2"}
+
+    puntos.delete_thread("h1")
+    assert puntos.get_tuple(config) is None
+    assert len(list(puntos.list(None))) == 5
+
+def test_versiones_asincronas(puntos):
+    llamadas, fallar = [], [False]
+    config = {"configurable": {"thread_id": "async"}}
+
+    async def correr():
+        salida = await _grafo(puntos, llamadas, fallar).ainvoke({"pasos": []}, config)
+        return salida, [t async for t in puntos.alist(config, limit=1)]
+
+    salida, ultimos = asyncio.run(correr())
+    assert sorted(salida["pasos"]) == ["fin", "inicio", "rama_a", "rama_b"]
+    assert ultimos[0].config == puntos.get_tuple(config).config
+
+def test_importar_no_crea_la_base(tmp_path):
+    entorno = {**os.environ, "SNIES_DIR": str(tmp_path), "PYTHONPATH": os.path.abspath("notebooks")}
+    subprocess.run([sys.executable, "-c", "import grafo, servicio, cola_trabajos"],
+                   cwd=tmp_path, env=entorno, check=True)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,22 @@
+from ranking_urls import puntuar_url, rankear_urls
+
+def test_nombre_con_tildes_coincide_con_ruta_y_titulo():
+    base = puntuar_url("https://www.udea.edu.co/programas/otro", 0.5, "udea.edu.co", "Ingeniería Química")
+    ruta = puntuar_url("https://www.udea.edu.co/programas/ingenieria-quimica", 0.5, "udea.edu.co",
+                       "Ingeniería Química")
+    codificada = puntuar_url("https://www.udea.edu.co/programas/ingenier%C3%ADa-qu%C3%ADmica", 0.5,
+                             "udea.edu.co", "Ingeniería Química")
+    titulo = puntuar_url("https://www.udea.edu.co/programas/p123", 0.5, "udea.edu.co",
+                         "Ingeniería Química", titulo="INGENIERÍA QUÍMICA - Currículo")
+    assert ruta == codificada == base + 0.2
+    assert titulo == base + 0.2 + 0.2  # nombre y palabra de plan ("curricul")
+
+def test_rankear_quita_duplicados_y_excluidos():
+    resultados = [
+        {"url": "http://udea.edu.co/ingenieria-quimica/?utm_source=x", "score": 0.4},
+        {"url": "https://www.udea.edu.co/ingenieria-quimica", "score": 0.3},
+        {"url": "https://www.facebook.com/udea", "score": 0.9},
+        {"url": "https://otro.com/noticia/ingenieria", "score": 0.9},
+    ]
+    urls = rankear_urls(resultados, "https://www.udea.edu.co", "Ingeniería Química")
+    assert urls == ["https://www.udea.edu.co/ingenieria-quimica", "https://otro.com/noticia/ingenieria"]
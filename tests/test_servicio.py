@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from servicio import app
+
+# Sin `with`: no corre el ciclo de vida (no hace falta cargar SNIES para validar)
+cliente = TestClient(app)
+
+@pytest.mark.parametrize("ruta", ["/programas", "/snies"])
+def test_expresion_mal_formada_responde_422(ruta):
+    respuesta = cliente.get(ruta, params={"requerido": "(ingenieria y sistemas", "nivel": "pregrado"})
+    assert respuesta.status_code == 422
+    assert "Paréntesis desbalanceados" in respuesta.text
+
+def test_lote_y_trabajos_validan_cada_expresion():
+    lote = [{"requerido": "ingenieria", "nivel": "pregrado"}, {"requerido": "ingenieria y", "nivel": "maestria"}]
+    respuesta = cliente.post("/snies/lote", json=lote)
+    assert respuesta.status_code == 422
+    error, = respuesta.json()["detail"]
+    assert error["loc"] == ["body", 1, "requerido"] and "falta operando" in error["msg"]
+
+    solicitud = {"requerido": "", "nivel": "pregrado", "nombre": "x", "descripcion": "y"}
+    assert cliente.post("/trabajos", json=solicitud).status_code == 422
+    assert cliente.post("/eventos", json=solicitud).status_code == 422
+
+def test_busqueda_valida_llega_al_lector(monkeypatch):
+    recibidas = []
+    class Pipeline:
+        def valor(self, clave):
+            return [clave]
+    monkeypatch.setattr("servicio.pipeline_snies", lambda busqueda: recibidas.append(busqueda) or Pipeline())
+    respuesta = cliente.get("/programas", params={"requerido": "ingenieria y (sistemas o software)", "nivel": "pregrado"})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {"equivalentes": ["equivalentes"], "programas": ["programas"]}
+    assert recibidas[0].requerido == "ingenieria y (sistemas o software)" and recibidas[0].nivel == "pregrado"
+
+def _eventos_sse(texto):
+    eventos = []
+    for bloque in texto.strip().split("\n\n"):
+        tipo, datos = bloque.split("\n")
+        eventos.append((tipo.removeprefix("event: "), json.loads(datos.removeprefix("data: "))))
+    return eventos
+
+def test_eventos_dibuja_las_figuras_en_su_directorio(monkeypatch, tmp_path):
+    async def aeventos(entrada, hilo=None):
+        yield {"tipo": "paso", "nodo": "lector_snies", "campos": ["snies"]}
+        yield {"tipo": "paso", "nodo": "consultas", "campos": []}
+        yield {"tipo": "fin", "hilo": hilo}
+
+    agregados = {"programas_por_departamento_municipio": [["Antioquia", "Medellín", 3], ["Cundinamarca", "Bogotá", 5]]}
+    monkeypatch.setattr("servicio.aeventos", aeventos)
+    monkeypatch.setattr("servicio._agregados", lambda busqueda: agregados)
+    monkeypatch.setattr("servicio.SALIDA", str(tmp_path))
+    solicitud = {"requerido": "ingenieria", "nivel": "pregrado", "nombre": "x", "descripcion": "y"}
+
+    respuesta = cliente.post("/eventos", params={"hilo": "h1"}, json=solicitud)
+    eventos = _eventos_sse(respuesta.text)
+
+    assert [tipo for tipo, _ in eventos] == ["paso", "paso", "figura", "fin"]
+    figura = eventos[2][1]
+    assert figura["clave"] == "programas_por_departamento_municipio"
+    ruta, = figura["rutas"]
+    assert ruta == str(tmp_path / "h1" / "programas_por_departamento_municipio.png")
+    assert os.path.getsize(ruta) > 0
+
+def test_trabajo_guarda_sus_figuras_aparte(monkeypatch, tmp_path):
+    snies = {"programas_por_departamento_municipio": [["Antioquia", "Medellín", 3]]}
+    monkeypatch.setattr("servicio.ejecutar", lambda entrada, hilo: {"snies": snies})
+    monkeypatch.setattr("servicio.SALIDA", str(tmp_path))
+    solicitud = {"requerido": "ingenieria", "nivel": "pregrado", "nombre": "x", "descripcion": "y"}
+
+    # TestClient corre las tareas en segundo plano antes de devolver la respuesta
+    id_trabajo = cliente.post("/trabajos", json=solicitud).json()["id"]
+    trabajo = cliente.get(f"/trabajos/{id_trabajo}").json()
+    assert trabajo["estado"] == "terminado"
+    assert trabajo["figuras"] == {
+        "programas_por_departamento_municipio": [str(tmp_path / id_trabajo / "programas_por_departamento_municipio.png")]
+    }